@@ -6,5 +6,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'settings')
+# Consultas de clientes con vistas asíncronas nativas (ver clientes/views_async.py)
+os.environ.setdefault('VISTAS_ASINCRONAS', 'True')
 
-application = get_asgi_application()
\ No newline at end of file
+application = get_asgi_application()
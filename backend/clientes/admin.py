@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import TipoDocumento, Cliente, Compra
+from .models import TipoDocumento, Cliente, Compra, TrabajoExportacion
+from .services_busqueda import busqueda_texto_disponible, filtrar_clientes
 
 
 @admin.register(TipoDocumento)
@@ -61,6 +62,12 @@ class ClienteAdmin(admin.ModelAdmin):
     def nombre_completo(self, obj):
         return obj.nombre_completo
     nombre_completo.short_description = 'Nombre Completo'
+    
+    def get_search_results(self, request, queryset, search_term):
+        # En SQLite search_fields se resuelve con el índice de texto completo
+        if search_term and busqueda_texto_disponible(queryset.db):
+            return filtrar_clientes(queryset, texto=search_term), False
+        return super().get_search_results(request, queryset, search_term)
 
 
 @admin.register(Compra)
@@ -127,3 +134,14 @@ class CompraAdmin(admin.ModelAdmin):
         if not change:  # Solo para nuevas compras
             obj.usuario_creacion = request.user.username
         super().save_model(request, obj, form, change)
+
+
+@admin.register(TrabajoExportacion)
+class TrabajoExportacionAdmin(admin.ModelAdmin):
+    list_display = ('id', 'tipo', 'estado', 'progreso', 'tamano', 'fecha_creacion', 'fecha_fin')
+    list_filter = ('tipo', 'estado', 'fecha_creacion')
+    readonly_fields = (
+        'id', 'tipo', 'parametros', 'clave', 'huella', 'estado', 'progreso',
+        'archivo', 'nombre_descarga', 'tamano', 'mensaje_error',
+        'fecha_creacion', 'fecha_actualizacion', 'fecha_fin'
+    )
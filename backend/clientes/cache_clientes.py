@@ -0,0 +1,227 @@
+"""
+Caché en memoria de perfiles de cliente serializados
+Atiende las consultas por número de documento sin ir a la base de datos y se
+invalida por cliente cuando cambia su fila o sus estadísticas de compras, en
+todos los procesos que comparten la caché de Django CACHE_PERFILES_ALIAS
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+# Etiqueta de todas las entradas: limpiar() la invalida en todos los procesos
+ETIQUETA_TODOS = ('todos',)
+
+# Por encima de esta cantidad de etiquetas (cargas masivas) se invalida todo
+MAX_ETIQUETAS_INVALIDACION = 100
+
+
+def _version(momento):
+    """(momento, token): el token distingue una versión recreada de la que fue expulsada"""
+    return momento, uuid.uuid4().hex
+
+
+class CachePerfilesCliente:
+    """
+    Caché read-through con expulsión LRU y expiración por TTL.
+
+    Cada entrada se registra bajo etiquetas ('cliente', id) y ('documento', numero)
+    para invalidar exactamente las entradas de un cliente. Las entradas viven en
+    el proceso; la versión de cada etiqueta (momento de su última invalidación
+    y un token único) vive en la caché compartida y se compara en cada acierto,
+    así una escritura atendida por otro worker o por un comando de gestión
+    descarta las entradas de todos los procesos. Una versión ausente (expulsada
+    de la caché compartida) cuenta como fallo y se vuelve a crear con un token
+    nuevo, que no coincide con el de ninguna entrada anterior.
+    """
+
+    def __init__(self, max_entradas=None, ttl=None, alias=None):
+        self.max_entradas = max_entradas or getattr(settings, 'CACHE_PERFILES_MAX_ENTRADAS', 10000)
+        self.ttl = ttl if ttl is not None else getattr(settings, 'CACHE_PERFILES_TTL', 300)
+        self.alias = alias or getattr(settings, 'CACHE_PERFILES_ALIAS', 'default')
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()  # clave -> (expira, etiquetas, versiones, datos)
+        self._etiquetas = {}  # etiqueta -> {claves}
+        self._generacion = 0
+        self.aciertos = 0
+        self.fallos = 0
+        self.expulsiones = 0
+        self.invalidaciones = 0
+
+    def obtener(self, clave, cargar):
+        """
+        Retorna los datos de `clave`, cargándolos con `cargar()` si no están.
+        `cargar` retorna (cliente_id, numero_documento, datos) o None si no existe;
+        los resultados vacíos no se guardan.
+        """
+        encontrado, datos, generacion = self._consultar(clave)
+        if encontrado:
+            return datos
+        inicio = time.time()
+        return self._registrar(clave, generacion, inicio, cargar())
+
+    async def aobtener(self, clave, cargar):
+        """Igual que obtener, con `cargar` asíncrona (vistas servidas por ASGI)"""
+        # Las versiones se leen de la caché compartida con E/S bloqueante: fuera del event loop
+        encontrado, datos, generacion = await sync_to_async(self._consultar)(clave)
+        if encontrado:
+            return datos
+        inicio = time.time()
+        resultado = await cargar()
+        return await sync_to_async(self._registrar)(clave, generacion, inicio, resultado)
+
+    def invalidar(self, cliente_id=None, numero_documento=None):
+        """Elimina las entradas de un cliente (ahora y al confirmar la transacción)"""
+        etiquetas = []
+        if cliente_id is not None:
+            etiquetas.append(('cliente', cliente_id))
+        if numero_documento is not None:
+            etiquetas.append(('documento', numero_documento))
+
+        self._invalidar_etiquetas(etiquetas)
+        # Otra petición pudo recargar la fila anterior antes del commit
+        transaction.on_commit(lambda: self._invalidar_etiquetas(etiquetas))
+
+    def invalidar_varios(self, cliente_ids=(), numeros_documento=()):
+        etiquetas = [('cliente', cliente_id) for cliente_id in cliente_ids]
+        etiquetas += [('documento', numero) for numero in numeros_documento]
+        if len(etiquetas) > MAX_ETIQUETAS_INVALIDACION:
+            # Una versión por etiqueta costaría una escritura compartida por cliente
+            self.invalidar_todo()
+            return
+        self._invalidar_etiquetas(etiquetas)
+        transaction.on_commit(lambda: self._invalidar_etiquetas(etiquetas))
+
+    def invalidar_todo(self):
+        """Elimina todas las entradas (ahora y al confirmar la transacción)"""
+        self.limpiar()
+        transaction.on_commit(self.limpiar)
+
+    def limpiar(self):
+        """Descarta todas las entradas, en este y en los demás procesos"""
+        self._publicar_invalidacion([ETIQUETA_TODOS])
+        with self._lock:
+            self._entradas.clear()
+            self._etiquetas.clear()
+            self._generacion += 1
+
+    def estadisticas(self):
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                'entradas': len(self._entradas),
+                'max_entradas': self.max_entradas,
+                'ttl_segundos': self.ttl,
+                'cache_compartida': self.alias,
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'tasa_aciertos': round(self.aciertos / consultas, 4) if consultas else 0.0,
+                'expulsiones': self.expulsiones,
+                'invalidaciones': self.invalidaciones,
+            }
+
+    # === LECTURA Y REGISTRO ===
+
+    def _consultar(self, clave):
+        """(encontrado, datos, generación al momento de la consulta)"""
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            generacion = self._generacion
+        if entrada is not None and entrada[0] > ahora:
+            vigente = self._versiones(entrada[1]) == entrada[2]
+            with self._lock:
+                if vigente and self._entradas.get(clave) is entrada:
+                    self._entradas.move_to_end(clave)
+                    self.aciertos += 1
+                    return True, entrada[3], generacion
+                if not vigente:
+                    self.invalidaciones += 1
+        with self._lock:
+            if entrada is not None and self._entradas.get(clave) is entrada:
+                self._eliminar(clave)
+            self.fallos += 1
+            return False, None, generacion
+
+    def _registrar(self, clave, generacion, inicio, resultado):
+        if resultado is None:
+            return None
+
+        cliente_id, numero_documento, datos = resultado
+        etiquetas = (('cliente', cliente_id), ('documento', numero_documento))
+        versiones = self._versiones(etiquetas, crear=True)
+        # Una invalidación (de cualquier proceso) durante la carga puede dejar `datos` obsoletos
+        if any(version is None or version[0] >= inicio for version in versiones):
+            return datos
+        with self._lock:
+            if generacion == self._generacion:
+                self._guardar(clave, datos, etiquetas, versiones)
+        return datos
+
+    # === VERSIONES COMPARTIDAS E INVALIDACIÓN ===
+
+    @staticmethod
+    def _clave_version(etiqueta):
+        return 'perfiles:version:' + ':'.join(str(parte) for parte in etiqueta)
+
+    def _versiones(self, etiquetas, crear=False):
+        """
+        Versiones en la caché compartida de ETIQUETA_TODOS y `etiquetas`.
+        Con `crear`, las ausentes se registran con momento 0 (sin invalidaciones)
+        y un token nuevo.
+        """
+        compartida = caches[self.alias]
+        claves = [self._clave_version(etiqueta) for etiqueta in (ETIQUETA_TODOS, *etiquetas)]
+        versiones = compartida.get_many(claves)
+        if crear:
+            for clave in claves:
+                if clave not in versiones:
+                    compartida.add(clave, _version(0), timeout=None)
+                    versiones[clave] = compartida.get(clave)
+        return tuple(versiones.get(clave) for clave in claves)
+
+    def _publicar_invalidacion(self, etiquetas):
+        caches[self.alias].set_many(
+            {self._clave_version(etiqueta): _version(time.time()) for etiqueta in etiquetas}, timeout=None
+        )
+
+    def _invalidar_etiquetas(self, etiquetas):
+        self._publicar_invalidacion(etiquetas)
+        with self._lock:
+            self._generacion += 1
+            for etiqueta in etiquetas:
+                for clave in self._etiquetas.pop(etiqueta, ()):
+                    if clave in self._entradas:
+                        self._eliminar(clave)
+                        self.invalidaciones += 1
+
+    # === OPERACIONES INTERNAS (con el lock tomado) ===
+
+    def _guardar(self, clave, datos, etiquetas, versiones):
+        if clave in self._entradas:
+            self._eliminar(clave)
+        self._entradas[clave] = (time.monotonic() + self.ttl, etiquetas, versiones, datos)
+        for etiqueta in etiquetas:
+            self._etiquetas.setdefault(etiqueta, set()).add(clave)
+
+        while len(self._entradas) > self.max_entradas:
+            self._eliminar(next(iter(self._entradas)))
+            self.expulsiones += 1
+
+    def _eliminar(self, clave):
+        _, etiquetas, _, _ = self._entradas.pop(clave)
+        for etiqueta in etiquetas:
+            claves = self._etiquetas.get(etiqueta)
+            if claves is not None:
+                claves.discard(clave)
+                if not claves:
+                    del self._etiquetas[etiqueta]
+
+
+# Instancia compartida por el proceso
+cache_perfiles = CachePerfilesCliente()
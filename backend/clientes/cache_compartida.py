@@ -0,0 +1,27 @@
+"""
+Backend de la caché compartida entre procesos
+FileBasedCache lista el directorio completo en cada escritura para decidir si
+debe depurar; aquí esa revisión se hace cada CULL_CADA escrituras del proceso
+"""
+import itertools
+from django.core.cache.backends.filebased import FileBasedCache
+
+
+class FileBasedCacheDepuracionPeriodica(FileBasedCache):
+    """
+    FileBasedCache que revisa MAX_ENTRIES cada OPTIONS['CULL_CADA'] escrituras
+    (por defecto 1000). Entre revisiones el directorio puede superar MAX_ENTRIES
+    en a lo sumo ese número de archivos por proceso.
+    """
+
+    def __init__(self, dir, params):
+        super().__init__(dir, params)
+        self._cull_cada = max(1, int(params.get('OPTIONS', {}).get('CULL_CADA', 1000)))
+
+    def _cull(self):
+        # Contador del proceso: Django crea una instancia del backend por hilo
+        if next(_escrituras) % self._cull_cada == 0:
+            super()._cull()
+
+
+_escrituras = itertools.count(1)
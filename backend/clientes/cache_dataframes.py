@@ -0,0 +1,303 @@
+"""
+Instantáneas compartidas de DataFrames para los análisis con Pandas
+Las columnas cargadas de clientes y compras y los DataFrames derivados
+(p. ej. el merge de ambas tablas) se guardan una vez por proceso y versión
+de los datos y se entregan a todas las peticiones, sin volver a consultar
+la base. Un hilo en segundo plano recarga el conjunto de trabajo cuando
+cambia la versión
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db import connections
+from .cache_reportes import version_datos
+
+
+# Los DataFrames entregados comparten los arreglos de la caché: con Copy-on-Write
+# una asignación en el lugar copia antes de escribir y la instantánea no cambia
+# (en pandas 3 siempre está activo y la opción está obsoleta)
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
+
+def tamano_en_memoria(valor):
+    """Bytes de una Serie o DataFrame, incluido el contenido de los textos"""
+    if isinstance(valor, pd.Series):
+        return int(valor.memory_usage(deep=True, index=False))
+    return int(valor.memory_usage(deep=True, index=False).sum())
+
+
+class CacheDataFrames:
+    """
+    Caché de columnas por (tabla, columna) y de DataFrames derivados por
+    clave, de la versión actual de los datos, con expulsión LRU acotada por
+    tamaño en bytes.
+
+    - Los DataFrames entregados comparten los arreglos de la caché; con
+      Copy-on-Write una asignación en el lugar no altera la instantánea.
+    - Una carga en curso se comparte: las peticiones concurrentes que
+      necesitan las mismas columnas esperan la misma consulta.
+    - Al cambiar la versión de los datos las entradas anteriores se
+      descartan; el hilo de refresco (cada CACHE_DATAFRAMES_REFRESCO
+      segundos, 0 = sin hilo) recarga antes las columnas y derivados que
+      había en caché, así la primera petición después de una escritura
+      no paga la carga.
+    - Sin peticiones durante CACHE_DATAFRAMES_INACTIVIDAD segundos el hilo
+      descarta la instantánea y termina; la próxima petición lo reinicia.
+    """
+
+    def __init__(self, cargar, max_bytes=None):
+        self.cargar = cargar  # (tabla, columnas) -> DataFrame con 'id' y las columnas
+        self.max_bytes = max_bytes or getattr(settings, 'CACHE_DATAFRAMES_MAX_BYTES', 256 * 1024 * 1024)
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()  # ('columna', tabla, columna) / ('derivado', clave) -> (valor, bytes)
+        self._calculos = {}  # clave de derivado -> función que lo calcula (para el refresco)
+        self._cargas = {}  # carga en curso -> Future
+        self._bytes = 0
+        self._version = None
+        self._pid = None
+        self._hilo = None
+        self._ultimo_uso = time.monotonic()
+        self.aciertos = 0
+        self.fallos = 0
+        self.cargas = 0
+        self.expulsiones = 0
+        self.invalidaciones = 0
+        self.omitidas = 0
+        self.refrescos = 0
+        self.errores_refresco = 0
+        self.expiraciones = 0
+
+    # === LECTURA ===
+
+    def tabla(self, tabla, columnas, version=None):
+        """DataFrame de `tabla` con 'id' y `columnas` de la versión actual de los datos"""
+        version = self._activar(version)
+        columnas = list(dict.fromkeys(['id', *columnas]))
+        with self._lock:
+            presentes = {
+                columna: self._tomar(('columna', tabla, columna)) for columna in columnas
+            }
+        presentes = {columna: serie for columna, serie in presentes.items() if serie is not None}
+        faltantes = [columna for columna in columnas if columna not in presentes]
+
+        if faltantes:
+            marco = self._una_vez(('tabla', tabla, tuple(faltantes), version), lambda: self._cargar(tabla, faltantes))
+            if 'id' in presentes and not np.array_equal(presentes['id'].to_numpy(), marco['id'].to_numpy()):
+                # Los datos cambiaron entre una carga y otra sin cambiar la versión: se
+                # recarga la tabla completa para que todas las columnas sean de las mismas filas
+                marco = self._una_vez(('tabla', tabla, tuple(columnas), version), lambda: self._cargar(tabla, columnas))
+                presentes = {}
+            presentes.update({columna: marco[columna] for columna in marco.columns})
+            with self._lock:
+                if version == self._version:
+                    for columna in marco.columns:
+                        self._guardar(('columna', tabla, columna), marco[columna])
+
+        return pd.DataFrame({columna: presentes[columna] for columna in columnas}, copy=False)
+
+    def derivado(self, clave, calcular, version=None):
+        """
+        DataFrame derivado de las tablas bajo `clave`, calculado con
+        `calcular()` si no está en caché. `calcular` debe obtener sus tablas
+        de esta caché: el refresco la vuelve a llamar con la versión nueva.
+        """
+        version = self._activar(version)
+        with self._lock:
+            valor = self._tomar(('derivado', clave))
+            self._calculos[clave] = calcular
+        if valor is not None:
+            return valor
+        valor = self._una_vez(('derivado', clave, version), calcular)
+        with self._lock:
+            if version == self._version:
+                self._guardar(('derivado', clave), valor)
+        return valor
+
+    # === VERSIONES Y REFRESCO ===
+
+    def _activar(self, version):
+        """Versión actual; si cambió, espera el refresco en curso o descarta la instantánea anterior"""
+        self._iniciar_refresco()
+        version = version or version_datos()
+        with self._lock:
+            if version == self._version:
+                return version
+            refresco = self._cargas.get(('refresco', version))
+        if refresco is not None:
+            refresco.result()
+        with self._lock:
+            if version != self._version:
+                self._descartar_todo()
+                self._version = version
+        return version
+
+    def refrescar(self):
+        """
+        Si cambió la versión de los datos, carga las columnas y derivados de la
+        instantánea actual para la versión nueva y los reemplaza de una vez.
+        Retorna True si hubo refresco.
+        """
+        version = version_datos()
+        with self._lock:
+            if version == self._version or not self._entradas:
+                return False
+            columnas = {}
+            for clave in self._entradas:
+                if clave[0] == 'columna':
+                    columnas.setdefault(clave[1], []).append(clave[2])
+            derivados = [
+                (clave[1], self._calculos[clave[1]])
+                for clave in self._entradas if clave[0] == 'derivado' and clave[1] in self._calculos
+            ]
+
+        def recargar():
+            marcos = {tabla: self._cargar(tabla, nombres) for tabla, nombres in columnas.items()}
+            with self._lock:
+                self._descartar_todo()
+                self._version = version
+                for tabla, marco in marcos.items():
+                    for columna in marco.columns:
+                        self._guardar(('columna', tabla, columna), marco[columna])
+            # Los derivados se calculan ya sobre las columnas nuevas
+            for clave, calcular in derivados:
+                self.derivado(clave, calcular, version)
+
+        self._una_vez(('refresco', version), recargar)
+        with self._lock:
+            self.refrescos += 1
+        return True
+
+    def _iniciar_refresco(self):
+        intervalo = getattr(settings, 'CACHE_DATAFRAMES_REFRESCO', 30)
+        with self._lock:
+            # Las recargas del propio hilo no cuentan como uso
+            if threading.current_thread() is not self._hilo:
+                self._ultimo_uso = time.monotonic()
+            # Un proceso hijo (fork) arranca su propio hilo
+            if intervalo <= 0 or self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            hilo = self._hilo = threading.Thread(
+                target=self._refrescar_periodicamente, args=(intervalo,),
+                name='refresco-dataframes', daemon=True
+            )
+        hilo.start()
+
+    def _refrescar_periodicamente(self, intervalo):
+        inactividad = getattr(settings, 'CACHE_DATAFRAMES_INACTIVIDAD', 600)
+        while True:
+            time.sleep(intervalo)
+            with self._lock:
+                if inactividad > 0 and time.monotonic() - self._ultimo_uso > inactividad:
+                    # Sin uso: se libera la memoria y termina el hilo
+                    self._descartar_todo()
+                    self._calculos.clear()
+                    self._version = self._pid = self._hilo = None
+                    self.expiraciones += 1
+                    return
+            try:
+                self.refrescar()
+            except Exception:
+                with self._lock:
+                    self.errores_refresco += 1
+            finally:
+                connections.close_all()
+
+    def _una_vez(self, clave, calcular):
+        """Ejecuta `calcular()` una sola vez para las peticiones concurrentes con la misma `clave`"""
+        with self._lock:
+            futuro = self._cargas.get(clave)
+            propio = futuro is None
+            if propio:
+                futuro = self._cargas[clave] = Future()
+        if not propio:
+            return futuro.result()
+        try:
+            resultado = calcular()
+            futuro.set_result(resultado)
+            return resultado
+        except BaseException as e:
+            futuro.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._cargas.pop(clave, None)
+
+    def _cargar(self, tabla, columnas):
+        marco = self.cargar(tabla, columnas)
+        with self._lock:
+            self.cargas += 1
+        return marco
+
+    # === ADMINISTRACIÓN ===
+
+    def limpiar(self):
+        with self._lock:
+            self._descartar_todo()
+            self._version = None
+
+    def estadisticas(self):
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            columnas = {}
+            derivados = []
+            for clave, (_, tamano) in self._entradas.items():
+                if clave[0] == 'columna':
+                    columnas.setdefault(clave[1], {})[clave[2]] = tamano
+                else:
+                    derivados.append({'clave': repr(clave[1]), 'bytes': tamano})
+            return {
+                'version': list(self._version) if self._version else None,
+                'entradas': len(self._entradas),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'tasa_aciertos': round(self.aciertos / consultas, 4) if consultas else 0.0,
+                'cargas': self.cargas,
+                'expulsiones': self.expulsiones,
+                'invalidaciones': self.invalidaciones,
+                'omitidas_por_tamano': self.omitidas,
+                'refrescos': self.refrescos,
+                'errores_refresco': self.errores_refresco,
+                'expiraciones_por_inactividad': self.expiraciones,
+                'columnas': columnas,
+                'derivados': derivados,
+            }
+
+    # === OPERACIONES INTERNAS (con el lock tomado) ===
+
+    def _tomar(self, clave):
+        entrada = self._entradas.get(clave)
+        if entrada is None:
+            self.fallos += 1
+            return None
+        self._entradas.move_to_end(clave)
+        self.aciertos += 1
+        return entrada[0]
+
+    def _guardar(self, clave, valor):
+        tamano = tamano_en_memoria(valor)
+        if tamano > self.max_bytes:
+            self.omitidas += 1
+            return
+        if clave in self._entradas:
+            self._bytes -= self._entradas.pop(clave)[1]
+        self._entradas[clave] = (valor, tamano)
+        self._bytes += tamano
+
+        while self._bytes > self.max_bytes:
+            _, (_, expulsado) = self._entradas.popitem(last=False)
+            self._bytes -= expulsado
+            self.expulsiones += 1
+
+    def _descartar_todo(self):
+        self.invalidaciones += len(self._entradas)
+        self._entradas.clear()
+        self._bytes = 0
@@ -0,0 +1,151 @@
+"""
+Caché en memoria de reportes y análisis
+Los resultados se guardan bajo (reporte, parámetros, versión de los datos):
+mientras no se escriba un cliente o una compra, las consultas repetidas se
+atienden sin recalcular
+"""
+import json
+import pickle
+import threading
+from collections import OrderedDict
+from functools import wraps
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from .models import Cliente, Compra, ContadorCambios
+
+
+def _sql_version_datos():
+    tabla = connection.ops.quote_name
+    ultima = 'SELECT MAX(fecha_actualizacion) FROM {}'
+    return (
+        f'SELECT ({ultima.format(tabla(Cliente._meta.db_table))}), '
+        f'({ultima.format(tabla(Compra._meta.db_table))}), '
+        f'(SELECT valor FROM {tabla(ContadorCambios._meta.db_table)} WHERE clave = %s)'
+    )
+
+
+def version_datos():
+    """
+    Versión de los datos que alimentan reportes y exportaciones: última
+    modificación de clientes y compras, el contador de borrados y de cambios
+    del catálogo de tipos de documento (ContadorCambios) y el día actual (los
+    reportes incluyen la fecha y la ventana de fidelización se cuenta desde
+    hoy). Es una sola consulta y cada MAX() va en su propia subconsulta, así
+    el motor lo lee del extremo del índice de fecha_actualizacion.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(_sql_version_datos(), [ContadorCambios.VERSION_DATOS])
+        clientes, compras, cambios = cursor.fetchone()
+    return (str(timezone.localdate()), str(clientes), str(compras), cambios or 0)
+
+
+class CacheReportes:
+    """
+    Caché de resultados con expulsión LRU acotada por tamaño en bytes.
+
+    Los resultados se guardan serializados con pickle: el tamaño de cada
+    entrada es exacto y cada acierto entrega una copia nueva. Cuando cambia
+    la versión de los datos, las entradas de versiones anteriores ya no
+    pueden acertar y se descartan. La caché es local al proceso.
+    """
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes or getattr(settings, 'CACHE_REPORTES_MAX_BYTES', 64 * 1024 * 1024)
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()  # (reporte, parámetros, versión) -> datos serializados
+        self._bytes = 0
+        self._version = None
+        self.aciertos = 0
+        self.fallos = 0
+        self.expulsiones = 0
+        self.invalidaciones = 0
+        self.omitidas = 0
+
+    def obtener(self, reporte, parametros, calcular, version=None):
+        """
+        Retorna el resultado de `reporte` con `parametros` (valor hashable),
+        calculándolo con `calcular()` si no está en caché para la versión
+        actual de los datos.
+        """
+        version = version or version_datos()
+        clave = (reporte, parametros, version)
+        with self._lock:
+            if version != self._version:
+                self._descartar_todo()
+                self._version = version
+            serializado = self._entradas.get(clave)
+            if serializado is not None:
+                self._entradas.move_to_end(clave)
+                self.aciertos += 1
+                return pickle.loads(serializado)
+            self.fallos += 1
+
+        resultado = calcular()
+        serializado = pickle.dumps(resultado, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            if len(serializado) > self.max_bytes:
+                self.omitidas += 1
+            elif version == self._version:
+                self._guardar(clave, serializado)
+        return resultado
+
+    def limpiar(self):
+        with self._lock:
+            self._descartar_todo()
+
+    def estadisticas(self):
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                'entradas': len(self._entradas),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'tasa_aciertos': round(self.aciertos / consultas, 4) if consultas else 0.0,
+                'expulsiones': self.expulsiones,
+                'invalidaciones': self.invalidaciones,
+                'omitidas_por_tamano': self.omitidas,
+            }
+
+    # === OPERACIONES INTERNAS (con el lock tomado) ===
+
+    def _guardar(self, clave, serializado):
+        if clave in self._entradas:
+            self._bytes -= len(self._entradas.pop(clave))
+        self._entradas[clave] = serializado
+        self._bytes += len(serializado)
+
+        while self._bytes > self.max_bytes:
+            _, expulsado = self._entradas.popitem(last=False)
+            self._bytes -= len(expulsado)
+            self.expulsiones += 1
+
+    def _descartar_todo(self):
+        self.invalidaciones += len(self._entradas)
+        self._entradas.clear()
+        self._bytes = 0
+
+
+# Instancia compartida por el proceso
+cache_reportes = CacheReportes()
+
+
+def con_cache_reportes(reporte):
+    """
+    Decorador para métodos de análisis: el resultado se guarda en
+    cache_reportes bajo `reporte` y los argumentos de la llamada. La versión
+    de los datos se consulta una vez y queda en `self.version`, la misma con
+    la que el análisis carga sus tablas.
+    """
+    def decorador(metodo):
+        @wraps(metodo)
+        def envoltura(self, *args, **kwargs):
+            self.version = self.version or version_datos()
+            parametros = json.dumps([args, kwargs], sort_keys=True, default=str)
+            return cache_reportes.obtener(
+                reporte, parametros, lambda: metodo(self, *args, **kwargs), version=self.version
+            )
+        return envoltura
+    return decorador
@@ -0,0 +1,234 @@
+"""
+Compresión de respuestas con zstd o gzip
+Las respuestas de texto (CSV, TXT, JSON) se comprimen a medida que se envían,
+fragmento a fragmento, sin acumular el cuerpo. Las exportaciones repetidas
+sobre los mismos datos se sirven desde el cuerpo comprimido guardado en disco
+"""
+import hashlib
+import json
+import os
+import re
+import uuid
+import zlib
+import pyarrow as pa
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.http import content_disposition_header
+from .cache_reportes import version_datos
+from .exportacion_columnar import SalidaPorFragmentos
+from .trabajos_exportacion import directorio_exportaciones
+
+
+# En orden de preferencia cuando el cliente acepta varias con la misma calidad
+CODIFICACIONES = ('zstd', 'gzip')
+
+EXTENSIONES = {'zstd': '.zst', 'gzip': '.gz'}
+
+TIPOS_COMPRIMIBLES = ('text/', 'application/json')
+
+# No vale la pena comprimir respuestas muy cortas
+TAMANO_MINIMO = 200
+
+NIVEL_GZIP = 6
+
+CALIDAD = re.compile(r'\bq=([0-9.]+)')
+
+
+def codificacion_aceptada(request):
+    """'zstd', 'gzip' o None según Accept-Encoding (q=0 excluye la codificación)"""
+    calidades = {}
+    for parte in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        nombre, _, parametros = parte.partition(';')
+        coincidencia = CALIDAD.search(parametros)
+        try:
+            calidad = float(coincidencia.group(1)) if coincidencia else 1.0
+        except ValueError:
+            calidad = 0.0
+        calidades[nombre.strip().lower()] = calidad
+
+    def calidad(codificacion):
+        return calidades.get(codificacion, calidades.get('*', 0.0))
+
+    aceptadas = [codificacion for codificacion in CODIFICACIONES if calidad(codificacion) > 0]
+    return max(aceptadas, key=calidad, default=None)
+
+
+def comprimible(content_type):
+    return content_type.startswith(TIPOS_COMPRIMIBLES)
+
+
+class Compresor:
+    """
+    Compresor incremental: cada `comprimir` retorna lo que el cliente ya puede
+    descomprimir (flush de sincronización), así cada fragmento sale sin esperar
+    al siguiente. zstd usa el códec de pyarrow (formato de trama estándar).
+    """
+
+    def __init__(self, codificacion):
+        self.codificacion = codificacion
+        if codificacion == 'gzip':
+            self._gzip = zlib.compressobj(NIVEL_GZIP, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        else:
+            self._salida = SalidaPorFragmentos()
+            self._zstd = pa.CompressedOutputStream(pa.PythonFile(self._salida, mode='w'), 'zstd')
+
+    def comprimir(self, datos):
+        if not datos:
+            return b''
+        if self.codificacion == 'gzip':
+            return self._gzip.compress(datos) + self._gzip.flush(zlib.Z_SYNC_FLUSH)
+        self._zstd.write(datos)
+        self._zstd.flush()
+        return self._salida.vaciar()
+
+    def terminar(self):
+        if self.codificacion == 'gzip':
+            return self._gzip.flush()
+        self._zstd.close()
+        return self._salida.vaciar()
+
+
+def _bytes(fragmento):
+    return fragmento.encode('utf-8') if isinstance(fragmento, str) else bytes(fragmento)
+
+
+def comprimir_fragmentos(fragmentos, codificacion):
+    compresor = Compresor(codificacion)
+    for fragmento in fragmentos:
+        comprimido = compresor.comprimir(_bytes(fragmento))
+        if comprimido:
+            yield comprimido
+    yield compresor.terminar()
+
+
+async def acomprimir_fragmentos(fragmentos, codificacion):
+    compresor = Compresor(codificacion)
+    async for fragmento in fragmentos:
+        comprimido = compresor.comprimir(_bytes(fragmento))
+        if comprimido:
+            yield comprimido
+    yield compresor.terminar()
+
+
+def comprimir(datos, codificacion):
+    compresor = Compresor(codificacion)
+    return compresor.comprimir(datos) + compresor.terminar()
+
+
+class CompresionMiddleware(MiddlewareMixin):
+    """
+    Comprime con zstd o gzip (según Accept-Encoding) las respuestas de texto
+    y JSON, incluidas las de streaming, que se comprimen por fragmentos.
+    Como GZipMiddleware, debilita el ETag: el cuerpo cambia pero el recurso es
+    el mismo, y las peticiones condicionales siguen coincidiendo.
+    """
+
+    def process_response(self, request, response):
+        if (
+            response.status_code != 200
+            or response.has_header('Content-Encoding')
+            or not comprimible(response.get('Content-Type', ''))
+            or (not response.streaming and len(response.content) < TAMANO_MINIMO)
+        ):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        codificacion = codificacion_aceptada(request)
+        if codificacion is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = acomprimir_fragmentos(response.streaming_content, codificacion)
+            else:
+                response.streaming_content = comprimir_fragmentos(response.streaming_content, codificacion)
+            # El tamaño comprimido solo se conoce al terminar
+            del response.headers['Content-Length']
+        else:
+            comprimido = comprimir(response.content, codificacion)
+            if len(comprimido) >= len(response.content):
+                return response
+            response.content = comprimido
+            response.headers['Content-Length'] = str(len(comprimido))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = codificacion
+        return response
+
+
+# === CUERPOS PRECOMPRIMIDOS ===
+
+def guardar_al_enviar(fragmentos, ruta, al_guardar=None):
+    """
+    Entrega `fragmentos` y a la vez los escribe en un archivo temporal que se
+    renombra a `ruta` solo si el envío termina; una descarga interrumpida no
+    deja un archivo incompleto.
+    """
+    parcial = ruta.with_name(f'{ruta.name}.{uuid.uuid4().hex}.parcial')
+    completo = False
+    try:
+        with open(parcial, 'wb') as archivo:
+            for fragmento in fragmentos:
+                archivo.write(fragmento)
+                yield fragmento
+        os.replace(parcial, ruta)
+        completo = True
+        if al_guardar:
+            al_guardar()
+    finally:
+        if not completo:
+            parcial.unlink(missing_ok=True)
+
+
+def respuesta_precomprimida(codificacion, ruta, generar, content_type, nombre_descarga, al_guardar=None):
+    """
+    Descarga comprimida con `codificacion`: desde `ruta` si ya existe o, si no,
+    comprimiendo los fragmentos de `generar()` mientras se envían y guardando
+    el resultado en `ruta` para las descargas siguientes.
+    """
+    if ruta.exists():
+        response = FileResponse(open(ruta, 'rb'), content_type=content_type)
+    else:
+        response = StreamingHttpResponse(
+            guardar_al_enviar(comprimir_fragmentos(generar(), codificacion), ruta, al_guardar),
+            content_type=content_type
+        )
+    response['Content-Encoding'] = codificacion
+    response['Content-Disposition'] = content_disposition_header(True, nombre_descarga)
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+def _hash(valor):
+    return hashlib.sha256(json.dumps(valor, default=str).encode()).hexdigest()
+
+
+def respuesta_exportacion(request, clave, generar, content_type, nombre_descarga):
+    """
+    Respuesta de una exportación de texto por fragmentos. Si el cliente acepta
+    compresión, el cuerpo comprimido se guarda bajo (`clave`, versión de los
+    datos): mientras los datos no cambien, las repeticiones lo leen de disco
+    sin volver a generar ni comprimir. Al guardar una versión nueva se borran
+    las anteriores de la misma clave.
+    """
+    codificacion = codificacion_aceptada(request) if comprimible(content_type) else None
+    if codificacion is None:
+        response = StreamingHttpResponse(generar(), content_type=content_type)
+        response['Content-Disposition'] = content_disposition_header(True, nombre_descarga)
+        return response
+
+    directorio = directorio_exportaciones() / 'comprimidos'
+    directorio.mkdir(exist_ok=True)
+    prefijo = _hash(clave)[:32]
+    extension = EXTENSIONES[codificacion]
+    ruta = directorio / f'{prefijo}-{_hash(version_datos())[:16]}{extension}'
+
+    def descartar_anteriores():
+        for anterior in directorio.glob(f'{prefijo}-*{extension}'):
+            if anterior != ruta:
+                anterior.unlink(missing_ok=True)
+
+    return respuesta_precomprimida(codificacion, ruta, generar, content_type, nombre_descarga, descartar_anteriores)
@@ -0,0 +1,467 @@
+"""
+Exportaciones de clientes en memoria acotada
+Las filas se leen por lotes con paginación keyset y cada lote se formatea
+con Pandas de forma vectorizada; el CSV y el TXT se emiten a medida que se
+generan y el Excel se escribe en modo de solo escritura sobre un archivo temporal
+"""
+import pickle
+import tempfile
+from datetime import date
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, Side
+from openpyxl.utils import get_column_letter
+from django.db.models import Avg, Count, Max, Min, Q, Sum
+from .models import Cliente, Compra, TipoDocumento
+from .paginacion import filtro_despues_de
+from .services_fidelizacion import candidatos_fidelizacion
+
+
+TAMANO_LOTE_EXPORTACION = 5000
+
+CAMPOS_EXPORTACION_CLIENTES = [
+    'id', 'primer_nombre', 'segundo_nombre', 'primer_apellido', 'segundo_apellido',
+    'correo', 'telefono', 'direccion', 'ciudad', 'departamento',
+    'tipo_documento__nombre', 'numero_documento', 'fecha_registro', 'activo',
+]
+
+# Columna del lote -> encabezado del archivo exportado
+COLUMNAS_EXPORTACION_CLIENTES = {
+    'id': 'ID',
+    'tipo_documento__nombre': 'Tipo Documento',
+    'numero_documento': 'Número Documento',
+    'nombre_completo': 'Nombre Completo',
+    'correo': 'Email',
+    'telefono': 'Teléfono',
+    'direccion': 'Dirección',
+    'ciudad': 'Ciudad',
+    'departamento': 'Departamento',
+    'fecha_registro': 'Fecha Registro',
+    'estado': 'Estado',
+}
+
+ORDEN_EXPORTACION_CLIENTES = ('-fecha_registro', '-id')
+
+
+def iterar_lotes(queryset, campos, orden, tamano_lote=TAMANO_LOTE_EXPORTACION):
+    """
+    Recorre un QuerySet en DataFrames de hasta `tamano_lote` filas.
+
+    Cada lote es una consulta independiente que continúa después de la clave
+    de orden de la fila anterior (sin OFFSET ni cursores abiertos entre lotes),
+    así la memoria depende del tamaño del lote y no del tamaño de la tabla.
+    """
+    campos_orden = [campo.lstrip('-') for campo in orden]
+    consulta = queryset.order_by(*orden).values(*campos, *[c for c in campos_orden if c not in campos])
+    clave = None
+
+    while True:
+        lote = consulta if clave is None else consulta.filter(filtro_despues_de(orden, clave))
+        filas = list(lote[:tamano_lote])
+        if not filas:
+            return
+        clave = [filas[-1][campo] for campo in campos_orden]
+        yield pd.DataFrame(filas, columns=list(campos))
+        if len(filas) < tamano_lote:
+            return
+
+
+def nombre_completo(lote):
+    """Nombre completo vectorizado (mismo formato que Cliente.nombre_completo)"""
+    return (
+        lote['primer_nombre'].fillna('') + ' ' +
+        lote['segundo_nombre'].fillna('') + ' ' +
+        lote['primer_apellido'].fillna('') + ' ' +
+        lote['segundo_apellido'].fillna('')
+    ).str.replace('  ', ' ').str.strip()
+
+
+def formatear_lote_clientes(lote):
+    """Convierte un lote de valores de Cliente en las columnas de exportación"""
+    lote = lote.assign(
+        nombre_completo=nombre_completo(lote),
+        fecha_registro=pd.to_datetime(lote['fecha_registro']).dt.strftime('%d/%m/%Y'),
+        estado=lote['activo'].map({True: 'Activo', False: 'Inactivo'}),
+    )
+    return lote[list(COLUMNAS_EXPORTACION_CLIENTES)].rename(columns=COLUMNAS_EXPORTACION_CLIENTES)
+
+
+def lotes_clientes_exportacion(tamano_lote=TAMANO_LOTE_EXPORTACION):
+    """Lotes de clientes ya formateados para exportar, en orden de registro descendente"""
+    queryset = Cliente.objects.select_related('tipo_documento')
+    for lote in iterar_lotes(queryset, CAMPOS_EXPORTACION_CLIENTES, ORDEN_EXPORTACION_CLIENTES, tamano_lote):
+        yield formatear_lote_clientes(lote)
+
+
+def con_progreso(lotes, total, progreso):
+    """Reenvía los lotes informando a `progreso` la fracción de `total` filas ya entregadas"""
+    filas = 0
+    for lote in lotes:
+        yield lote
+        filas += len(lote)
+        progreso(filas / total if total else 1)
+
+
+def sin_progreso(fraccion):
+    pass
+
+
+def generar_csv_clientes(tamano_lote=TAMANO_LOTE_EXPORTACION, progreso=sin_progreso):
+    """Genera el CSV de clientes por fragmentos: encabezado primero y luego un fragmento por lote"""
+    yield ','.join(COLUMNAS_EXPORTACION_CLIENTES.values()) + '\n'
+    lotes = lotes_clientes_exportacion(tamano_lote)
+    if progreso is not sin_progreso:
+        lotes = con_progreso(lotes, Cliente.objects.count(), progreso)
+    for lote in lotes:
+        yield lote.to_csv(index=False, header=False)
+
+
+# === EXCEL DE SOLO ESCRITURA ===
+
+ANCHO_MAXIMO_COLUMNA = 50
+
+# Mismo estilo de encabezado que aplica pandas.DataFrame.to_excel
+BORDE_ENCABEZADO = Border(*(Side(style='thin'),) * 4)
+
+
+class LibroExcel:
+    """
+    Libro XLSX en modo de solo escritura (openpyxl write_only).
+
+    Las filas se escriben a medida que llegan los lotes y openpyxl las vuelca a
+    disco por hoja; el libro final se guarda en un archivo temporal, nunca
+    completo en memoria. Como las hojas de solo escritura fijan el ancho de las
+    columnas antes de la primera fila, los lotes después del primero pasan por
+    un archivo temporal mientras se lleva el ancho máximo de cada columna
+    (longitudes vectorizadas por lote) y se escriben al final.
+    """
+
+    def __init__(self):
+        self.libro = Workbook(write_only=True)
+
+    def agregar_hoja(self, nombre, lotes, filas_finales=()):
+        """
+        Escribe una hoja con los DataFrames de `lotes` (mismas columnas) y, al
+        final, tras una fila en blanco, las filas de texto de `filas_finales`.
+        """
+        hoja = self.libro.create_sheet(nombre)
+        lotes = iter(lotes)
+        primero = next(lotes, None)
+        if primero is None:
+            return hoja
+
+        anchos = anchos_columnas(primero, filas_finales)
+        with tempfile.TemporaryFile() as pendientes:
+            cantidad = 0
+            for lote in lotes:
+                anchos = [max(ancho, otro) for ancho, otro in zip(anchos, anchos_columnas(lote))]
+                pickle.dump(lote, pendientes, protocol=pickle.HIGHEST_PROTOCOL)
+                cantidad += 1
+
+            for indice, ancho in enumerate(anchos, start=1):
+                hoja.column_dimensions[get_column_letter(indice)].width = ancho
+
+            hoja.append([self._celda_encabezado(hoja, columna) for columna in primero.columns])
+            for fila in filas_excel(primero):
+                hoja.append(fila)
+            pendientes.seek(0)
+            for _ in range(cantidad):
+                for fila in filas_excel(pickle.load(pendientes)):
+                    hoja.append(fila)
+
+        if filas_finales:
+            hoja.append([])
+            for fila in filas_finales:
+                hoja.append(list(fila))
+        return hoja
+
+    def guardar(self, archivo=None):
+        """
+        Guarda el libro en `archivo` o, si no se indica, en un archivo temporal
+        (se elimina al cerrarlo); retorna el archivo posicionado al inicio
+        """
+        archivo = archivo or tempfile.TemporaryFile(suffix='.xlsx')
+        self.libro.save(archivo)
+        archivo.seek(0)
+        return archivo
+
+    @staticmethod
+    def _celda_encabezado(hoja, valor):
+        celda = WriteOnlyCell(hoja, value=str(valor))
+        celda.font = Font(bold=True)
+        celda.alignment = Alignment(horizontal='center', vertical='top')
+        celda.border = BORDE_ENCABEZADO
+        return celda
+
+
+def anchos_columnas(lote, filas_finales=()):
+    """Ancho de cada columna: texto más largo (encabezado incluido) + 2, máximo 50"""
+    anchos = []
+    for posicion, columna in enumerate(lote.columns):
+        largo = max(len(str(columna)), int(lote[columna].astype(str).str.len().max() or 0))
+        for fila in filas_finales:
+            if posicion < len(fila):
+                largo = max(largo, len(str(fila[posicion])))
+        anchos.append(min(largo + 2, ANCHO_MAXIMO_COLUMNA))
+    return anchos
+
+
+def filas_excel(lote):
+    """Filas de un DataFrame como tuplas de valores de Python (NaN/NaT -> celda vacía)"""
+    objeto = lote.astype(object)
+    return objeto.where(lote.notna(), None).itertuples(index=False, name=None)
+
+
+# === ANÁLISIS AGREGADOS PARA EL EXCEL COMPLETO ===
+
+def _fechas_sin_zona(serie):
+    """Fechas con zona de la base a datetime UTC sin zona (Excel no admite zonas)"""
+    return pd.to_datetime(serie, utc=True).dt.tz_localize(None)
+
+
+def analisis_tipos_documento():
+    """Clientes por tipo de documento: cantidad, primer y último registro y activos"""
+    filas = Cliente.objects.values('tipo_documento__nombre').annotate(
+        cantidad=Count('id'),
+        primero=Min('fecha_registro'),
+        ultimo=Max('fecha_registro'),
+        activos=Count('id', filter=Q(activo=True)),
+    ).order_by('tipo_documento__nombre')
+    analisis = pd.DataFrame(list(filas), columns=['tipo_documento__nombre', 'cantidad', 'primero', 'ultimo', 'activos'])
+    analisis['primero'] = _fechas_sin_zona(analisis['primero'])
+    analisis['ultimo'] = _fechas_sin_zona(analisis['ultimo'])
+    analisis.columns = ['Tipo Documento', 'Cantidad Total', 'Primer Registro', 'Último Registro', 'Clientes Activos']
+    return analisis
+
+
+def analisis_compras_por_estado():
+    """Monto total, promedio, cantidad y rango de fechas de las compras por estado"""
+    filas = Compra.objects.values('estado').annotate(
+        monto_total=Sum('total'),
+        monto_promedio=Avg('total'),
+        cantidad=Count('id'),
+        fecha_min=Min('fecha_compra'),
+        fecha_max=Max('fecha_compra'),
+    ).order_by('estado')
+    analisis = pd.DataFrame(
+        list(filas), columns=['estado', 'monto_total', 'monto_promedio', 'cantidad', 'fecha_min', 'fecha_max']
+    )
+    analisis['monto_total'] = analisis['monto_total'].astype(float).round(2)
+    analisis['monto_promedio'] = analisis['monto_promedio'].astype(float).round(2)
+    analisis['fecha_min'] = _fechas_sin_zona(analisis['fecha_min'])
+    analisis['fecha_max'] = _fechas_sin_zona(analisis['fecha_max'])
+    analisis.columns = ['estado', 'Monto_Total', 'Monto_Promedio', 'Cantidad', 'Fecha_Min', 'Fecha_Max']
+    return analisis
+
+
+def top_clientes_compras(limite=20):
+    """Clientes con mayor monto comprado (todas las compras, cualquier estado)"""
+    filas = Compra.objects.values('cliente_id').annotate(
+        monto_total=Sum('total'),
+        cantidad=Count('id'),
+        primera=Min('fecha_compra'),
+        ultima=Max('fecha_compra'),
+    ).order_by('-monto_total', 'cliente_id')[:limite]
+    top = pd.DataFrame(list(filas), columns=['cliente_id', 'monto_total', 'cantidad', 'primera', 'ultima'])
+    top['monto_total'] = top['monto_total'].astype(float).round(2)
+    top['primera'] = _fechas_sin_zona(top['primera'])
+    top['ultima'] = _fechas_sin_zona(top['ultima'])
+    top.columns = ['cliente_id', 'Monto_Total', 'Cantidad_Compras', 'Primera_Compra', 'Última_Compra']
+    return top
+
+
+def estadisticas_generales():
+    """Métricas generales de clientes y compras en dos consultas agregadas"""
+    clientes = Cliente.objects.aggregate(
+        total=Count('id'),
+        activos=Count('id', filter=Q(activo=True)),
+        tipos=Count('tipo_documento__nombre', distinct=True),
+        ciudades=Count('ciudad', distinct=True),
+        departamentos=Count('departamento', distinct=True),
+    )
+    metricas = [
+        ('Total Clientes', clientes['total']),
+        ('Clientes Activos', clientes['activos']),
+        ('Clientes Inactivos', clientes['total'] - clientes['activos']),
+        ('Tipos de Documento', clientes['tipos']),
+        ('Ciudades Diferentes', clientes['ciudades']),
+        ('Departamentos Diferentes', clientes['departamentos']),
+    ]
+
+    compras = Compra.objects.aggregate(cantidad=Count('id'), monto=Sum('total'), promedio=Avg('total'))
+    if compras['cantidad']:
+        mas_activo = Compra.objects.values('cliente_id').annotate(
+            cantidad=Count('id')
+        ).order_by('-cantidad', 'cliente_id').values_list('cliente_id', flat=True)[:1]
+        metricas += [
+            ('Total Compras', compras['cantidad']),
+            ('Monto Total Ventas', f"${float(compras['monto']):,.0f}"),
+            ('Ticket Promedio', f"${float(compras['promedio']):,.0f}"),
+            ('Cliente Más Activo (Compras)', mas_activo[0]),
+        ]
+    return pd.DataFrame(metricas, columns=['Métrica', 'Valor'])
+
+
+# === ARCHIVOS COMPLETOS (vistas síncronas y trabajos en segundo plano) ===
+
+def libro_excel_completo(progreso=sin_progreso):
+    """Libro con la hoja de clientes por lotes, los análisis agregados y las estadísticas"""
+    libro = LibroExcel()
+
+    lotes = lotes_clientes_exportacion()
+    if progreso is not sin_progreso:
+        lotes = con_progreso(lotes, Cliente.objects.count(), progreso)
+    libro.agregar_hoja('Clientes', (lote.drop(columns=['Dirección']) for lote in lotes))
+
+    libro.agregar_hoja('Análisis Tipos Doc', [analisis_tipos_documento()])
+    if Compra.objects.exists():
+        libro.agregar_hoja('Análisis Compras', [analisis_compras_por_estado()])
+        libro.agregar_hoja('Top 20 Clientes', [top_clientes_compras(20)])
+    libro.agregar_hoja('Estadísticas', [estadisticas_generales()])
+    return libro
+
+
+def reporte_fidelizacion(monto_minimo, dias):
+    """Candidatos a fidelización con las columnas y formatos del reporte (vacío si no hay)"""
+    # Total, cantidad y última compra de la ventana en una sola consulta
+    candidatos = pd.DataFrame(list(candidatos_fidelizacion(monto_minimo, dias).values(
+        'id', 'primer_nombre', 'segundo_nombre', 'primer_apellido', 'segundo_apellido',
+        'correo', 'telefono', 'ciudad', 'departamento',
+        'tipo_documento__nombre', 'numero_documento',
+        'total_ventana', 'cantidad_ventana', 'ultima_compra_ventana'
+    )))
+    if candidatos.empty:
+        return candidatos
+
+    # La consulta ya viene ordenada por monto del último mes (mayor a menor)
+    reporte = pd.DataFrame({
+        'ID Cliente': candidatos['id'],
+        'Tipo Documento': candidatos['tipo_documento__nombre'],
+        'Número Documento': candidatos['numero_documento'],
+        'Nombre Completo': nombre_completo(candidatos),
+        'Email': candidatos['correo'],
+        'Teléfono': candidatos['telefono'],
+        'Ciudad': candidatos['ciudad'],
+        'Departamento': candidatos['departamento'],
+        'Total Último Mes (COP)': candidatos['total_ventana'].astype(float).round(2),
+        'Cantidad Compras': candidatos['cantidad_ventana'],
+        'Última Compra': pd.to_datetime(candidatos['ultima_compra_ventana']).dt.strftime('%d/%m/%Y'),
+    })
+    reporte['Total Último Mes (COP)'] = reporte['Total Último Mes (COP)'].map('${:,.0f}'.format)
+    return reporte
+
+
+def libro_reporte_fidelizacion(reporte, monto_minimo):
+    """Libro del reporte de fidelización con la información del reporte al final"""
+    libro = LibroExcel()
+    libro.agregar_hoja('Reporte Fidelización', [reporte], filas_finales=[
+        [f"Reporte generado: {date.today().strftime('%d/%m/%Y')}"],
+        [f"Criterio mínimo: ${monto_minimo:,.0f} COP"],
+        [f"Total candidatos: {len(reporte)}"],
+        ["Procesado automáticamente con Pandas"],
+    ])
+    return libro
+
+
+# === REPORTE TXT ===
+
+SEPARADOR_CLIENTE_TXT = '-' * 50
+
+
+def estadisticas_reporte_txt():
+    """
+    Totales del encabezado del reporte TXT en una sola consulta agregada:
+    clientes, activos, tipos de documento, ciudades y clientes por tipo.
+    Los tipos de documento son un catálogo pequeño y se leen antes para
+    armar un conteo condicional por tipo.
+    """
+    tipos = list(TipoDocumento.objects.order_by().values_list('id', 'nombre'))
+    conteos = {f'tipo_{tipo_id}': Count('id', filter=Q(tipo_documento_id=tipo_id)) for tipo_id, _ in tipos}
+    fila = Cliente.objects.aggregate(
+        total=Count('id'),
+        activos=Count('id', filter=Q(activo=True)),
+        tipos=Count('tipo_documento__nombre', distinct=True),
+        ciudades=Count('ciudad', distinct=True),
+        **conteos,
+    )
+
+    # Clientes por nombre de tipo (como un groupby, sin los tipos vacíos)
+    por_tipo = {}
+    for tipo_id, nombre in tipos:
+        if fila[f'tipo_{tipo_id}']:
+            por_tipo[nombre] = por_tipo.get(nombre, 0) + fila[f'tipo_{tipo_id}']
+    fila['por_tipo'] = dict(sorted(por_tipo.items()))
+    return fila
+
+
+def encabezado_reporte_txt(estadisticas):
+    """Líneas del encabezado del reporte TXT hasta el inicio del listado"""
+    lineas = [
+        "=" * 80,
+        "REPORTE DE CLIENTES - RÍOS DEL DESIERTO",
+        f"Generado automáticamente con Pandas - {date.today().strftime('%d/%m/%Y')}",
+        "=" * 80,
+        "",
+        "ESTADÍSTICAS GENERALES:",
+        "-" * 30,
+        f"Total de clientes: {estadisticas['total']}",
+        f"Clientes activos: {estadisticas['activos']}",
+        f"Clientes inactivos: {estadisticas['total'] - estadisticas['activos']}",
+        f"Tipos de documento: {estadisticas['tipos']}",
+        f"Ciudades diferentes: {estadisticas['ciudades']}",
+        "",
+        "ANÁLISIS POR TIPO DE DOCUMENTO:",
+        "-" * 40,
+    ]
+    lineas += [f"{tipo}: {cantidad} clientes" for tipo, cantidad in estadisticas['por_tipo'].items()]
+    lineas += [
+        "",
+        "LISTADO DETALLADO DE CLIENTES:",
+        SEPARADOR_CLIENTE_TXT,
+    ]
+    return lineas
+
+
+def bloques_clientes_txt(lote):
+    """
+    Ficha de texto de cada cliente de un lote de valores de Cliente, armada
+    con operaciones de texto vectorizadas sobre columnas completas.
+    """
+    texto = {campo: lote[campo].astype(str) for campo in (
+        'id', 'correo', 'telefono', 'direccion', 'ciudad', 'departamento',
+        'tipo_documento__nombre', 'numero_documento',
+    )}
+    return (
+        'ID: ' + texto['id'] +
+        '\nNombre: ' + nombre_completo(lote) +
+        '\nDocumento: ' + texto['tipo_documento__nombre'] + ' ' + texto['numero_documento'] +
+        '\nEmail: ' + texto['correo'] +
+        '\nTeléfono: ' + texto['telefono'] +
+        '\nDirección: ' + texto['direccion'] +
+        '\nCiudad: ' + texto['ciudad'] + ', ' + texto['departamento'] +
+        '\nRegistro: ' + pd.to_datetime(lote['fecha_registro']).dt.strftime('%d/%m/%Y') +
+        '\nEstado: ' + lote['activo'].map({True: 'Activo', False: 'Inactivo'}) +
+        '\n' + SEPARADOR_CLIENTE_TXT
+    )
+
+
+def generar_txt_clientes(tamano_lote=TAMANO_LOTE_EXPORTACION, progreso=sin_progreso):
+    """
+    Genera el reporte TXT de clientes por fragmentos: el encabezado con las
+    estadísticas, un fragmento por lote de clientes (en orden de registro
+    descendente) y el pie. La memoria depende del tamaño del lote.
+    """
+    estadisticas = estadisticas_reporte_txt()
+    yield '\n'.join(encabezado_reporte_txt(estadisticas)) + '\n'
+
+    queryset = Cliente.objects.select_related('tipo_documento')
+    lotes = iterar_lotes(queryset, CAMPOS_EXPORTACION_CLIENTES, ORDEN_EXPORTACION_CLIENTES, tamano_lote)
+    for lote in con_progreso(lotes, estadisticas['total'], progreso):
+        yield '\n'.join(bloques_clientes_txt(lote)) + '\n'
+
+    yield '\n'.join([
+        "",
+        "Reporte generado automáticamente con Pandas",
+        "Sistema de Gestión de Clientes - Ríos del Desierto",
+    ])
@@ -0,0 +1,256 @@
+"""
+Exportaciones columnares (Parquet y Arrow IPC stream)
+Las tablas se leen por lotes con paginación keyset y cada lote se convierte
+en un RecordBatch con tipos explícitos: montos Decimal, fechas con zona
+horaria y estado / método de pago / canal como diccionarios (categóricos).
+Cada lote es un row group de Parquet o un batch del stream Arrow, así las
+tablas grandes se transmiten en memoria acotada
+"""
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from django.conf import settings
+from .exportacion import TAMANO_LOTE_EXPORTACION, iterar_lotes, nombre_completo
+from .models import Cliente, Compra, TipoDocumento
+from .services_fidelizacion import candidatos_fidelizacion
+
+
+FORMATOS_COLUMNARES = {
+    'parquet': {'extension': '.parquet', 'content_type': 'application/vnd.apache.parquet'},
+    'arrow': {'extension': '.arrows', 'content_type': 'application/vnd.apache.arrow.stream'},
+}
+
+
+def _fecha_hora():
+    return pa.timestamp('us', tz=settings.TIME_ZONE)
+
+
+def _monto(digitos=12):
+    return pa.decimal128(digitos, 2)
+
+
+def _categorias(opciones):
+    """Diccionario fijo de códigos: los índices son estables entre lotes y archivos"""
+    return pa.dictionary(pa.int16(), pa.string()), [codigo for codigo, _ in opciones]
+
+
+# tabla -> [(columna, tipo Arrow o (tipo diccionario, categorías))]
+COLUMNAS_COMPRAS = [
+    ('id', pa.int64()),
+    ('cliente_id', pa.int64()),
+    ('numero_orden', pa.string()),
+    ('fecha_compra', _fecha_hora()),
+    ('descripcion_productos', pa.string()),
+    ('cantidad_productos', pa.int32()),
+    ('subtotal', _monto()),
+    ('descuento', _monto()),
+    ('impuestos', _monto()),
+    ('costo_envio', _monto(10)),
+    ('total', _monto()),
+    ('metodo_pago', _categorias(Compra.METODO_PAGO_CHOICES)),
+    ('numero_cuotas', pa.int32()),
+    ('canal_venta', _categorias(Compra.CANAL_VENTA_CHOICES)),
+    ('ciudad_entrega', pa.string()),
+    ('estado', _categorias(Compra.ESTADO_CHOICES)),
+    ('fecha_entrega_estimada', pa.date32()),
+    ('fecha_entrega_real', _fecha_hora()),
+    ('fecha_actualizacion', _fecha_hora()),
+]
+
+COLUMNAS_CLIENTES = [
+    ('id', pa.int64()),
+    ('tipo_documento', None),  # diccionario con los nombres del catálogo al exportar
+    ('numero_documento', pa.string()),
+    ('primer_nombre', pa.string()),
+    ('segundo_nombre', pa.string()),
+    ('primer_apellido', pa.string()),
+    ('segundo_apellido', pa.string()),
+    ('correo', pa.string()),
+    ('telefono', pa.string()),
+    ('fecha_nacimiento', pa.date32()),
+    ('genero', _categorias(Cliente.GENERO_CHOICES)),
+    ('direccion', pa.string()),
+    ('ciudad', pa.string()),
+    ('departamento', pa.string()),
+    ('codigo_postal', pa.string()),
+    ('activo', pa.bool_()),
+    ('fecha_registro', _fecha_hora()),
+    ('fecha_actualizacion', _fecha_hora()),
+    ('ultima_compra', _fecha_hora()),
+    ('total_compras', _monto()),
+]
+
+COLUMNAS_FIDELIZACION = [
+    ('cliente_id', pa.int64()),
+    ('tipo_documento', None),
+    ('numero_documento', pa.string()),
+    ('nombre_completo', pa.string()),
+    ('correo', pa.string()),
+    ('telefono', pa.string()),
+    ('ciudad', pa.string()),
+    ('departamento', pa.string()),
+    ('total_ventana', _monto(14)),
+    ('cantidad_ventana', pa.int64()),
+    ('ultima_compra', _fecha_hora()),
+]
+
+
+def _columnas_con_catalogo(columnas):
+    """Resuelve el diccionario de tipo_documento con los nombres actuales del catálogo"""
+    nombres = sorted(set(TipoDocumento.objects.values_list('nombre', flat=True)))
+    return [
+        (nombre, _categorias([(n, n) for n in nombres]) if tipo is None else tipo)
+        for nombre, tipo in columnas
+    ]
+
+
+def esquema(columnas):
+    return pa.schema([
+        pa.field(nombre, tipo[0] if isinstance(tipo, tuple) else tipo)
+        for nombre, tipo in columnas
+    ])
+
+
+def _arreglo(serie, tipo):
+    if isinstance(tipo, tuple):
+        tipo_diccionario, categorias = tipo
+        valores = serie.to_numpy(dtype=object)
+        codigos = pd.Index(categorias).get_indexer(valores)
+        nuevas = set(valores[(codigos < 0) & pd.notna(valores)])
+        if nuevas:
+            # Valores fuera de las opciones actuales (datos anteriores, género
+            # en blanco): se agregan al final del diccionario del lote, así los
+            # códigos fijos no cambian y el valor no se pierde
+            categorias = [*categorias, *sorted(nuevas)]
+            codigos = pd.Index(categorias).get_indexer(valores)
+        return pa.DictionaryArray.from_arrays(
+            pa.array(codigos, type=tipo_diccionario.index_type, mask=codigos < 0),
+            pa.array(categorias, type=pa.string()),
+        )
+    if pa.types.is_timestamp(tipo):
+        # Django entrega fechas con zona; Arrow guarda el instante en UTC
+        return pa.array(pd.to_datetime(serie, utc=True), type=pa.timestamp('us', tz='UTC')).cast(tipo)
+    return pa.Array.from_pandas(serie, type=tipo)
+
+
+def lote_arrow(lote, columnas):
+    """RecordBatch con los tipos de `columnas` a partir de un DataFrame de valores"""
+    return pa.RecordBatch.from_arrays(
+        [_arreglo(lote[nombre], tipo) for nombre, tipo in columnas],
+        schema=esquema(columnas),
+    )
+
+
+# === FUENTES ===
+
+def lotes_compras(tamano_lote=TAMANO_LOTE_EXPORTACION):
+    columnas = COLUMNAS_COMPRAS
+    campos = [nombre for nombre, _ in columnas]
+    lotes = iterar_lotes(Compra.objects.all(), campos, ('-fecha_compra', '-id'), tamano_lote)
+    return columnas, (lote_arrow(lote, columnas) for lote in lotes)
+
+
+def lotes_clientes(tamano_lote=TAMANO_LOTE_EXPORTACION):
+    columnas = _columnas_con_catalogo(COLUMNAS_CLIENTES)
+    campos = ['tipo_documento__nombre' if nombre == 'tipo_documento' else nombre for nombre, _ in columnas]
+    lotes = iterar_lotes(Cliente.objects.all(), campos, ('-fecha_registro', '-id'), tamano_lote)
+    return columnas, (
+        lote_arrow(lote.rename(columns={'tipo_documento__nombre': 'tipo_documento'}), columnas)
+        for lote in lotes
+    )
+
+
+def lotes_fidelizacion(monto_minimo, dias):
+    """Candidatos a fidelización (una sola consulta agrupada, un solo lote)"""
+    columnas = _columnas_con_catalogo(COLUMNAS_FIDELIZACION)
+    candidatos = pd.DataFrame(list(candidatos_fidelizacion(monto_minimo, dias).values(
+        'id', 'tipo_documento__nombre', 'numero_documento',
+        'primer_nombre', 'segundo_nombre', 'primer_apellido', 'segundo_apellido',
+        'correo', 'telefono', 'ciudad', 'departamento',
+        'total_ventana', 'cantidad_ventana', 'ultima_compra_ventana',
+    )))
+
+    def lotes():
+        if candidatos.empty:
+            return
+        yield lote_arrow(candidatos.assign(
+            cliente_id=candidatos['id'],
+            tipo_documento=candidatos['tipo_documento__nombre'],
+            nombre_completo=nombre_completo(candidatos),
+            ultima_compra=candidatos['ultima_compra_ventana'],
+        ), columnas)
+
+    return columnas, lotes()
+
+
+# === ESCRITURA ===
+
+class SalidaPorFragmentos:
+    """
+    Archivo de solo escritura que retiene lo escrito hasta `vaciar()`.
+    Lleva la posición acumulada (los escritores de Parquet la usan para los
+    offsets del pie) sin guardar el archivo completo.
+    """
+
+    def __init__(self):
+        self.posicion = 0
+        self.closed = False
+        self._fragmentos = []
+
+    def write(self, datos):
+        datos = bytes(datos)
+        self._fragmentos.append(datos)
+        self.posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self.posicion
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def vaciar(self):
+        datos = b''.join(self._fragmentos)
+        self._fragmentos.clear()
+        return datos
+
+
+def generar_columnar(formato, columnas, lotes):
+    """
+    Genera el archivo `formato` ('parquet' o 'arrow') por fragmentos: uno por
+    lote (row group / batch) y el cierre (pie de Parquet o fin del stream).
+    """
+    salida = SalidaPorFragmentos()
+    destino = pa.PythonFile(salida, mode='w')
+    if formato == 'parquet':
+        escritor = pq.ParquetWriter(destino, esquema(columnas), compression='zstd')
+        escribir = escritor.write_batch
+    else:
+        escritor = pa.ipc.new_stream(destino, esquema(columnas))
+        escribir = escritor.write_batch
+
+    for lote in lotes:
+        escribir(lote)
+        yield salida.vaciar()
+    escritor.close()
+    yield salida.vaciar()
+
+
+def fuente_columnar(tabla, monto_minimo=None, dias=None):
+    """(columnas, lotes) de `tabla`: clientes, compras o fidelizacion. Lanza ValueError si no existe"""
+    if tabla == 'clientes':
+        return lotes_clientes()
+    if tabla == 'compras':
+        return lotes_compras()
+    if tabla == 'fidelizacion':
+        return lotes_fidelizacion(monto_minimo, dias)
+    raise ValueError(f'Tabla no soportada: {tabla} (use clientes, compras o fidelizacion)')
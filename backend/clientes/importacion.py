@@ -0,0 +1,221 @@
+"""
+Utilidades de importación masiva con Pandas
+Lectura por lotes de CSV/XLSX en memoria acotada, puntos de control para
+reanudar cargas interrumpidas y reporte de rendimiento
+"""
+import os
+import time
+from itertools import islice
+from pathlib import Path
+import pandas as pd
+import openpyxl
+from django.core.exceptions import ValidationError
+from django.core.validators import EmailValidator, MaxLengthValidator, RegexValidator
+from .models import PuntoControlImportacion
+
+
+TAMANO_LOTE_DEFECTO = 5000
+
+# Límite de parámetros por consulta IN (SQLite admite 999 variables por sentencia)
+TAMANO_CONSULTA_IN = 900
+
+
+def leer_lotes(ruta, tamano_lote=TAMANO_LOTE_DEFECTO, saltar_filas=0, hoja=None):
+    """
+    Itera un archivo CSV o XLSX en DataFrames de `tamano_lote` filas.
+    Todas las columnas se leen como texto; la conversión de tipos se hace
+    vectorizada en la validación de cada lote.
+    """
+    extension = Path(ruta).suffix.lower()
+
+    if extension == '.csv':
+        lector = pd.read_csv(
+            ruta,
+            dtype=str,
+            keep_default_na=False,
+            chunksize=tamano_lote,
+            skiprows=range(1, saltar_filas + 1) if saltar_filas else None,
+            encoding='utf-8-sig',
+        )
+        for lote in lector:
+            yield _normalizar_columnas(lote)
+
+    elif extension in ('.xlsx', '.xlsm'):
+        # read_only recorre la hoja fila a fila sin cargar el libro completo
+        libro = openpyxl.load_workbook(ruta, read_only=True, data_only=True)
+        try:
+            hoja_excel = libro[hoja] if hoja else libro.worksheets[0]
+            filas = hoja_excel.iter_rows(values_only=True)
+            encabezados = [str(valor).strip() if valor is not None else '' for valor in next(filas, ())]
+
+            for _ in islice(filas, saltar_filas):
+                pass
+
+            while True:
+                bloque = list(islice(filas, tamano_lote))
+                if not bloque:
+                    break
+                ancho = len(encabezados)
+                lote = pd.DataFrame(
+                    [[_valor_celda(valor) for valor in (tuple(fila) + (None,) * ancho)[:ancho]] for fila in bloque],
+                    columns=encabezados,
+                    dtype=str,
+                )
+                yield _normalizar_columnas(lote)
+        finally:
+            libro.close()
+
+    else:
+        raise ValueError(f'Formato no soportado: {extension} (use .csv o .xlsx)')
+
+
+def _valor_celda(valor):
+    """Convierte una celda de Excel al texto equivalente de un CSV"""
+    if valor is None:
+        return ''
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    if hasattr(valor, 'isoformat'):
+        return valor.isoformat()
+    return str(valor)
+
+
+def _normalizar_columnas(lote):
+    lote.columns = [str(columna).strip().lower() for columna in lote.columns]
+    return lote.fillna('').apply(lambda columna: columna.str.strip())
+
+
+def en_bloques(valores, tamano=TAMANO_CONSULTA_IN):
+    """Divide una secuencia en bloques para consultas IN acotadas"""
+    valores = list(valores)
+    for inicio in range(0, len(valores), tamano):
+        yield valores[inicio:inicio + tamano]
+
+
+def validar_campo_vectorizado(serie, campo):
+    """
+    Aplica los validadores de un campo del modelo a una serie de texto completa.
+    Retorna una máscara booleana con las filas inválidas (las vacías no se validan).
+
+    Los RegexValidator, EmailValidator y MaxLengthValidator se evalúan con
+    operaciones vectorizadas usando las mismas expresiones regulares del
+    validador; cualquier otro validador se aplica fila a fila.
+    """
+    # Las expresiones de Django (\Z, lookarounds) requieren el motor re de Python,
+    # no el de las columnas de texto respaldadas por Arrow
+    serie = serie.astype(object)
+    con_valor = serie != ''
+    invalidas = pd.Series(False, index=serie.index)
+
+    for validador in campo.validators:
+        if isinstance(validador, RegexValidator):
+            coincide = serie.str.contains(validador.regex, regex=True)
+            invalidas |= con_valor & (coincide if validador.inverse_match else ~coincide)
+
+        elif isinstance(validador, EmailValidator):
+            invalidas |= con_valor & _correos_invalidos(serie, validador)
+
+        elif isinstance(validador, MaxLengthValidator):
+            invalidas |= serie.str.len() > validador.limit_value
+
+        else:
+            invalidas |= con_valor & ~serie.map(lambda valor: _es_valido(validador, valor))
+
+    return invalidas
+
+
+def _correos_invalidos(serie, validador):
+    """Versión vectorizada de EmailValidator.__call__"""
+    partes = serie.str.rsplit('@', n=1, expand=True).reindex(columns=[0, 1])
+    usuario, dominio = partes[0].fillna(''), partes[1]
+
+    invalidos = ~serie.str.contains('@', regex=False) | (serie.str.len() > 320)
+    invalidos |= ~usuario.str.match(validador.user_regex.pattern, flags=validador.user_regex.flags)
+
+    dominio = dominio.fillna('')
+    dominio_valido = (
+        dominio.isin(validador.domain_allowlist) |
+        dominio.str.match(validador.domain_regex.pattern, flags=validador.domain_regex.flags)
+    )
+
+    # Dominios internacionalizados o literales IP: se delega al validador original
+    pendientes = ~invalidos & ~dominio_valido
+    invalidos |= pendientes
+    if pendientes.any():
+        invalidos[pendientes] = ~serie[pendientes].map(lambda valor: _es_valido(validador, valor))
+
+    return invalidos
+
+
+def _es_valido(validador, valor):
+    try:
+        validador(valor)
+        return True
+    except ValidationError:
+        return False
+
+
+class PuntoControl:
+    """
+    Punto de control en la base de datos para reanudar una importación.
+    guardar() debe llamarse dentro de la transacción del lote: el avance se
+    confirma junto con las filas insertadas, y si el proceso cae antes del
+    commit ambos se pierden y el lote se repite completo al reanudar.
+    """
+
+    def __init__(self, comando, ruta_archivo):
+        self.clave = f'{comando}:{os.path.abspath(ruta_archivo)}'
+        self.datos = {'filas_procesadas': 0}
+
+    def cargar(self):
+        punto = PuntoControlImportacion.objects.filter(clave=self.clave).first()
+        if punto is not None:
+            self.datos = {**punto.datos, 'filas_procesadas': punto.filas_procesadas}
+        return self.datos
+
+    def guardar(self, **datos):
+        self.datos.update(datos)
+        adicionales = {clave: valor for clave, valor in self.datos.items() if clave != 'filas_procesadas'}
+        PuntoControlImportacion.objects.update_or_create(
+            clave=self.clave,
+            defaults={'filas_procesadas': self.datos['filas_procesadas'], 'datos': adicionales},
+        )
+
+    def eliminar(self):
+        PuntoControlImportacion.objects.filter(clave=self.clave).delete()
+
+
+class ReporteRendimiento:
+    """Acumula filas procesadas y calcula el rendimiento en filas por segundo"""
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.filas = 0
+        self.validas = 0
+        self.rechazadas = 0
+
+    def registrar(self, validas, rechazadas):
+        self.validas += validas
+        self.rechazadas += rechazadas
+        self.filas += validas + rechazadas
+
+    @property
+    def segundos(self):
+        return time.perf_counter() - self.inicio
+
+    @property
+    def filas_por_segundo(self):
+        return self.filas / self.segundos if self.segundos > 0 else 0.0
+
+    def resumen(self):
+        return (
+            f'{self.filas:,} filas ({self.validas:,} válidas, {self.rechazadas:,} rechazadas) '
+            f'en {self.segundos:,.1f}s - {self.filas_por_segundo:,.0f} filas/s'
+        )
+
+
+def escribir_rechazos(ruta, rechazos):
+    """Agrega filas rechazadas (con su motivo) a un CSV de errores; el encabezado va con las primeras"""
+    if ruta and not rechazos.empty:
+        encabezado = not os.path.exists(ruta) or os.path.getsize(ruta) == 0
+        rechazos.to_csv(ruta, mode='a', index=False, header=encabezado, encoding='utf-8')
@@ -0,0 +1,381 @@
+"""
+Benchmarks de las rutas de exportación y de las consultas concurrentes
+
+Uso:
+    python manage.py ejecutar_benchmarks --suite excel
+    python manage.py ejecutar_benchmarks --suite excel --filas 100000 1000000 --limite-anterior 1000000
+    python manage.py ejecutar_benchmarks --suite txt --destino /tmp/benchmark_exportacion.txt
+    python manage.py ejecutar_benchmarks --suite concurrencia --url http://127.0.0.1:8001 --concurrencia 50 200
+    python manage.py ejecutar_benchmarks --suite compresion --filas 100000 --mbps 20 100
+    python manage.py ejecutar_benchmarks --suite serializacion --paginas 200
+
+La suite de concurrencia envía peticiones a un servidor ya levantado sobre la
+misma base de datos, p. ej. el de la guía de producción o su equivalente ASGI:
+    gunicorn --workers 3 --worker-class sync --bind 127.0.0.1:8001 wsgi:application
+    uvicorn --workers 3 --port 8002 asgi:application
+"""
+import asyncio
+import multiprocessing
+import random
+import resource
+import time
+from urllib.parse import urlsplit
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand
+from clientes.compresion import comprimir_fragmentos
+from clientes.exportacion import LibroExcel, TAMANO_LOTE_EXPORTACION, bloques_clientes_txt, nombre_completo
+from rest_framework.renderers import JSONRenderer
+from clientes.models import Cliente, Compra
+from clientes.serializacion_rapida import FORMATO_CLIENTE, FORMATO_COMPRA_SIMPLE, codificar_json
+from clientes.serializers import ClienteSerializer, CompraSimpleSerializer
+
+
+def datos_sinteticos(filas, semilla=7):
+    """DataFrame con la forma de la hoja Clientes del Excel completo"""
+    generador = np.random.default_rng(semilla)
+    nombres = np.array(['Ana María Pérez Gómez', 'Luis Rodríguez', 'José Núñez Castillo', 'Carolina Ríos'])
+    ciudades = np.array(['Bogotá', 'Medellín', 'Cali', 'Barranquilla', 'Cúcuta'])
+    ids = np.arange(1, filas + 1)
+    return pd.DataFrame({
+        'ID': ids,
+        'Tipo Documento': 'Cédula de Ciudadanía',
+        'Número Documento': (1000000000 + ids).astype(str),
+        'Nombre Completo': nombres[generador.integers(0, len(nombres), filas)],
+        'Email': pd.Series(ids).map('cliente{}@correo.com'.format),
+        'Teléfono': '573001234567',
+        'Ciudad': ciudades[generador.integers(0, len(ciudades), filas)],
+        'Departamento': 'Cundinamarca',
+        'Fecha Registro': '16/10/2026',
+        'Estado': np.where(generador.random(filas) < 0.9, 'Activo', 'Inactivo'),
+    })
+
+
+def valores_sinteticos(filas, semilla=7):
+    """DataFrame con la forma de los lotes de valores de Cliente del reporte TXT"""
+    generador = np.random.default_rng(semilla)
+    ids = np.arange(1, filas + 1)
+    return pd.DataFrame({
+        'id': ids,
+        'primer_nombre': np.array(['Ana', 'Luis', 'José', 'Carolina'])[generador.integers(0, 4, filas)],
+        'segundo_nombre': np.where(generador.random(filas) < 0.5, 'María', None),
+        'primer_apellido': 'Pérez',
+        'segundo_apellido': 'Gómez',
+        'correo': pd.Series(ids).map('cliente{}@correo.com'.format),
+        'telefono': '573001234567',
+        'direccion': 'Calle 1 # 2-3',
+        'ciudad': np.array(['Bogotá', 'Medellín', 'Cali'])[generador.integers(0, 3, filas)],
+        'departamento': 'Cundinamarca',
+        'tipo_documento__nombre': 'Cédula de Ciudadanía',
+        'numero_documento': (1000000000 + ids).astype(str),
+        'fecha_registro': pd.Timestamp('2026-10-16', tz='UTC'),
+        'activo': generador.random(filas) < 0.9,
+    })
+
+
+def excel_anterior(datos, destino):
+    """Ruta previa: libro completo en memoria con pd.ExcelWriter y ancho recorriendo cada celda"""
+    with pd.ExcelWriter(destino, engine='openpyxl') as writer:
+        datos.to_excel(writer, sheet_name='Clientes', index=False)
+        for hoja in writer.sheets.values():
+            for columna in hoja.columns:
+                largo = max(len(str(celda.value)) for celda in columna)
+                hoja.column_dimensions[columna[0].column_letter].width = min(largo + 2, 50)
+
+
+def excel_solo_escritura(datos, destino):
+    """Ruta actual: LibroExcel por lotes y archivo temporal"""
+    libro = LibroExcel()
+    libro.agregar_hoja('Clientes', (
+        datos.iloc[inicio:inicio + TAMANO_LOTE_EXPORTACION]
+        for inicio in range(0, len(datos), TAMANO_LOTE_EXPORTACION)
+    ))
+    with libro.guardar() as archivo:
+        with open(destino, 'wb') as salida:
+            salida.write(archivo.read())
+
+
+def _ejecutar_medido(funcion, args, conexion):
+    base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    inicio = time.perf_counter()
+    funcion(*args)
+    segundos = time.perf_counter() - inicio
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - base
+    conexion.send((segundos, pico / 1024))
+    conexion.close()
+
+
+def txt_anterior(datos, destino):
+    """Ruta previa: iterrows con una lista de líneas de todo el reporte y un único join"""
+    datos = datos.copy()
+    datos['fecha_registro'] = pd.to_datetime(datos['fecha_registro']).dt.strftime('%d/%m/%Y')
+    datos['nombre_completo'] = nombre_completo(datos)
+    contenido = []
+    for _, cliente in datos.iterrows():
+        contenido.append(f"ID: {cliente['id']}")
+        contenido.append(f"Nombre: {cliente['nombre_completo']}")
+        contenido.append(f"Documento: {cliente['tipo_documento__nombre']} {cliente['numero_documento']}")
+        contenido.append(f"Email: {cliente['correo']}")
+        contenido.append(f"Teléfono: {cliente['telefono']}")
+        contenido.append(f"Dirección: {cliente['direccion']}")
+        contenido.append(f"Ciudad: {cliente['ciudad']}, {cliente['departamento']}")
+        contenido.append(f"Registro: {cliente['fecha_registro']}")
+        contenido.append(f"Estado: {'Activo' if cliente['activo'] else 'Inactivo'}")
+        contenido.append("-" * 50)
+    with open(destino, 'w', encoding='utf-8') as salida:
+        salida.write('\n'.join(contenido))
+
+
+def txt_vectorizado(datos, destino):
+    """Ruta actual: fichas vectorizadas por lote escritas a medida que se generan"""
+    with open(destino, 'w', encoding='utf-8') as salida:
+        for inicio in range(0, len(datos), TAMANO_LOTE_EXPORTACION):
+            lote = datos.iloc[inicio:inicio + TAMANO_LOTE_EXPORTACION]
+            salida.write('\n'.join(bloques_clientes_txt(lote)) + '\n')
+
+
+def medir(funcion, *args):
+    """
+    Segundos y crecimiento del pico de memoria residente (MB) de una ejecución.
+
+    Cada ruta corre en un proceso hijo (fork) para que su pico de RSS no se
+    mezcle con el de las demás y sin el costo de instrumentar cada asignación.
+    """
+    contexto = multiprocessing.get_context('fork')
+    receptor, emisor = contexto.Pipe(duplex=False)
+    proceso = contexto.Process(target=_ejecutar_medido, args=(funcion, args, emisor))
+    proceso.start()
+    resultado = receptor.recv()
+    proceso.join()
+    return resultado
+
+
+def fragmentos_exportacion(formato, datos):
+    """Fragmentos por lote como los de las exportaciones CSV y TXT en streaming"""
+    for inicio in range(0, len(datos), TAMANO_LOTE_EXPORTACION):
+        lote = datos.iloc[inicio:inicio + TAMANO_LOTE_EXPORTACION]
+        if formato == 'csv':
+            yield lote.to_csv(index=False, header=False).encode('utf-8')
+        else:
+            yield ('\n'.join(bloques_clientes_txt(lote)) + '\n').encode('utf-8')
+
+
+def enviar(formato, datos, codificacion):
+    """(bytes del cuerpo, segundos para generarlo y comprimirlo) de una exportación"""
+    inicio = time.perf_counter()
+    fragmentos = fragmentos_exportacion(formato, datos)
+    if codificacion:
+        fragmentos = comprimir_fragmentos(fragmentos, codificacion)
+    enviados = sum(len(fragmento) for fragmento in fragmentos)
+    return enviados, time.perf_counter() - inicio
+
+
+def paginas_serializacion(tamano):
+    """(nombre, formato precompilado, serializer, lectura de una página con cada ruta) de los listados"""
+    clientes = Cliente.objects.filter(activo=True).order_by('-fecha_registro', '-id')
+    compras = Compra.objects.order_by('-fecha_compra', '-id')
+    return [
+        ('clientes', FORMATO_CLIENTE, ClienteSerializer,
+         lambda: list(clientes.select_related('tipo_documento')[:tamano]),
+         lambda: list(FORMATO_CLIENTE.consulta(clientes)[:tamano])),
+        ('compras cliente', FORMATO_COMPRA_SIMPLE, CompraSimpleSerializer,
+         lambda: list(compras[:tamano]),
+         lambda: list(FORMATO_COMPRA_SIMPLE.consulta(compras)[:tamano])),
+    ]
+
+
+def rutas_consultas(documentos, semilla=7):
+    """Consulta por documento, búsqueda y compras de clientes existentes, en orden aleatorio"""
+    clientes = list(
+        Cliente.objects.filter(activo=True).order_by('id')
+        .values_list('id', 'numero_documento', 'tipo_documento__codigo')[:documentos]
+    )
+    rutas = []
+    for cliente_id, numero, tipo in clientes:
+        rutas += [
+            f'/api/clientes/consulta/{numero}/',
+            f'/api/clientes/buscar/?tipo_documento={tipo}&numero_documento={numero}',
+            f'/api/clientes/{cliente_id}/compras/',
+        ]
+    random.Random(semilla).shuffle(rutas)
+    return rutas
+
+
+async def _get(host, puerto, ruta):
+    """Un GET HTTP/1.1 con conexión propia; retorna el código de estado"""
+    lector, escritor = await asyncio.open_connection(host, puerto)
+    escritor.write(f'GET {ruta} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n'.encode())
+    await escritor.drain()
+    respuesta = await lector.read()
+    escritor.close()
+    await escritor.wait_closed()
+    return int(respuesta.split(b' ', 2)[1])
+
+
+async def carga_concurrente(url, rutas, concurrencia, peticiones):
+    """
+    `concurrencia` clientes envían en total `peticiones` GET recorriendo `rutas`.
+    Retorna (latencias en segundos, errores, segundos totales).
+    """
+    destino = urlsplit(url)
+    host, puerto = destino.hostname, destino.port or 80
+    pendientes = iter(range(peticiones))
+    latencias, errores = [], 0
+
+    async def cliente():
+        nonlocal errores
+        for i in pendientes:
+            inicio = time.perf_counter()
+            try:
+                codigo = await _get(host, puerto, rutas[i % len(rutas)])
+            except OSError:
+                codigo = None
+            latencias.append(time.perf_counter() - inicio)
+            errores += codigo != 200
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(cliente() for _ in range(concurrencia)))
+    return latencias, errores, time.perf_counter() - inicio
+
+
+class Command(BaseCommand):
+    help = 'Compara el rendimiento de las rutas de exportación y la latencia de las consultas concurrentes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--suite', choices=['excel', 'txt', 'concurrencia', 'compresion', 'serializacion'],
+                            default='excel')
+        parser.add_argument('--filas', nargs='+', type=int, default=[100000, 1000000])
+        parser.add_argument('--limite-anterior', type=int, default=300000,
+                            help='Filas máximas para la ruta anterior (consume varios GB por millón de filas)')
+        parser.add_argument('--destino', default='/tmp/benchmark_exportacion.xlsx')
+        parser.add_argument('--url', nargs='+', default=['http://127.0.0.1:8001'],
+                            help='Servidores a comparar (suite concurrencia)')
+        parser.add_argument('--concurrencia', nargs='+', type=int, default=[50, 200])
+        parser.add_argument('--peticiones', type=int, default=5000)
+        parser.add_argument('--documentos', type=int, default=2000,
+                            help='Clientes distintos consultados (suite concurrencia)')
+        parser.add_argument('--paginas', type=int, default=200,
+                            help='Repeticiones por listado (suite serializacion)')
+        parser.add_argument('--tamano-pagina', type=int, default=100)
+        parser.add_argument('--mbps', nargs='+', type=float, default=[20, 100],
+                            help='Anchos de banda del enlace para el tiempo hasta el último byte (suite compresion)')
+
+    def handle(self, *args, **options):
+        getattr(self, f"suite_{options['suite']}")(options)
+
+    def suite_excel(self, options):
+        self.stdout.write(f"{'filas':>10} {'ruta':<16} {'segundos':>10} {'pico MB':>10}")
+        for filas in options['filas']:
+            datos = datos_sinteticos(filas)
+            rutas = [('solo escritura', excel_solo_escritura)]
+            if filas <= options['limite_anterior']:
+                rutas.insert(0, ('anterior', excel_anterior))
+            else:
+                self.stdout.write(f"{filas:>10,} {'anterior':<16} {'omitida (--limite-anterior)':>21}")
+
+            for nombre, funcion in rutas:
+                segundos, pico = medir(funcion, datos, options['destino'])
+                self.stdout.write(f'{filas:>10,} {nombre:<16} {segundos:>10.1f} {pico:>10.0f}')
+
+    def suite_txt(self, options):
+        self.stdout.write(f"{'filas':>10} {'ruta':<16} {'segundos':>10} {'pico MB':>10}")
+        for filas in options['filas']:
+            datos = valores_sinteticos(filas)
+            rutas = [('vectorizada', txt_vectorizado)]
+            if filas <= options['limite_anterior']:
+                rutas.insert(0, ('anterior', txt_anterior))
+            else:
+                self.stdout.write(f"{filas:>10,} {'anterior':<16} {'omitida (--limite-anterior)':>21}")
+
+            for nombre, funcion in rutas:
+                segundos, pico = medir(funcion, datos, options['destino'])
+                self.stdout.write(f'{filas:>10,} {nombre:<16} {segundos:>10.1f} {pico:>10.0f}')
+
+    def suite_concurrencia(self, options):
+        rutas = rutas_consultas(options['documentos'])
+        self.stdout.write(
+            f"{'servidor':<24} {'clientes':>8} {'pet/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errores':>8}"
+        )
+        for url in options['url']:
+            # Calentamiento: conexiones a la base y cachés del proceso
+            asyncio.run(carga_concurrente(url, rutas, 10, min(len(rutas), 500)))
+            for concurrencia in options['concurrencia']:
+                latencias, errores, segundos = asyncio.run(
+                    carga_concurrente(url, rutas, concurrencia, options['peticiones'])
+                )
+                p50, p99 = np.percentile(latencias, [50, 99]) * 1000
+                self.stdout.write(
+                    f'{url:<24} {concurrencia:>8} {len(latencias) / segundos:>8.0f} '
+                    f'{p50:>8.1f} {p99:>8.1f} {errores:>8}'
+                )
+
+    def suite_compresion(self, options):
+        """
+        Bytes enviados y tiempo hasta el último byte de las exportaciones CSV y
+        TXT sin comprimir, con gzip y con zstd. El tiempo suma la generación y
+        compresión por fragmentos (medida) y la transferencia por un enlace de
+        --mbps (calculada); con el cuerpo ya precomprimido solo queda la
+        transferencia.
+        """
+        enlaces = ''.join(f"{f'TTLB s @{mbps:g}':>14}" for mbps in options['mbps'])
+        self.stdout.write(f"{'filas':>10} {'formato':<8} {'ruta':<16} {'MB':>8} {'razón':>6} {'cpu s':>7}{enlaces}")
+        for filas in options['filas']:
+            datos = valores_sinteticos(filas)
+            for formato in ('csv', 'txt'):
+                original = None
+                for codificacion in (None, 'gzip', 'zstd'):
+                    enviados, segundos = enviar(formato, datos, codificacion)
+                    original = original or enviados
+                    rutas = [(codificacion or 'sin comprimir', segundos)]
+                    if codificacion:
+                        rutas.append((f'{codificacion} precomp.', 0.0))
+                    for nombre, cpu in rutas:
+                        transferencia = ''.join(
+                            f'{cpu + enviados * 8 / (mbps * 1e6):>14.2f}' for mbps in options['mbps']
+                        )
+                        self.stdout.write(
+                            f'{filas:>10,} {formato:<8} {nombre:<16} {enviados / 1e6:>8.1f} '
+                            f'{original / enviados:>6.1f} {cpu:>7.2f}{transferencia}'
+                        )
+
+    def suite_serializacion(self, options):
+        """
+        Milisegundos por página de los listados con los serializers de DRF y con
+        la serialización precompilada: solo serializar y renderizar el JSON
+        (filas ya leídas) y la página completa (consulta incluida).
+        """
+        self.stdout.write(f"{'listado':<16} {'ruta':<14} {'serializar ms':>14} {'página ms':>10}")
+        repeticiones = options['paginas']
+        for nombre, formato, serializer_class, leer_objetos, leer_filas in paginas_serializacion(options['tamano_pagina']):
+            def drf(objetos):
+                return JSONRenderer().render(serializer_class(objetos, many=True).data)
+
+            def precompilada(filas):
+                return codificar_json(formato.convertir(filas))
+
+            consultas = {
+                'drf': (leer_objetos, drf),
+                'precompilada': (leer_filas, precompilada),
+            }
+            resultados = {}
+            for ruta, (leer, serializar) in consultas.items():
+                filas = leer()
+                inicio = time.perf_counter()
+                for _ in range(repeticiones):
+                    cuerpo = serializar(filas)
+                solo_serializar = (time.perf_counter() - inicio) / repeticiones * 1000
+
+                inicio = time.perf_counter()
+                for _ in range(repeticiones):
+                    serializar(leer())
+                completa = (time.perf_counter() - inicio) / repeticiones * 1000
+                resultados[ruta] = (cuerpo, solo_serializar, completa)
+                self.stdout.write(f'{nombre:<16} {ruta:<14} {solo_serializar:>14.2f} {completa:>10.2f}')
+
+            (cuerpo_drf, serializar_drf, pagina_drf), (cuerpo_rapido, serializar_rapido, pagina_rapida) = (
+                resultados['drf'], resultados['precompilada']
+            )
+            self.stdout.write(
+                f"{nombre:<16} {'aceleración':<14} {serializar_drf / serializar_rapido:>13.1f}x "
+                f"{pagina_drf / pagina_rapida:>9.1f}x  {'mismos bytes' if cuerpo_drf == cuerpo_rapido else 'BYTES DISTINTOS'}"
+            )
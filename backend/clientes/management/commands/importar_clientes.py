@@ -0,0 +1,233 @@
+"""
+Importación masiva de clientes (crear o actualizar) desde CSV/XLSX
+
+Uso:
+    python manage.py importar_clientes clientes.csv
+    python manage.py importar_clientes socios.xlsx --tamano-lote 20000 --errores rechazos.csv
+    python manage.py importar_clientes clientes.csv --reanudar
+"""
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from clientes.cache_clientes import cache_perfiles
+from clientes.importacion import (
+    TAMANO_LOTE_DEFECTO,
+    PuntoControl,
+    ReporteRendimiento,
+    en_bloques,
+    escribir_rechazos,
+    leer_lotes,
+    validar_campo_vectorizado,
+)
+from clientes.models import Cliente, TipoDocumento
+
+
+COLUMNAS_REQUERIDAS = [
+    'tipo_documento', 'numero_documento', 'primer_nombre', 'primer_apellido',
+    'correo', 'telefono', 'fecha_nacimiento', 'direccion', 'ciudad', 'departamento',
+]
+
+COLUMNAS_OPCIONALES = ['segundo_nombre', 'segundo_apellido', 'genero', 'codigo_postal', 'activo']
+
+# Campos de texto validados con los validadores del modelo
+CAMPOS_TEXTO = [
+    'numero_documento', 'primer_nombre', 'segundo_nombre', 'primer_apellido', 'segundo_apellido',
+    'correo', 'telefono', 'direccion', 'ciudad', 'departamento', 'codigo_postal',
+]
+
+# Campos que se sobrescriben cuando el número de documento ya existe; las
+# columnas opcionales ausentes del archivo se excluyen (ver campos_actualizables)
+CAMPOS_ACTUALIZABLES = [
+    'tipo_documento', 'primer_nombre', 'segundo_nombre', 'primer_apellido', 'segundo_apellido',
+    'correo', 'telefono', 'fecha_nacimiento', 'genero', 'direccion', 'ciudad', 'departamento',
+    'codigo_postal', 'activo', 'fecha_actualizacion',
+]
+
+VALORES_VERDADEROS = {'1', 'true', 'si', 'sí', 's', 'activo', 'yes', 'y'}
+VALORES_FALSOS = {'0', 'false', 'no', 'n', 'inactivo'}
+
+
+class Command(BaseCommand):
+    help = 'Crea o actualiza clientes masivamente por numero_documento desde un archivo CSV o XLSX'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del archivo .csv o .xlsx')
+        parser.add_argument('--tamano-lote', type=int, default=TAMANO_LOTE_DEFECTO,
+                            help='Filas por lote (default: %(default)s)')
+        parser.add_argument('--hoja', help='Hoja a importar (solo XLSX, default: la primera)')
+        parser.add_argument('--errores', help='CSV donde guardar las filas rechazadas con su motivo')
+        parser.add_argument('--reanudar', action='store_true',
+                            help='Continúa desde el último lote confirmado de una ejecución anterior')
+
+    def handle(self, *args, **options):
+        archivo = options['archivo']
+        punto_control = PuntoControl('importar_clientes', archivo)
+
+        if options['reanudar']:
+            progreso = punto_control.cargar()
+        else:
+            punto_control.eliminar()
+            progreso = {'filas_procesadas': 0}
+
+        filas_procesadas = progreso.get('filas_procesadas', 0)
+        creados = progreso.get('creados', 0)
+        actualizados = progreso.get('actualizados', 0)
+        if filas_procesadas:
+            self.stdout.write(f'Reanudando después de {filas_procesadas:,} filas ya importadas')
+
+        # Los tipos de documento se resuelven una sola vez para todo el archivo
+        tipos_documento = dict(
+            TipoDocumento.objects.filter(activo=True).values_list('codigo', 'id')
+        )
+        reporte = ReporteRendimiento()
+
+        try:
+            lotes = leer_lotes(archivo, options['tamano_lote'], filas_procesadas, options['hoja'])
+            for numero_lote, lote in enumerate(lotes, start=1):
+                campos_actualizables = self.campos_actualizables(lote.columns)
+                validas, rechazos, existentes = self.validar_lote(lote, tipos_documento)
+                escribir_rechazos(options['errores'], rechazos)
+
+                if not validas.empty:
+                    lote_actualizados = int(validas['numero_documento'].isin(existentes).sum())
+                    actualizados += lote_actualizados
+                    creados += len(validas) - lote_actualizados
+
+                filas_procesadas += len(lote)
+                # El lote y su punto de control se confirman juntos
+                with transaction.atomic():
+                    if not validas.empty:
+                        Cliente.objects.bulk_create(
+                            self.construir_clientes(validas),
+                            batch_size=1000,
+                            update_conflicts=True,
+                            unique_fields=['numero_documento'],
+                            update_fields=campos_actualizables,
+                        )
+                    punto_control.guardar(
+                        filas_procesadas=filas_procesadas, creados=creados, actualizados=actualizados
+                    )
+                if not validas.empty:
+                    # bulk_create no emite post_save: se invalidan los perfiles en caché
+                    cache_perfiles.invalidar_varios(numeros_documento=validas['numero_documento'].tolist())
+                reporte.registrar(len(validas), len(rechazos))
+                self.stdout.write(f'Lote {numero_lote}: {reporte.resumen()}')
+
+        except (OSError, ValueError) as error:
+            raise CommandError(f'Error leyendo {archivo}: {error}')
+
+        punto_control.eliminar()
+        self.stdout.write(self.style.SUCCESS(
+            f'Importación finalizada: {reporte.resumen()}\n'
+            f'Clientes creados: {creados:,} - actualizados: {actualizados:,}'
+        ))
+
+    def campos_actualizables(self, columnas):
+        """
+        Campos a sobrescribir en los clientes existentes. Una columna opcional
+        que el archivo no trae no se toca: sus valores por defecto solo
+        aplican a los clientes nuevos.
+        """
+        ausentes = {columna for columna in COLUMNAS_OPCIONALES if columna not in columnas}
+        return [campo for campo in CAMPOS_ACTUALIZABLES if campo not in ausentes]
+
+    def validar_lote(self, lote, tipos_documento):
+        """
+        Valida un lote completo con operaciones vectorizadas y detecta conflictos
+        de unicidad dentro del lote y contra la base de datos.
+        Retorna (filas válidas, filas rechazadas con motivo, documentos ya existentes).
+        """
+        faltantes = [columna for columna in COLUMNAS_REQUERIDAS if columna not in lote.columns]
+        if faltantes:
+            raise CommandError(f'Faltan columnas obligatorias: {", ".join(faltantes)}')
+
+        lote = lote.copy()
+        for columna in COLUMNAS_OPCIONALES:
+            if columna not in lote.columns:
+                lote[columna] = ''
+
+        motivo = pd.Series('', index=lote.index, dtype=object)
+
+        def rechazar(mascara, mensaje):
+            nuevos = mascara & (motivo == '')
+            motivo[nuevos] = mensaje
+
+        for columna in COLUMNAS_REQUERIDAS:
+            rechazar(lote[columna] == '', f'{columna} vacío')
+
+        # Tipo de documento por código, resuelto contra el diccionario precargado
+        lote['tipo_documento_id'] = lote['tipo_documento'].str.upper().map(tipos_documento)
+        rechazar(lote['tipo_documento_id'].isna(), 'tipo_documento no válido')
+
+        # Validadores del modelo (teléfono, correo, longitudes) en forma vectorizada
+        for nombre in CAMPOS_TEXTO:
+            campo = Cliente._meta.get_field(nombre)
+            rechazar(validar_campo_vectorizado(lote[nombre], campo), f'{nombre} inválido')
+
+        fechas = pd.to_datetime(lote['fecha_nacimiento'], errors='coerce', format='mixed')
+        rechazar(fechas.isna(), 'fecha_nacimiento inválida')
+        lote['fecha_nacimiento'] = fechas.dt.date
+
+        lote['genero'] = lote['genero'].str.upper()
+        rechazar(
+            (lote['genero'] != '') & ~lote['genero'].isin([codigo for codigo, _ in Cliente.GENERO_CHOICES]),
+            'genero no válido'
+        )
+
+        activo = lote['activo'].str.lower()
+        rechazar(~activo.isin(VALORES_VERDADEROS | VALORES_FALSOS | {''}), 'activo no válido')
+        lote['activo'] = ~activo.isin(VALORES_FALSOS)
+
+        # Conflictos dentro del lote: gana la última fila de cada documento
+        rechazar(lote['numero_documento'].duplicated(keep='last'), 'numero_documento repetido en el lote')
+        vigentes = motivo == ''
+        correo_repetido = lote['correo'].where(vigentes).duplicated(keep='first') & vigentes
+        rechazar(correo_repetido, 'correo repetido en el lote')
+
+        # Conflictos contra la base: correo registrado a otro documento
+        documentos_por_correo = {}
+        existentes = set()
+        for bloque in en_bloques(lote.loc[motivo == '', 'correo'].tolist()):
+            documentos_por_correo.update(
+                Cliente.objects.filter(correo__in=bloque).values_list('correo', 'numero_documento')
+            )
+        for bloque in en_bloques(lote.loc[motivo == '', 'numero_documento'].tolist()):
+            existentes.update(
+                Cliente.objects.filter(numero_documento__in=bloque).values_list('numero_documento', flat=True)
+            )
+        propietario = lote['correo'].map(documentos_por_correo)
+        rechazar(
+            propietario.notna() & (propietario != lote['numero_documento']),
+            'correo pertenece a otro cliente'
+        )
+
+        rechazos = lote.loc[motivo != ''].copy()
+        rechazos['motivo_rechazo'] = motivo[motivo != '']
+        validas = lote.loc[motivo == ''].copy()
+        return validas, rechazos, existentes
+
+    def construir_clientes(self, validas):
+        """Convierte las filas validadas en instancias de Cliente sin tocar la base de datos"""
+        def opcional(valor):
+            return valor or None
+
+        return [
+            Cliente(
+                tipo_documento_id=int(fila['tipo_documento_id']),
+                numero_documento=fila['numero_documento'],
+                primer_nombre=fila['primer_nombre'],
+                segundo_nombre=opcional(fila['segundo_nombre']),
+                primer_apellido=fila['primer_apellido'],
+                segundo_apellido=opcional(fila['segundo_apellido']),
+                correo=fila['correo'],
+                telefono=fila['telefono'],
+                fecha_nacimiento=fila['fecha_nacimiento'],
+                genero=opcional(fila['genero']),
+                direccion=fila['direccion'],
+                ciudad=fila['ciudad'],
+                departamento=fila['departamento'],
+                codigo_postal=opcional(fila['codigo_postal']),
+                activo=bool(fila['activo']),
+            )
+            for fila in validas.to_dict('records')
+        ]
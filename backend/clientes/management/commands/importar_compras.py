@@ -0,0 +1,277 @@
+"""
+Importación masiva de compras desde CSV/XLSX
+
+Uso:
+    python manage.py importar_compras compras.csv
+    python manage.py importar_compras compras.xlsx --tamano-lote 10000 --errores rechazos.csv
+    python manage.py importar_compras compras.csv --reanudar
+"""
+from decimal import Decimal
+from zoneinfo import ZoneInfo
+import pandas as pd
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from clientes.importacion import (
+    TAMANO_LOTE_DEFECTO,
+    PuntoControl,
+    ReporteRendimiento,
+    en_bloques,
+    escribir_rechazos,
+    leer_lotes,
+)
+from clientes.models import Cliente, Compra, ResumenDiarioCliente
+from clientes.numeracion import asignador_numero_orden
+
+
+COLUMNAS_REQUERIDAS = [
+    'numero_documento', 'descripcion_productos', 'subtotal', 'total',
+    'metodo_pago', 'direccion_entrega', 'ciudad_entrega',
+]
+
+COLUMNAS_MONTO = ['subtotal', 'descuento', 'impuestos', 'costo_envio', 'total']
+COLUMNAS_ENTERAS = ['cantidad_productos', 'numero_cuotas']
+COLUMNAS_TEXTO = [
+    'numero_orden', 'descripcion_productos', 'direccion_entrega', 'ciudad_entrega',
+    'observaciones', 'codigo_seguimiento', 'usuario_creacion',
+]
+
+# Decimales y cota exclusiva de cada DecimalField de monto: 10 ** (max_digits - decimal_places),
+# p. ej. 10 ** 10 para total (12, 2) y 10 ** 8 para costo_envio (10, 2)
+LIMITES_MONTO = {
+    campo.name: (campo.decimal_places, 10 ** (campo.max_digits - campo.decimal_places))
+    for campo in map(Compra._meta.get_field, COLUMNAS_MONTO)
+}
+
+
+def fecha_utc(valor, zona):
+    """
+    Instante UTC de un texto de fecha; sin zona horaria se interpreta en `zona`.
+    Retorna NaT si no se puede interpretar. Cada valor se convierte por separado,
+    así un lote puede mezclar desfases y fechas con y sin zona.
+    """
+    try:
+        marca = pd.Timestamp(valor)
+        if marca is pd.NaT:
+            return pd.NaT
+        if marca.tzinfo is None:
+            marca = marca.tz_localize(zona)
+        return marca.tz_convert('UTC')
+    except (ValueError, OverflowError):
+        return pd.NaT
+
+
+class Command(BaseCommand):
+    help = 'Importa compras masivamente desde un archivo CSV o XLSX en lotes con bulk_create'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del archivo .csv o .xlsx')
+        parser.add_argument('--tamano-lote', type=int, default=TAMANO_LOTE_DEFECTO,
+                            help='Filas por lote (default: %(default)s)')
+        parser.add_argument('--hoja', help='Hoja a importar (solo XLSX, default: la primera)')
+        parser.add_argument('--errores', help='CSV donde guardar las filas rechazadas con su motivo')
+        parser.add_argument('--reanudar', action='store_true',
+                            help='Continúa desde el último lote confirmado de una ejecución anterior')
+        parser.add_argument('--usuario', default='importacion',
+                            help='Valor de usuario_creacion cuando el archivo no lo trae')
+
+    def handle(self, *args, **options):
+        archivo = options['archivo']
+        punto_control = PuntoControl('importar_compras', archivo)
+
+        if options['reanudar']:
+            progreso = punto_control.cargar()
+        else:
+            punto_control.eliminar()
+            progreso = {'filas_procesadas': 0}
+
+        filas_procesadas = progreso.get('filas_procesadas', 0)
+        clientes_afectados = set()
+        if filas_procesadas:
+            self.stdout.write(f'Reanudando después de {filas_procesadas:,} filas ya importadas')
+            clientes_afectados = self.clientes_de_filas_importadas(
+                archivo, filas_procesadas, options['tamano_lote'], options['hoja']
+            )
+
+        reporte = ReporteRendimiento()
+
+        try:
+            lotes = leer_lotes(archivo, options['tamano_lote'], filas_procesadas, options['hoja'])
+            for numero_lote, lote in enumerate(lotes, start=1):
+                validas, rechazos = self.validar_lote(lote, options['usuario'])
+                escribir_rechazos(options['errores'], rechazos)
+
+                if not validas.empty:
+                    # Los números se reservan fuera de la transacción para aprovechar los
+                    # bloques; un lote que no llega a confirmarse solo deja huecos
+                    sin_orden = validas['numero_orden'] == ''
+                    if sin_orden.any():
+                        validas.loc[sin_orden, 'numero_orden'] = asignador_numero_orden.reservar(
+                            int(sin_orden.sum())
+                        )
+                    clientes_afectados.update(int(cliente_id) for cliente_id in validas['cliente_id'].unique())
+
+                filas_procesadas += len(lote)
+                # El lote y su punto de control se confirman juntos: al reanudar
+                # nunca se repite un lote ya insertado
+                with transaction.atomic():
+                    if not validas.empty:
+                        Compra.objects.bulk_create(self.construir_compras(validas), batch_size=1000)
+                    punto_control.guardar(filas_procesadas=filas_procesadas)
+                reporte.registrar(len(validas), len(rechazos))
+                self.stdout.write(f'Lote {numero_lote}: {reporte.resumen()}')
+
+        except (OSError, ValueError) as error:
+            raise CommandError(f'Error leyendo {archivo}: {error}')
+
+        # Estadísticas y resumen diario: un recálculo agrupado por cliente afectado
+        self.stdout.write(f'Recalculando estadísticas de {len(clientes_afectados):,} clientes...')
+        Cliente.recalcular_estadisticas(sorted(clientes_afectados))
+        ResumenDiarioCliente.reconstruir(sorted(clientes_afectados))
+
+        punto_control.eliminar()
+        self.stdout.write(self.style.SUCCESS(f'Importación finalizada: {reporte.resumen()}'))
+
+    def clientes_de_filas_importadas(self, archivo, filas, tamano_lote, hoja):
+        """
+        Clientes de las primeras `filas` del archivo (las de ejecuciones anteriores).
+        Se reconstruyen al reanudar en lugar de guardarlos en cada punto de
+        control; incluir clientes de filas rechazadas solo agrega recálculos.
+        """
+        documentos = set()
+        leidas = 0
+        for lote in leer_lotes(archivo, tamano_lote, 0, hoja):
+            lote = lote.iloc[:filas - leidas]
+            leidas += len(lote)
+            if 'numero_documento' in lote.columns:
+                documentos.update(lote['numero_documento'].unique().tolist())
+            if leidas >= filas:
+                break
+
+        clientes = set()
+        for bloque in en_bloques(documentos):
+            clientes.update(Cliente.objects.filter(numero_documento__in=bloque).values_list('id', flat=True))
+        return clientes
+
+    def validar_lote(self, lote, usuario):
+        """
+        Valida y normaliza un lote completo con operaciones vectorizadas.
+        Retorna (filas válidas normalizadas, filas rechazadas con motivo).
+        """
+        faltantes = [columna for columna in COLUMNAS_REQUERIDAS if columna not in lote.columns]
+        if faltantes:
+            raise CommandError(f'Faltan columnas obligatorias: {", ".join(faltantes)}')
+
+        lote = lote.copy()
+        for columna in COLUMNAS_TEXTO + COLUMNAS_MONTO + COLUMNAS_ENTERAS + ['estado', 'canal_venta', 'fecha_compra']:
+            if columna not in lote.columns:
+                lote[columna] = ''
+
+        motivo = pd.Series('', index=lote.index, dtype=object)
+
+        def rechazar(mascara, mensaje):
+            nuevos = mascara & (motivo == '')
+            motivo[nuevos] = mensaje
+
+        for columna in COLUMNAS_REQUERIDAS:
+            rechazar(lote[columna] == '', f'{columna} vacío')
+
+        # Montos: numéricos, no negativos y dentro de la precisión de cada campo (ya redondeados)
+        for columna in COLUMNAS_MONTO:
+            lote.loc[lote[columna] == '', columna] = '0'
+            numerico = pd.to_numeric(lote[columna], errors='coerce')
+            decimales, maximo = LIMITES_MONTO[columna]
+            rechazar(
+                numerico.isna() | (numerico < 0) | (numerico.round(decimales) >= maximo),
+                f'{columna} inválido'
+            )
+
+        for columna in COLUMNAS_ENTERAS:
+            lote.loc[lote[columna] == '', columna] = '1'
+            numerico = pd.to_numeric(lote[columna], errors='coerce')
+            rechazar(numerico.isna() | (numerico < 1) | (numerico % 1 != 0), f'{columna} inválido')
+
+        # Opciones de los campos choices
+        lote['metodo_pago'] = lote['metodo_pago'].str.upper()
+        lote['estado'] = lote['estado'].str.upper().replace('', 'PENDIENTE')
+        lote['canal_venta'] = lote['canal_venta'].str.upper().replace('', 'WEB')
+        for columna, opciones in (
+            ('metodo_pago', Compra.METODO_PAGO_CHOICES),
+            ('estado', Compra.ESTADO_CHOICES),
+            ('canal_venta', Compra.CANAL_VENTA_CHOICES),
+        ):
+            rechazar(~lote[columna].isin([codigo for codigo, _ in opciones]), f'{columna} no válido')
+
+        rechazar(lote['numero_orden'].str.len() > 20, 'numero_orden excede 20 caracteres')
+        duplicadas = (lote['numero_orden'] != '') & lote['numero_orden'].duplicated(keep='first')
+        rechazar(duplicadas, 'numero_orden duplicado en el archivo')
+        informados = lote.loc[(lote['numero_orden'] != '') & (motivo == ''), 'numero_orden'].unique().tolist()
+        existentes = set()
+        for bloque in en_bloques(informados):
+            existentes.update(Compra.objects.filter(numero_orden__in=bloque).values_list('numero_orden', flat=True))
+        rechazar(lote['numero_orden'].isin(existentes), 'numero_orden ya existe')
+
+        # Fechas: sin zona horaria se interpretan en la zona del proyecto
+        convertidas = {
+            valor: fecha_utc(valor, settings.TIME_ZONE)
+            for valor in lote['fecha_compra'].unique() if valor != ''
+        }
+        fechas = pd.to_datetime(lote['fecha_compra'].map(convertidas), utc=True)
+        rechazar(fechas.isna() & (lote['fecha_compra'] != ''), 'fecha_compra inválida')
+        lote['fecha_compra'] = fechas
+
+        # Cliente por número de documento con búsquedas IN por bloques
+        documentos = lote['numero_documento'].unique().tolist()
+        ids_por_documento = {}
+        for bloque in en_bloques(documentos):
+            ids_por_documento.update(
+                Cliente.objects.filter(numero_documento__in=bloque).values_list('numero_documento', 'id')
+            )
+        lote['cliente_id'] = lote['numero_documento'].map(ids_por_documento)
+        rechazar(lote['cliente_id'].isna(), 'cliente no existe')
+
+        lote.loc[lote['usuario_creacion'] == '', 'usuario_creacion'] = usuario
+
+        rechazos = lote.loc[motivo != ''].copy()
+        rechazos['motivo_rechazo'] = motivo[motivo != '']
+        validas = lote.loc[motivo == ''].copy()
+        return validas, rechazos
+
+    def construir_compras(self, validas):
+        """Convierte las filas validadas en instancias de Compra sin tocar la base de datos"""
+        ahora = timezone.now()
+        compras = []
+
+        for fila in validas.to_dict('records'):
+            fecha = fila['fecha_compra']
+            if pd.isna(fecha):
+                fecha = ahora
+            else:
+                fecha = fecha.to_pydatetime()
+                if not settings.USE_TZ:
+                    fecha = timezone.make_naive(fecha, ZoneInfo(settings.TIME_ZONE))
+
+            compras.append(Compra(
+                cliente_id=int(fila['cliente_id']),
+                numero_orden=fila['numero_orden'],
+                fecha_compra=fecha,
+                descripcion_productos=fila['descripcion_productos'],
+                cantidad_productos=int(float(fila['cantidad_productos'])),
+                subtotal=Decimal(fila['subtotal']).quantize(Decimal('0.01')),
+                descuento=Decimal(fila['descuento']).quantize(Decimal('0.01')),
+                impuestos=Decimal(fila['impuestos']).quantize(Decimal('0.01')),
+                costo_envio=Decimal(fila['costo_envio']).quantize(Decimal('0.01')),
+                total=Decimal(fila['total']).quantize(Decimal('0.01')),
+                metodo_pago=fila['metodo_pago'],
+                numero_cuotas=int(float(fila['numero_cuotas'])),
+                canal_venta=fila['canal_venta'],
+                direccion_entrega=fila['direccion_entrega'],
+                ciudad_entrega=fila['ciudad_entrega'],
+                estado=fila['estado'],
+                observaciones=fila['observaciones'],
+                codigo_seguimiento=fila['codigo_seguimiento'],
+                usuario_creacion=fila['usuario_creacion'],
+            ))
+
+        return compras
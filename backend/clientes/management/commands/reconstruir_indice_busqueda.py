@@ -0,0 +1,21 @@
+"""
+Reconstruye el índice de texto completo de clientes (FTS5)
+
+Uso:
+    python manage.py reconstruir_indice_busqueda
+"""
+import time
+from django.core.management.base import BaseCommand, CommandError
+from clientes.services_busqueda import reconstruir_indice_busqueda
+
+
+class Command(BaseCommand):
+    help = 'Regenera clientes_cliente_fts a partir de la tabla de clientes'
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        if not reconstruir_indice_busqueda():
+            raise CommandError('El índice de texto completo solo existe en SQLite')
+        self.stdout.write(self.style.SUCCESS(
+            f'Índice de búsqueda reconstruido en {time.perf_counter() - inicio:,.1f}s'
+        ))
@@ -0,0 +1,25 @@
+"""
+Reconstruye el resumen diario de compras por cliente
+
+Uso:
+    python manage.py reconstruir_resumen_diario
+    python manage.py reconstruir_resumen_diario --clientes 10 25 31
+"""
+import time
+from django.core.management.base import BaseCommand
+from clientes.models import ResumenDiarioCliente
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye ResumenDiarioCliente a partir de las compras registradas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clientes', nargs='+', type=int,
+                            help='IDs de clientes a reconstruir (default: todos)')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        generadas = ResumenDiarioCliente.reconstruir(options['clientes'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Resumen diario reconstruido: {generadas:,} filas en {time.perf_counter() - inicio:,.1f}s'
+        ))
@@ -0,0 +1,26 @@
+# Generated by Django 5.0.6 on 2026-10-16 20:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SecuenciaOrden',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prefijo', models.CharField(help_text='Prefijo del día, ej. ORD-251108', max_length=16, unique=True)),
+                ('ultimo_valor', models.BigIntegerField(default=0, help_text='Último número reservado')),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Secuencia de Orden',
+                'verbose_name_plural': 'Secuencias de Órdenes',
+            },
+        ),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 5.0.6 on 2026-10-16 21:00
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, Max, Q, Sum
+from django.db.models.functions import TruncDate
+
+
+ESTADOS_VALIDOS = ['COMPLETADA', 'PENDIENTE', 'PROCESANDO', 'ENVIADO', 'ENTREGADO']
+
+
+def monto(valor):
+    return (valor or Decimal('0')).quantize(Decimal('0.01'))
+
+
+def poblar_resumen_y_estadisticas(apps, schema_editor):
+    """Genera el resumen diario y recalcula las estadísticas de clientes existentes"""
+    Cliente = apps.get_model('clientes', 'Cliente')
+    Compra = apps.get_model('clientes', 'Compra')
+    ResumenDiarioCliente = apps.get_model('clientes', 'ResumenDiarioCliente')
+    validas = Q(estado__in=ESTADOS_VALIDOS)
+
+    agrupado = Compra.objects.annotate(dia=TruncDate('fecha_compra')).values('cliente_id', 'dia').annotate(
+        suma_valida=Sum('total', filter=validas),
+        conteo_valido=Count('id', filter=validas),
+        suma_cancelada=Sum('total', filter=Q(estado='CANCELADA')),
+        suma_devuelta=Sum('total', filter=Q(estado='DEVUELTA')),
+    ).order_by()
+    ResumenDiarioCliente.objects.bulk_create(
+        (
+            ResumenDiarioCliente(
+                cliente_id=fila['cliente_id'],
+                fecha=fila['dia'],
+                total_valido=monto(fila['suma_valida']),
+                cantidad_valida=fila['conteo_valido'],
+                total_cancelado=monto(fila['suma_cancelada']),
+                total_devuelto=monto(fila['suma_devuelta']),
+            )
+            for fila in agrupado.iterator(chunk_size=2000)
+        ),
+        batch_size=2000,
+    )
+
+    # Las estadísticas antes solo se actualizaban con compras COMPLETADA
+    estadisticas = {
+        fila['cliente_id']: fila
+        for fila in Compra.objects.filter(validas).values('cliente_id').annotate(
+            total=Sum('total'), ultima=Max('fecha_compra')
+        ).order_by()
+    }
+    clientes = []
+    for cliente in Cliente.objects.only('id').iterator(chunk_size=2000):
+        fila = estadisticas.get(cliente.id, {})
+        cliente.total_compras = monto(fila.get('total'))
+        cliente.ultima_compra = fila.get('ultima')
+        clientes.append(cliente)
+    Cliente.objects.bulk_update(clientes, ['total_compras', 'ultima_compra'], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0002_secuenciaorden'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenDiarioCliente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(help_text='Día de las compras (zona horaria local)')),
+                ('total_valido', models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Total de compras en estados válidos', max_digits=14)),
+                ('cantidad_valida', models.IntegerField(default=0, help_text='Cantidad de compras en estados válidos')),
+                ('total_cancelado', models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Total de compras canceladas', max_digits=14)),
+                ('total_devuelto', models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Total de compras devueltas', max_digits=14)),
+                ('cliente', models.ForeignKey(help_text='Cliente al que pertenece el resumen', on_delete=django.db.models.deletion.CASCADE, related_name='resumen_diario', to='clientes.cliente')),
+            ],
+            options={
+                'verbose_name': 'Resumen Diario de Cliente',
+                'verbose_name_plural': 'Resúmenes Diarios de Clientes',
+                'ordering': ['-fecha'],
+                'indexes': [models.Index(fields=['fecha'], name='clientes_re_fecha_3eb889_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='resumendiariocliente',
+            constraint=models.UniqueConstraint(fields=('cliente', 'fecha'), name='resumen_diario_cliente_fecha_unico'),
+        ),
+        migrations.RunPython(poblar_resumen_y_estadisticas, migrations.RunPython.noop),
+    ]
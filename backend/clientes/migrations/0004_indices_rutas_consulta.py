@@ -0,0 +1,61 @@
+# Generated by Django 5.0.6 on 2026-10-16 21:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0003_resumendiariocliente'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='cliente',
+            name='clientes_cl_numero__868cb7_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='cliente',
+            name='clientes_cl_correo_38c1d1_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='cliente',
+            name='clientes_cl_activo_b76065_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='compra',
+            name='clientes_co_numero__d6f8ba_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='compra',
+            name='clientes_co_estado_9a869b_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='compra',
+            name='clientes_co_fecha_c_73a751_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='compra',
+            name='clientes_co_metodo__fa088f_idx',
+        ),
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(condition=models.Q(('activo', True)), fields=['-fecha_registro', '-id'], name='cliente_activo_registro_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='compra',
+            index=models.Index(fields=['estado', 'fecha_compra'], name='compra_estado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='compra',
+            index=models.Index(fields=['cliente', 'estado', '-fecha_compra'], name='compra_cliente_estado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='compra',
+            index=models.Index(fields=['metodo_pago', '-fecha_compra'], name='compra_metodo_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='compra',
+            index=models.Index(fields=['-fecha_compra', '-id'], name='compra_fecha_id_idx'),
+        ),
+    ]
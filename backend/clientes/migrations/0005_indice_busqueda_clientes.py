@@ -0,0 +1,88 @@
+# Generated by Django 5.0.6 on 2026-10-16 23:10
+
+from django.db import migrations
+
+
+# Columnas de clientes_cliente indexadas (external content: FTS5 no duplica los textos)
+COLUMNAS = [
+    'primer_nombre', 'segundo_nombre', 'primer_apellido', 'segundo_apellido',
+    'numero_documento', 'correo', 'telefono', 'ciudad', 'departamento',
+]
+
+# Peso bm25 de cada columna, en el mismo orden: los nombres pesan más que la ubicación
+PESOS = ['10.0', '10.0', '10.0', '10.0', '5.0', '3.0', '2.0', '1.0', '1.0']
+
+
+def _columnas(prefijo=''):
+    return ', '.join(f'{prefijo}{columna}' for columna in COLUMNAS)
+
+
+SQL_CREAR = [
+    # unicode61 + remove_diacritics: "Nuñez", "NUNEZ" y "nuñez" generan el mismo token.
+    # prefix='2 3' indexa los prefijos cortos para que "ju*" no recorra todo el vocabulario.
+    f"""
+    CREATE VIRTUAL TABLE clientes_cliente_fts USING fts5(
+        {_columnas()},
+        content='clientes_cliente',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    """,
+    f"""
+    CREATE TRIGGER clientes_cliente_fts_ai AFTER INSERT ON clientes_cliente BEGIN
+        INSERT INTO clientes_cliente_fts(rowid, {_columnas()})
+        VALUES (new.id, {_columnas('new.')});
+    END
+    """,
+    f"""
+    CREATE TRIGGER clientes_cliente_fts_ad AFTER DELETE ON clientes_cliente BEGIN
+        INSERT INTO clientes_cliente_fts(clientes_cliente_fts, rowid, {_columnas()})
+        VALUES ('delete', old.id, {_columnas('old.')});
+    END
+    """,
+    # Solo cuando cambia una columna indexada: las estadísticas de compras no reindexan
+    f"""
+    CREATE TRIGGER clientes_cliente_fts_au AFTER UPDATE OF {_columnas()} ON clientes_cliente BEGIN
+        INSERT INTO clientes_cliente_fts(clientes_cliente_fts, rowid, {_columnas()})
+        VALUES ('delete', old.id, {_columnas('old.')});
+        INSERT INTO clientes_cliente_fts(rowid, {_columnas()})
+        VALUES (new.id, {_columnas('new.')});
+    END
+    """,
+    f"INSERT INTO clientes_cliente_fts(clientes_cliente_fts, rank) VALUES ('rank', 'bm25({', '.join(PESOS)})')",
+    "INSERT INTO clientes_cliente_fts(clientes_cliente_fts) VALUES ('rebuild')",
+]
+
+SQL_ELIMINAR = [
+    'DROP TRIGGER IF EXISTS clientes_cliente_fts_au',
+    'DROP TRIGGER IF EXISTS clientes_cliente_fts_ad',
+    'DROP TRIGGER IF EXISTS clientes_cliente_fts_ai',
+    'DROP TABLE IF EXISTS clientes_cliente_fts',
+]
+
+
+def crear_indice_busqueda(apps, schema_editor):
+    """FTS5 es propio de SQLite; en otros motores la búsqueda usa icontains"""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sentencia in SQL_CREAR:
+        schema_editor.execute(sentencia)
+
+
+def eliminar_indice_busqueda(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sentencia in SQL_ELIMINAR:
+        schema_editor.execute(sentencia)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0004_indices_rutas_consulta'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice_busqueda, eliminar_indice_busqueda),
+    ]
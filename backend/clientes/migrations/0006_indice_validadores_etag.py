@@ -0,0 +1,17 @@
+# Generated by Django 5.0.6 on 2026-10-16 23:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0005_indice_busqueda_clientes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='compra',
+            index=models.Index(fields=['cliente', 'fecha_actualizacion'], name='compra_cliente_actualiz_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.0.6 on 2026-10-16 22:37
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0006_indice_validadores_etag'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrabajoExportacion',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('tipo', models.CharField(choices=[('csv', 'Clientes CSV'), ('excel', 'Clientes Excel'), ('txt', 'Clientes TXT'), ('fidelizacion', 'Reporte de fidelización')], max_length=20)),
+                ('parametros', models.JSONField(blank=True, default=dict, help_text='Parámetros normalizados de la exportación')),
+                ('clave', models.CharField(help_text='Hash del tipo y los parámetros', max_length=64)),
+                ('huella', models.CharField(help_text='Hash de la clave y la versión de los datos', max_length=64)),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('EN_PROCESO', 'En proceso'), ('COMPLETADO', 'Completado'), ('ERROR', 'Error'), ('VENCIDO', 'Vencido')], default='PENDIENTE', max_length=20)),
+                ('progreso', models.PositiveSmallIntegerField(default=0, help_text='Porcentaje de avance (0-100)')),
+                ('archivo', models.CharField(blank=True, help_text='Nombre del archivo en EXPORTACIONES_DIR', max_length=255)),
+                ('nombre_descarga', models.CharField(blank=True, max_length=255)),
+                ('tamano', models.BigIntegerField(blank=True, help_text='Tamaño del archivo en bytes', null=True)),
+                ('mensaje_error', models.TextField(blank=True)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+                ('fecha_fin', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Trabajo de Exportación',
+                'verbose_name_plural': 'Trabajos de Exportación',
+                'ordering': ['-fecha_creacion'],
+                'indexes': [models.Index(fields=['huella', 'estado'], name='trabajo_export_huella_idx'), models.Index(fields=['clave', 'estado'], name='trabajo_export_clave_idx')],
+            },
+        ),
+    ]
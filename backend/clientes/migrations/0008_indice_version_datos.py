@@ -0,0 +1,17 @@
+# Generated by Django 5.0.6 on 2026-10-16 22:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0007_trabajoexportacion'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['fecha_actualizacion'], name='cliente_actualizacion_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-16 22:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0008_indice_version_datos'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='trabajoexportacion',
+            name='tipo',
+            field=models.CharField(choices=[('csv', 'Clientes CSV'), ('excel', 'Clientes Excel'), ('txt', 'Clientes TXT'), ('fidelizacion', 'Reporte de fidelización'), ('parquet', 'Parquet'), ('arrow', 'Arrow IPC stream')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.6 on 2026-10-16 23:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0009_tipos_exportacion_columnar'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PuntoControlImportacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(help_text='Comando y ruta absoluta del archivo', max_length=255, unique=True)),
+                ('filas_procesadas', models.BigIntegerField(default=0)),
+                ('datos', models.JSONField(blank=True, default=dict, help_text='Estado adicional del comando')),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Punto de Control de Importación',
+                'verbose_name_plural': 'Puntos de Control de Importación',
+            },
+        ),
+    ]
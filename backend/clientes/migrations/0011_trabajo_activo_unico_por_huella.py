@@ -0,0 +1,34 @@
+# Generated by Django 5.0.6 on 2026-10-16 23:43
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def cerrar_trabajos_duplicados(apps, schema_editor):
+    """Deja un solo trabajo activo por huella (el más reciente) antes de crear la restricción"""
+    TrabajoExportacion = apps.get_model('clientes', 'TrabajoExportacion')
+    vistas = set()
+    duplicados = []
+    activos = TrabajoExportacion.objects.filter(estado__in=['PENDIENTE', 'EN_PROCESO']).order_by('-fecha_creacion')
+    for trabajo_id, huella in activos.values_list('id', 'huella'):
+        if huella in vistas:
+            duplicados.append(trabajo_id)
+        vistas.add(huella)
+    TrabajoExportacion.objects.filter(id__in=duplicados).update(
+        estado='ERROR', mensaje_error='Trabajo duplicado', fecha_fin=timezone.now()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0010_puntos_control_importacion'),
+    ]
+
+    operations = [
+        migrations.RunPython(cerrar_trabajos_duplicados, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='trabajoexportacion',
+            constraint=models.UniqueConstraint(condition=models.Q(('estado__in', ['PENDIENTE', 'EN_PROCESO'])), fields=('huella',), name='trabajo_export_huella_activo_unico'),
+        ),
+    ]
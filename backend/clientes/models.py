@@ -1,7 +1,14 @@
-from django.db import models
+import calendar
+import uuid
+from datetime import date, timedelta
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, Count, F, Max, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.core.validators import RegexValidator, EmailValidator
 from django.utils import timezone
 from decimal import Decimal
+from .cache_clientes import cache_perfiles
 
 
 class TipoDocumento(models.Model):
@@ -24,6 +31,79 @@ class TipoDocumento(models.Model):
         return f"{self.codigo} - {self.nombre}"
 
 
+class SecuenciaOrden(models.Model):
+    """
+    Contador persistente para la numeración de órdenes de compra.
+    Cada proceso reserva bloques de números con un incremento atómico
+    (ver clientes.numeracion), por lo que hay una fila por día.
+    """
+    prefijo = models.CharField(max_length=16, unique=True, help_text="Prefijo del día, ej. ORD-251108")
+    ultimo_valor = models.BigIntegerField(default=0, help_text="Último número reservado")
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = "Secuencia de Orden"
+        verbose_name_plural = "Secuencias de Órdenes"
+        
+    def __str__(self):
+        return f"{self.prefijo}: {self.ultimo_valor}"
+
+
+class PuntoControlImportacion(models.Model):
+    """
+    Avance de una importación masiva (ver clientes.importacion.PuntoControl).
+    Se guarda en la misma transacción que cada lote, así el lote y su punto
+    de control se confirman o se pierden juntos.
+    """
+    clave = models.CharField(max_length=255, unique=True, help_text="Comando y ruta absoluta del archivo")
+    filas_procesadas = models.BigIntegerField(default=0)
+    datos = models.JSONField(default=dict, blank=True, help_text="Estado adicional del comando")
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Punto de Control de Importación"
+        verbose_name_plural = "Puntos de Control de Importación"
+
+    def __str__(self):
+        return f"{self.clave}: {self.filas_procesadas}"
+
+
+class ContadorCambios(models.Model):
+    """
+    Contadores de cambios que no mueven ninguna fecha_actualizacion: borrados
+    de clientes y compras y cambios del catálogo de tipos de documento. Las
+    señales los incrementan en la transacción del cambio; el de VERSION_DATOS
+    forma parte de la versión de los datos (ver clientes.cache_reportes).
+    """
+    VERSION_DATOS = 'version_datos'
+
+    clave = models.CharField(max_length=50, unique=True)
+    valor = models.BigIntegerField(default=0)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Contador de Cambios"
+        verbose_name_plural = "Contadores de Cambios"
+
+    def __str__(self):
+        return f"{self.clave}: {self.valor}"
+
+    @classmethod
+    def incrementar(cls, clave):
+        """Suma uno al contador `clave`, creándolo si no existe"""
+        contador = cls.objects.filter(clave=clave)
+        cambios = {'valor': F('valor') + 1, 'fecha_actualizacion': timezone.now()}
+
+        if contador.update(**cambios):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(clave=clave, valor=1)
+        except IntegrityError:
+            # Otra escritura creó el contador al mismo tiempo
+            contador.update(**cambios)
+
+
 class Cliente(models.Model):
     """
     Modelo principal de clientes con validaciones y campos adicionales.
@@ -119,11 +199,17 @@ class Cliente(models.Model):
         verbose_name = "Cliente"
         verbose_name_plural = "Clientes"
         ordering = ['-fecha_registro']
+        # numero_documento y correo ya tienen índice por su restricción unique.
+        # El índice parcial cubre el listado de clientes activos.
         indexes = [
-            models.Index(fields=['numero_documento']),
-            models.Index(fields=['correo']),
             models.Index(fields=['fecha_registro']),
-            models.Index(fields=['activo']),
+            models.Index(
+                fields=['-fecha_registro', '-id'],
+                condition=Q(activo=True),
+                name='cliente_activo_registro_idx',
+            ),
+            # Versión de los datos de reportes: MAX(fecha_actualizacion) con una búsqueda en el índice
+            models.Index(fields=['fecha_actualizacion'], name='cliente_actualizacion_idx'),
         ]
         
     def __str__(self):
@@ -152,71 +238,156 @@ class Cliente(models.Model):
             edad -= 1
         return edad
     
+    # Campos mantenidos por Compra mediante actualizaciones atómicas (ver aplicar_delta_compras)
+    CAMPOS_ESTADISTICAS = ('ultima_compra', 'total_compras')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        instancia._pk_guardado = instancia.pk
+        return instancia
+
+    def save(self, *args, **kwargs):
+        """
+        Override save para no sobrescribir las estadísticas de compras.
+        Un guardado completo de un cliente que ya está en la base (leído o
+        guardado con este mismo pk) excluye los campos estadísticos, que solo
+        se modifican con actualizaciones atómicas. Una instancia nueva, aunque
+        traiga un pk explícito, se inserta completa.
+        """
+        existente = self.pk is not None and self.pk == getattr(self, '_pk_guardado', None)
+        if existente and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.CAMPOS_ESTADISTICAS
+            ]
+        super().save(*args, **kwargs)
+        self._pk_guardado = self.pk
+
     def actualizar_estadisticas_compras(self):
-        """Actualiza las estadísticas de compras del cliente"""
-        # Estados válidos para contabilizar en estadísticas
-        estados_validos = ['COMPLETADA', 'PENDIENTE', 'PROCESANDO', 'ENVIADO', 'ENTREGADO']
-        compras = self.compras.filter(estado__in=estados_validos)
-        
-        if compras.exists():
-            self.ultima_compra = compras.order_by('-fecha_compra').first().fecha_compra
-            self.total_compras = sum(compra.total for compra in compras)
-        else:
-            self.ultima_compra = None
-            self.total_compras = Decimal('0.00')
-        self.save(update_fields=['ultima_compra', 'total_compras'])
-
-    def calcular_compras_ultimo_mes(self):
-        """Calcula el monto total de compras del último mes"""
-        from datetime import date, datetime
-        from dateutil.relativedelta import relativedelta
+        """
+        Recalcula desde cero las estadísticas de compras del cliente.
+        Las escrituras de Compra mantienen estos campos de forma incremental;
+        este método queda para reparaciones y cargas masivas.
+        """
+        resumen = self.compras.filter(estado__in=Compra.ESTADOS_VALIDOS).aggregate(
+            total=Sum('total'),
+            ultima=Max('fecha_compra'),
+        )
+        self.ultima_compra = resumen['ultima']
+        self.total_compras = (resumen['total'] or Decimal('0')).quantize(Decimal('0.01'))
+        super().save(update_fields=list(self.CAMPOS_ESTADISTICAS))
+
+    @classmethod
+    def recalcular_estadisticas(cls, cliente_ids, tamano_bloque=500):
+        """
+        Recalcula total_compras y ultima_compra de varios clientes con una
+        consulta agrupada y un bulk_update por bloque (cargas masivas).
+        """
+        cliente_ids = list(cliente_ids)
+        for inicio in range(0, len(cliente_ids), tamano_bloque):
+            bloque = cliente_ids[inicio:inicio + tamano_bloque]
+            resumen = {
+                fila['cliente_id']: fila
+                for fila in Compra.objects.filter(
+                    cliente_id__in=bloque,
+                    estado__in=Compra.ESTADOS_VALIDOS
+                ).values('cliente_id').annotate(
+                    total=Sum('total'),
+                    ultima=Max('fecha_compra'),
+                ).order_by()
+            }
+            clientes = [
+                cls(
+                    pk=cliente_id,
+                    total_compras=(
+                        resumen[cliente_id]['total'] if cliente_id in resumen else Decimal('0')
+                    ).quantize(Decimal('0.01')),
+                    ultima_compra=resumen[cliente_id]['ultima'] if cliente_id in resumen else None,
+                )
+                for cliente_id in bloque
+            ]
+            cls.objects.bulk_update(clientes, list(cls.CAMPOS_ESTADISTICAS))
+            cache_perfiles.invalidar_varios(cliente_ids=bloque)
+
+    @classmethod
+    def aplicar_delta_compras(cls, cliente_id, delta_total=Decimal('0.00'),
+                              fecha_agregada=None, fecha_retirada=None):
+        """
+        Aplica un cambio incremental a las estadísticas de un cliente con un
+        único UPDATE atómico, sin releer su historial de compras.
+
+        - delta_total: diferencia a sumar en total_compras
+        - fecha_agregada: fecha de una compra válida que entra al conjunto
+        - fecha_retirada: fecha de una compra válida que sale del conjunto;
+          solo si coincidía con ultima_compra se busca la nueva última compra
+          (una consulta indexada por cliente y fecha)
+        """
+        ultima_compra = F('ultima_compra')
         
-        # Fecha de hace un mes
-        fecha_limite = date.today() - relativedelta(months=1)
+        if fecha_agregada is not None:
+            ultima_compra = Case(
+                When(
+                    Q(ultima_compra__isnull=True) | Q(ultima_compra__lt=fecha_agregada),
+                    then=Value(fecha_agregada)
+                ),
+                default=ultima_compra,
+            )
         
-        # Estados válidos para contabilizar
-        estados_validos = ['COMPLETADA', 'PENDIENTE', 'PROCESANDO', 'ENVIADO', 'ENTREGADO']
+        if fecha_retirada is not None:
+            ultima_valida = Compra.objects.filter(
+                cliente_id=OuterRef('pk'),
+                estado__in=Compra.ESTADOS_VALIDOS
+            ).order_by('-fecha_compra').values('fecha_compra')[:1]
+            ultima_compra = Case(
+                When(ultima_compra__lte=fecha_retirada, then=Subquery(ultima_valida)),
+                default=ultima_compra,
+            )
         
-        # Filtrar compras del último mes
-        compras_ultimo_mes = self.compras.filter(
-            fecha_compra__gte=fecha_limite,
-            estado__in=estados_validos
+        cls.objects.filter(pk=cliente_id).update(
+            total_compras=F('total_compras') + delta_total,
+            ultima_compra=ultima_compra,
         )
+        cache_perfiles.invalidar(cliente_id=cliente_id)
+
+    def calcular_compras_ultimo_mes(self, dias=None):
+        """Calcula el monto total de compras del último mes (ventana de fidelización)"""
+        from .services_fidelizacion import resumen_compras_ventana
         
-        # Calcular total y cantidad
-        total_mes = sum(compra.total for compra in compras_ultimo_mes)
-        cantidad_mes = compras_ultimo_mes.count()
+        resumen = resumen_compras_ventana(self, dias)
         
         return {
-            'total_ultimo_mes': total_mes,
-            'cantidad_ultimo_mes': cantidad_mes,
-            'fecha_desde': fecha_limite,
-            'compras_detalle': compras_ultimo_mes
+            'total_ultimo_mes': resumen['total'],
+            'cantidad_ultimo_mes': resumen['cantidad'],
+            'ultima_compra_mes': resumen['ultima_compra'],
+            'fecha_desde': resumen['fecha_desde'],
+            'compras_detalle': resumen['compras']
         }
 
     @classmethod
-    def obtener_candidatos_fidelizacion(cls, monto_minimo=Decimal('5000000')):
+    def obtener_candidatos_fidelizacion(cls, monto_minimo=Decimal('5000000'), dias=None):
         """
         Obtiene clientes candidatos para fidelización.
         Criterio: compras del último mes >= monto_minimo
-        """
-        candidatos = []
         
-        for cliente in cls.objects.filter(activo=True):
-            estadisticas_mes = cliente.calcular_compras_ultimo_mes()
-            
-            if estadisticas_mes['total_ultimo_mes'] >= monto_minimo:
-                candidatos.append({
-                    'cliente': cliente,
-                    'total_ultimo_mes': estadisticas_mes['total_ultimo_mes'],
-                    'cantidad_compras_mes': estadisticas_mes['cantidad_ultimo_mes'],
-                    'fecha_desde': estadisticas_mes['fecha_desde']
-                })
+        El total, la cantidad y la última compra de la ventana se calculan
+        para todos los clientes en una sola consulta agrupada.
+        """
+        from .services_fidelizacion import candidatos_fidelizacion, inicio_ventana
         
-        # Ordenar por monto de mayor a menor
-        candidatos.sort(key=lambda x: x['total_ultimo_mes'], reverse=True)
+        fecha_desde, _ = inicio_ventana(dias)
         
-        return candidatos
+        # Ya vienen ordenados por monto de mayor a menor
+        return [
+            {
+                'cliente': cliente,
+                'total_ultimo_mes': cliente.total_ventana.quantize(Decimal('0.01')),
+                'cantidad_compras_mes': cliente.cantidad_ventana,
+                'ultima_compra_mes': cliente.ultima_compra_ventana,
+                'fecha_desde': fecha_desde
+            }
+            for cliente in candidatos_fidelizacion(monto_minimo, dias).select_related('tipo_documento')
+        ]
 
 
 class Compra(models.Model):
@@ -234,6 +405,9 @@ class Compra(models.Model):
         ('DEVUELTA', 'Devuelta'),
     ]
     
+    # Estados que cuentan para estadísticas y fidelización
+    ESTADOS_VALIDOS = ['COMPLETADA', 'PENDIENTE', 'PROCESANDO', 'ENVIADO', 'ENTREGADO']
+    
     METODO_PAGO_CHOICES = [
         ('EFECTIVO', 'Efectivo'),
         ('TARJETA_CREDITO', 'Tarjeta de Crédito'),
@@ -380,30 +554,113 @@ class Compra(models.Model):
         verbose_name = "Compra"
         verbose_name_plural = "Compras"
         ordering = ['-fecha_compra']
+        # numero_orden ya tiene índice por su restricción unique.
+        # Los índices compuestos siguen las rutas de acceso de las vistas:
+        # filtro por igualdad/IN primero y orden por fecha después.
         indexes = [
-            models.Index(fields=['numero_orden']),
             models.Index(fields=['cliente', '-fecha_compra']),
-            models.Index(fields=['estado']),
-            models.Index(fields=['fecha_compra']),
-            models.Index(fields=['metodo_pago']),
             models.Index(fields=['canal_venta']),
+            models.Index(fields=['estado', 'fecha_compra'], name='compra_estado_fecha_idx'),
+            models.Index(fields=['cliente', 'estado', '-fecha_compra'], name='compra_cliente_estado_idx'),
+            models.Index(fields=['metodo_pago', '-fecha_compra'], name='compra_metodo_fecha_idx'),
+            models.Index(fields=['-fecha_compra', '-id'], name='compra_fecha_id_idx'),
+            # Validadores ETag: última modificación y cantidad de compras por cliente
+            models.Index(fields=['cliente', 'fecha_actualizacion'], name='compra_cliente_actualiz_idx'),
+            # Versión de los datos de reportes: MAX(fecha_actualizacion) con una búsqueda en el índice
+            models.Index(fields=['fecha_actualizacion'], name='compra_actualizacion_idx'),
         ]
         
     def __str__(self):
         return f"Orden {self.numero_orden} - {self.cliente.nombre_completo} - ${self.total}"
     
+    # Campos de la compra que afectan las estadísticas del cliente
+    CAMPOS_ESTADISTICAS = ('cliente', 'cliente_id', 'estado', 'total', 'fecha_compra')
+
     def save(self, *args, **kwargs):
-        """Override save para generar número de orden automáticamente"""
+        """
+        Override save para generar número de orden automáticamente
+        y mantener incrementalmente las estadísticas del cliente.
+        """
         if not self.numero_orden:
-            from datetime import datetime
-            timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-            self.numero_orden = f"ORD-{timestamp}"
+            from .numeracion import generar_numero_orden
+            self.numero_orden = generar_numero_orden()
         
-        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        afecta_estadisticas = update_fields is None or any(
+            campo in self.CAMPOS_ESTADISTICAS for campo in update_fields
+        )
         
-        # Actualizar estadísticas del cliente después de guardar
-        if self.estado == 'COMPLETADA':
-            self.cliente.actualizar_estadisticas_compras()
+        with transaction.atomic():
+            anterior = None
+            if afecta_estadisticas and self.pk and not self._state.adding:
+                # Valores persistidos antes de esta escritura (fila bloqueada donde se soporte)
+                anterior = Compra.objects.select_for_update().filter(pk=self.pk).values(
+                    'cliente_id', 'estado', 'total', 'fecha_compra'
+                ).first()
+            
+            super().save(*args, **kwargs)
+            
+            # Actualizar estadísticas del cliente y resumen diario con deltas atómicos
+            if afecta_estadisticas:
+                self._registrar_cambio(anterior, self._valores_estadisticas())
+    
+    def _valores_estadisticas(self):
+        return {
+            'cliente_id': self.cliente_id,
+            'estado': self.estado,
+            'total': Decimal(self.total),
+            'fecha_compra': self.fecha_compra,
+        }
+    
+    def _registrar_cambio(self, anterior, actual):
+        """Propaga la transición anterior -> actual a los datos derivados de la compra"""
+        self._actualizar_estadisticas_cliente(anterior, actual)
+        ResumenDiarioCliente.registrar_cambio(anterior, actual)
+    
+    def _actualizar_estadisticas_cliente(self, anterior, actual):
+        """
+        Traduce la transición anterior -> actual de la compra en deltas sobre
+        total_compras y ultima_compra. Cubre inserciones, cambios de estado
+        dentro y fuera del conjunto válido, cambios de monto, de fecha,
+        de cliente y eliminaciones (actual=None).
+        """
+        def valida(valores):
+            return valores if valores and valores['estado'] in self.ESTADOS_VALIDOS else None
+        
+        anterior, actual = valida(anterior), valida(actual)
+        
+        if anterior and actual and anterior['cliente_id'] == actual['cliente_id']:
+            if anterior['total'] == actual['total'] and anterior['fecha_compra'] == actual['fecha_compra']:
+                return
+            Cliente.aplicar_delta_compras(
+                actual['cliente_id'],
+                delta_total=actual['total'] - anterior['total'],
+                fecha_agregada=actual['fecha_compra'],
+                fecha_retirada=(
+                    anterior['fecha_compra']
+                    if actual['fecha_compra'] < anterior['fecha_compra'] else None
+                ),
+            )
+        else:
+            if anterior:
+                Cliente.aplicar_delta_compras(
+                    anterior['cliente_id'],
+                    delta_total=-anterior['total'],
+                    fecha_retirada=anterior['fecha_compra'],
+                )
+            if actual:
+                Cliente.aplicar_delta_compras(
+                    actual['cliente_id'],
+                    delta_total=actual['total'],
+                    fecha_agregada=actual['fecha_compra'],
+                )
+        
+        # Las estadísticas en memoria quedan obsoletas: se difieren para recargarlas al acceder
+        if anterior or actual:
+            cliente = self._state.fields_cache.get('cliente')
+            if cliente is not None:
+                for campo in Cliente.CAMPOS_ESTADISTICAS:
+                    cliente.__dict__.pop(campo, None)
     
     @property
     def dias_desde_compra(self):
@@ -416,3 +673,299 @@ class Compra(models.Model):
         if self.subtotal > 0:
             return (self.descuento / self.subtotal) * 100
         return 0
+
+
+class ResumenDiarioCliente(models.Model):
+    """
+    Resumen de compras por cliente y día (fecha local de la compra).
+    Se mantiene incrementalmente desde las escrituras de Compra y permite
+    responder consultas por ventanas de días o meses sin recorrer las compras.
+    Se puede reconstruir con: python manage.py reconstruir_resumen_diario
+    """
+    cliente = models.ForeignKey(
+        Cliente,
+        on_delete=models.CASCADE,
+        related_name='resumen_diario',
+        help_text="Cliente al que pertenece el resumen"
+    )
+    fecha = models.DateField(help_text="Día de las compras (zona horaria local)")
+    
+    total_valido = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        help_text="Total de compras en estados válidos"
+    )
+    cantidad_valida = models.IntegerField(
+        default=0,
+        help_text="Cantidad de compras en estados válidos"
+    )
+    total_cancelado = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        help_text="Total de compras canceladas"
+    )
+    total_devuelto = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        help_text="Total de compras devueltas"
+    )
+    
+    class Meta:
+        verbose_name = "Resumen Diario de Cliente"
+        verbose_name_plural = "Resúmenes Diarios de Clientes"
+        ordering = ['-fecha']
+        constraints = [
+            models.UniqueConstraint(fields=['cliente', 'fecha'], name='resumen_diario_cliente_fecha_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['fecha']),
+        ]
+        
+    def __str__(self):
+        return f"{self.cliente_id} - {self.fecha}: ${self.total_valido}"
+    
+    CAMPOS_TOTALES = ('total_valido', 'cantidad_valida', 'total_cancelado', 'total_devuelto')
+    
+    @staticmethod
+    def _aporte(valores):
+        """Clave (cliente, día) y aporte de una compra a cada total del resumen"""
+        if not valores:
+            return None, None
+        
+        fecha = valores['fecha_compra']
+        dia = timezone.localdate(fecha) if timezone.is_aware(fecha) else fecha.date()
+        total = Decimal(valores['total'])
+        estado = valores['estado']
+        
+        return (valores['cliente_id'], dia), {
+            'total_valido': total if estado in Compra.ESTADOS_VALIDOS else Decimal('0'),
+            'cantidad_valida': 1 if estado in Compra.ESTADOS_VALIDOS else 0,
+            'total_cancelado': total if estado == 'CANCELADA' else Decimal('0'),
+            'total_devuelto': total if estado == 'DEVUELTA' else Decimal('0'),
+        }
+    
+    @classmethod
+    def registrar_cambio(cls, anterior, actual):
+        """Aplica al resumen la transición anterior -> actual de una compra"""
+        deltas = {}
+        for valores, signo in ((anterior, -1), (actual, 1)):
+            clave, aporte = cls._aporte(valores)
+            if clave is None:
+                continue
+            acumulado = deltas.setdefault(clave, dict.fromkeys(cls.CAMPOS_TOTALES, 0))
+            for campo, valor in aporte.items():
+                acumulado[campo] += signo * valor
+        
+        for (cliente_id, dia), delta in deltas.items():
+            if any(delta.values()):
+                cls.aplicar_delta(cliente_id, dia, **delta)
+    
+    @classmethod
+    def aplicar_delta(cls, cliente_id, fecha, **delta):
+        """Suma `delta` a la fila (cliente, fecha), creándola si no existe"""
+        fila = cls.objects.filter(cliente_id=cliente_id, fecha=fecha)
+        cambios = {campo: F(campo) + valor for campo, valor in delta.items()}
+        
+        if fila.update(**cambios):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(cliente_id=cliente_id, fecha=fecha, **delta)
+        except IntegrityError:
+            # Otra escritura creó la fila al mismo tiempo
+            fila.update(**cambios)
+    
+    @classmethod
+    def reconstruir(cls, cliente_ids=None, tamano_lote=2000, tamano_bloque=500):
+        """
+        Reconstruye el resumen desde las compras (todos los clientes o los indicados).
+        Los clientes indicados se procesan por bloques de `tamano_bloque` ids para
+        no superar el límite de variables por consulta de la base de datos.
+        Retorna la cantidad de filas generadas.
+        """
+        with transaction.atomic():
+            if cliente_ids is None:
+                return cls._reconstruir_bloque(Compra.objects.all(), cls.objects.all(), tamano_lote)
+            
+            cliente_ids = list(cliente_ids)
+            generadas = 0
+            for inicio in range(0, len(cliente_ids), tamano_bloque):
+                bloque = cliente_ids[inicio:inicio + tamano_bloque]
+                generadas += cls._reconstruir_bloque(
+                    Compra.objects.filter(cliente_id__in=bloque),
+                    cls.objects.filter(cliente_id__in=bloque),
+                    tamano_lote,
+                )
+            return generadas
+    
+    @classmethod
+    def _reconstruir_bloque(cls, compras, resumenes, tamano_lote):
+        """Reemplaza `resumenes` por la agregación por cliente y día de `compras`"""
+        from django.db.models.functions import TruncDate
+        
+        agrupado = compras.annotate(dia=TruncDate('fecha_compra')).values('cliente_id', 'dia').annotate(
+            suma_valida=Sum('total', filter=Q(estado__in=Compra.ESTADOS_VALIDOS)),
+            conteo_valido=Count('id', filter=Q(estado__in=Compra.ESTADOS_VALIDOS)),
+            suma_cancelada=Sum('total', filter=Q(estado='CANCELADA')),
+            suma_devuelta=Sum('total', filter=Q(estado='DEVUELTA')),
+        ).order_by()
+        
+        def monto(valor):
+            return (valor or Decimal('0')).quantize(Decimal('0.01'))
+        
+        resumenes.delete()
+        generadas = 0
+        lote = []
+        for fila in agrupado.iterator(chunk_size=tamano_lote):
+            lote.append(cls(
+                cliente_id=fila['cliente_id'],
+                fecha=fila['dia'],
+                total_valido=monto(fila['suma_valida']),
+                cantidad_valida=fila['conteo_valido'],
+                total_cancelado=monto(fila['suma_cancelada']),
+                total_devuelto=monto(fila['suma_devuelta']),
+            ))
+            if len(lote) >= tamano_lote:
+                cls.objects.bulk_create(lote)
+                generadas += len(lote)
+                lote = []
+        cls.objects.bulk_create(lote)
+        generadas += len(lote)
+        
+        return generadas
+    
+    @classmethod
+    def totales(cls, desde=None, hasta=None, cliente_id=None):
+        """
+        Totales agregados del resumen entre dos fechas (inclusive).
+        Responde preguntas de "últimos N días" o "mes X" sin leer las compras.
+        """
+        filas = cls.objects.all()
+        if cliente_id is not None:
+            filas = filas.filter(cliente_id=cliente_id)
+        if desde is not None:
+            filas = filas.filter(fecha__gte=desde)
+        if hasta is not None:
+            filas = filas.filter(fecha__lte=hasta)
+        
+        agregado = filas.aggregate(
+            suma_valida=Sum('total_valido'),
+            conteo_valido=Sum('cantidad_valida'),
+            suma_cancelada=Sum('total_cancelado'),
+            suma_devuelta=Sum('total_devuelto'),
+            ultimo_dia=Max('fecha', filter=Q(cantidad_valida__gt=0)),
+        )
+        
+        def monto(valor):
+            return (valor or Decimal('0')).quantize(Decimal('0.01'))
+        
+        return {
+            'total_valido': monto(agregado['suma_valida']),
+            'cantidad_valida': agregado['conteo_valido'] or 0,
+            'total_cancelado': monto(agregado['suma_cancelada']),
+            'total_devuelto': monto(agregado['suma_devuelta']),
+            'ultimo_dia': agregado['ultimo_dia'],
+        }
+    
+    @classmethod
+    def totales_ultimos_dias(cls, dias, cliente_id=None):
+        """Totales de los últimos `dias` días (desde la medianoche local de hoy - dias)"""
+        return cls.totales(desde=timezone.localdate() - timedelta(days=dias), cliente_id=cliente_id)
+    
+    @classmethod
+    def totales_mes(cls, anio, mes, cliente_id=None):
+        """Totales de un mes calendario"""
+        desde = date(anio, mes, 1)
+        hasta = date(anio, mes, calendar.monthrange(anio, mes)[1])
+        return cls.totales(desde=desde, hasta=hasta, cliente_id=cliente_id)
+
+
+class TrabajoExportacion(models.Model):
+    """
+    Exportación ejecutada en segundo plano por el pool local de trabajos
+    (ver clientes.trabajos_exportacion). El archivo terminado queda en disco
+    y se reutiliza mientras los parámetros y los datos no cambien.
+    """
+    TIPO_CHOICES = [
+        ('csv', 'Clientes CSV'),
+        ('excel', 'Clientes Excel'),
+        ('txt', 'Clientes TXT'),
+        ('fidelizacion', 'Reporte de fidelización'),
+        ('parquet', 'Parquet'),
+        ('arrow', 'Arrow IPC stream'),
+    ]
+    
+    ESTADO_CHOICES = [
+        ('PENDIENTE', 'Pendiente'),
+        ('EN_PROCESO', 'En proceso'),
+        ('COMPLETADO', 'Completado'),
+        ('ERROR', 'Error'),
+        ('VENCIDO', 'Vencido'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
+    parametros = models.JSONField(default=dict, blank=True, help_text="Parámetros normalizados de la exportación")
+    clave = models.CharField(max_length=64, help_text="Hash del tipo y los parámetros")
+    huella = models.CharField(max_length=64, help_text="Hash de la clave y la versión de los datos")
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='PENDIENTE')
+    progreso = models.PositiveSmallIntegerField(default=0, help_text="Porcentaje de avance (0-100)")
+    archivo = models.CharField(max_length=255, blank=True, help_text="Nombre del archivo en EXPORTACIONES_DIR")
+    nombre_descarga = models.CharField(max_length=255, blank=True)
+    tamano = models.BigIntegerField(null=True, blank=True, help_text="Tamaño del archivo en bytes")
+    mensaje_error = models.TextField(blank=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+    fecha_fin = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name = "Trabajo de Exportación"
+        verbose_name_plural = "Trabajos de Exportación"
+        ordering = ['-fecha_creacion']
+        indexes = [
+            models.Index(fields=['huella', 'estado'], name='trabajo_export_huella_idx'),
+            models.Index(fields=['clave', 'estado'], name='trabajo_export_clave_idx'),
+        ]
+        constraints = [
+            # Un solo trabajo en curso por huella (solicitudes simultáneas)
+            models.UniqueConstraint(
+                fields=['huella'],
+                condition=Q(estado__in=['PENDIENTE', 'EN_PROCESO']),
+                name='trabajo_export_huella_activo_unico',
+            ),
+        ]
+        
+    def __str__(self):
+        return f"{self.tipo} {self.id} ({self.estado} {self.progreso}%)"
+
+
+@receiver(post_delete, sender=Compra)
+def retirar_compra_de_estadisticas(sender, instance, **kwargs):
+    """Descuenta la compra eliminada de las estadísticas del cliente (también en borrados masivos)"""
+    instance._registrar_cambio(instance._valores_estadisticas(), None)
+
+
+@receiver(post_save, sender=Cliente)
+@receiver(post_delete, sender=Cliente)
+def invalidar_cache_cliente(sender, instance, **kwargs):
+    """Descarta los perfiles en caché del cliente modificado o eliminado"""
+    cache_perfiles.invalidar(cliente_id=instance.pk, numero_documento=instance.numero_documento)
+
+
+@receiver(post_save, sender=TipoDocumento)
+@receiver(post_delete, sender=TipoDocumento)
+def limpiar_cache_perfiles(sender, **kwargs):
+    """Los perfiles incluyen el tipo de documento; sus cambios son raros y afectan a todos"""
+    cache_perfiles.invalidar_todo()
+
+
+@receiver(post_delete, sender=Cliente)
+@receiver(post_delete, sender=Compra)
+@receiver(post_save, sender=TipoDocumento)
+@receiver(post_delete, sender=TipoDocumento)
+def contar_cambio_version_datos(sender, **kwargs):
+    """Borrados y cambios del catálogo no mueven fecha_actualizacion: se cuentan aparte"""
+    ContadorCambios.incrementar(ContadorCambios.VERSION_DATOS)
@@ -0,0 +1,102 @@
+"""
+Asignación de números de orden para Compra
+Genera números únicos, legibles y ordenados en el tiempo reservando bloques
+de una secuencia en base de datos, sin consultarla en cada orden
+"""
+import os
+import threading
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import SecuenciaOrden
+
+
+PREFIJO_ORDEN = 'ORD-'
+DIGITOS_CONSECUTIVO = 9  # ORD-YYMMDD-NNNNNNNNN = 20 caracteres (max_length de numero_orden)
+
+
+class AsignadorNumeroOrden:
+    """
+    Asignador de números de orden con reserva por bloques.
+
+    Formato: ORD-<YYMMDD>-<consecutivo del día>, p. ej. ORD-251108-000001234.
+    Cada proceso reserva `tamano_bloque` consecutivos con un único incremento
+    atómico sobre SecuenciaOrden y los entrega desde memoria. Los números son
+    únicos entre procesos y aproximadamente ordenados por fecha de creación.
+    """
+    
+    def __init__(self, tamano_bloque=None):
+        self.tamano_bloque = tamano_bloque or getattr(settings, 'NUMERO_ORDEN_TAMANO_BLOQUE', 1000)
+        self._lock = threading.Lock()
+        self._pid = None
+        self._prefijo = None
+        self._siguiente = 0
+        self._limite = -1
+    
+    def siguiente(self):
+        """Retorna un número de orden nuevo"""
+        return self.reservar(1)[0]
+    
+    def reservar(self, cantidad):
+        """Retorna `cantidad` números de orden nuevos (útil para cargas masivas)"""
+        prefijo = f"{PREFIJO_ORDEN}{timezone.localdate().strftime('%y%m%d')}"
+        numeros = []
+        
+        with self._lock:
+            # Un proceso hijo (fork) no debe reutilizar el bloque del padre
+            if self._pid != os.getpid() or self._prefijo != prefijo:
+                self._pid = os.getpid()
+                self._prefijo = prefijo
+                self._siguiente, self._limite = 0, -1
+            
+            while len(numeros) < cantidad:
+                if self._siguiente > self._limite:
+                    faltantes = cantidad - len(numeros)
+                    if connection.in_atomic_block:
+                        # Dentro de una transacción la reserva puede revertirse:
+                        # se reserva solo lo necesario y no se conserva en memoria
+                        inicio, fin = self._reservar_bloque(prefijo, faltantes)
+                        numeros.extend(self._formatear(prefijo, n) for n in range(inicio, fin + 1))
+                        break
+                    self._siguiente, self._limite = self._reservar_bloque(
+                        prefijo, max(self.tamano_bloque, faltantes)
+                    )
+                
+                hasta = min(self._limite, self._siguiente + cantidad - len(numeros) - 1)
+                numeros.extend(self._formatear(prefijo, n) for n in range(self._siguiente, hasta + 1))
+                self._siguiente = hasta + 1
+        
+        return numeros
+    
+    @staticmethod
+    def _reservar_bloque(prefijo, tamano):
+        """Incrementa atómicamente la secuencia del día y retorna el rango reservado"""
+        secuencia = SecuenciaOrden.objects.filter(prefijo=prefijo)
+        
+        # El UPDATE va primero para tomar el bloqueo de escritura antes de leer
+        with transaction.atomic():
+            if not secuencia.update(ultimo_valor=F('ultimo_valor') + tamano):
+                try:
+                    with transaction.atomic():
+                        SecuenciaOrden.objects.create(prefijo=prefijo, ultimo_valor=tamano)
+                except IntegrityError:
+                    # Otro proceso creó la secuencia del día al mismo tiempo
+                    secuencia.update(ultimo_valor=F('ultimo_valor') + tamano)
+            fin = secuencia.values_list(
+                'ultimo_valor', flat=True
+            ).get()
+        return fin - tamano + 1, fin
+    
+    @staticmethod
+    def _formatear(prefijo, numero):
+        return f"{prefijo}-{numero:0{DIGITOS_CONSECUTIVO}d}"
+
+
+# Instancia compartida por el proceso
+asignador_numero_orden = AsignadorNumeroOrden()
+
+
+def generar_numero_orden():
+    """Genera un número de orden único usando el asignador del proceso"""
+    return asignador_numero_orden.siguiente()
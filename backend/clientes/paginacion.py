@@ -0,0 +1,190 @@
+"""
+Paginación por cursor (keyset) para listados grandes
+En lugar de OFFSET, cada página continúa desde la clave de ordenamiento de la
+última fila entregada, usando el mismo índice que resuelve el ORDER BY
+"""
+import base64
+import json
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+VALORES_VERDADEROS = {'1', 'true', 'si', 'sí'}
+
+
+def filtro_despues_de(orden, clave):
+    """
+    Condición "fila posterior a `clave`" en el orden dado:
+    (a < x) OR (a = x AND b < y) ... precedida de a <= x, que acota el
+    recorrido del índice al rango que interesa.
+    """
+    condicion = Q()
+    iguales = Q()
+    for campo, valor in zip(orden, clave):
+        nombre = campo.lstrip('-')
+        operador = 'lt' if campo.startswith('-') else 'gt'
+        condicion |= iguales & Q(**{f'{nombre}__{operador}': valor})
+        iguales &= Q(**{nombre: valor})
+
+    primero = orden[0]
+    acotado = Q(**{f"{primero.lstrip('-')}__{'lte' if primero.startswith('-') else 'gte'}": clave[0]})
+    return acotado & condicion
+
+
+class PaginacionKeyset(BasePagination):
+    """
+    Paginación por cursor sobre un ordenamiento único, p. ej. ('-fecha_compra', '-id').
+
+    - ?cursor=<token>: página siguiente o anterior (tokens de `next` / `previous`)
+    - ?page_size=N: tamaño de página (máximo `max_page_size`)
+    - ?incluir_total=1: agrega `count` (un COUNT(*) adicional, solo si se pide)
+    - ?page=N: paginación por número heredada, con OFFSET y COUNT
+
+    Las filas insertadas mientras se recorre el listado no desplazan las páginas
+    siguientes: no hay repetidos ni saltos. El último campo del ordenamiento
+    debe ser único (id) para que la clave identifique una sola fila.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    total_query_param = 'incluir_total'
+    max_page_size = 100
+
+    def __init__(self, ordering=None, page_size=None):
+        self.ordering = ordering
+        self.page_size = page_size or api_settings.PAGE_SIZE or 20
+        self.paginacion_por_numero = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = tuple(self.ordering or getattr(view, 'ordering', None) or ('-id',))
+
+        # Compatibilidad con clientes que todavía envían ?page=
+        if 'page' in request.query_params and self.cursor_query_param not in request.query_params:
+            self.paginacion_por_numero = PageNumberPagination()
+            self.paginacion_por_numero.page_size = self.obtener_tamano_pagina(request)
+            return self.paginacion_por_numero.paginate_queryset(
+                queryset.order_by(*self.ordering), request, view
+            )
+
+        consulta = self.consulta_pagina(queryset, request)
+        # El total (si se pide) es del listado completo, no de lo que sigue al cursor
+        self.total = queryset.count() if self.pide_total(request) else None
+        return self.armar_pagina(list(consulta))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset con el ORM asíncrono (vistas servidas por ASGI)"""
+        self.request = request
+        self.ordering = tuple(self.ordering or getattr(view, 'ordering', None) or ('-id',))
+
+        if 'page' in request.query_params and self.cursor_query_param not in request.query_params:
+            return await sync_to_async(self.paginate_queryset)(queryset, request, view)
+
+        consulta = self.consulta_pagina(queryset, request)
+        self.total = await queryset.acount() if self.pide_total(request) else None
+        return self.armar_pagina([fila async for fila in consulta])
+
+    def consulta_pagina(self, queryset, request):
+        """Consulta (sin evaluar) de la página pedida: tamaño + 1 filas desde el cursor"""
+        self.tamano = self.obtener_tamano_pagina(request)
+        self.clave, self.hacia_atras = self.decodificar_cursor(request)
+
+        orden = self.ordering
+        if self.hacia_atras:
+            orden = tuple(campo[1:] if campo.startswith('-') else f'-{campo}' for campo in orden)
+
+        queryset = queryset.order_by(*orden)
+        if self.clave is not None:
+            try:
+                queryset = queryset.filter(filtro_despues_de(orden, self.clave))
+            except (ValidationError, ValueError, TypeError):
+                raise NotFound('Cursor inválido')
+        return queryset[:self.tamano + 1]
+
+    def armar_pagina(self, filas):
+        """Recorta las filas leídas de consulta_pagina y calcula los cursores vecinos"""
+        hay_mas = len(filas) > self.tamano
+        filas = filas[:self.tamano]
+        if self.hacia_atras:
+            filas.reverse()
+
+        self.cursor_siguiente = self.cursor_anterior = None
+        if filas:
+            primera, ultima = self.clave_de(filas[0]), self.clave_de(filas[-1])
+            if self.hacia_atras:
+                self.cursor_siguiente = self.codificar_cursor(ultima, hacia_atras=False)
+                self.cursor_anterior = self.codificar_cursor(primera, hacia_atras=True) if hay_mas else None
+            else:
+                self.cursor_siguiente = self.codificar_cursor(ultima, hacia_atras=False) if hay_mas else None
+                self.cursor_anterior = (
+                    self.codificar_cursor(primera, hacia_atras=True) if self.clave is not None else None
+                )
+        return filas
+
+    def get_paginated_response(self, data):
+        return Response(self.datos_paginados(data))
+
+    def datos_paginados(self, data):
+        if self.paginacion_por_numero is not None:
+            return self.paginacion_por_numero.get_paginated_response(data).data
+
+        datos = {
+            'next': self.url_cursor(self.cursor_siguiente),
+            'previous': self.url_cursor(self.cursor_anterior),
+            'results': data,
+        }
+        if self.total is not None:
+            datos = {'count': self.total, **datos}
+        return datos
+
+    # === CURSOR ===
+
+    def clave_de(self, fila):
+        valores = []
+        for campo in self.ordering:
+            nombre = campo.lstrip('-')
+            # Instancias del modelo o filas de values()
+            valor = fila[nombre] if isinstance(fila, dict) else getattr(fila, nombre)
+            valores.append(valor.isoformat() if hasattr(valor, 'isoformat') else valor)
+        return valores
+
+    def codificar_cursor(self, clave, hacia_atras):
+        contenido = json.dumps({'c': clave, 'a': hacia_atras}, separators=(',', ':'), default=str)
+        return base64.urlsafe_b64encode(contenido.encode()).decode().rstrip('=')
+
+    def decodificar_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None, False
+        try:
+            contenido = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+            clave = contenido['c']
+            if not isinstance(clave, list) or len(clave) != len(self.ordering):
+                raise ValueError
+            return clave, bool(contenido.get('a'))
+        except (ValueError, TypeError, KeyError):
+            raise NotFound('Cursor inválido')
+
+    def url_cursor(self, cursor):
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(remove_query_param(url, 'page'), self.cursor_query_param, cursor)
+
+    # === TAMAÑO Y TOTAL ===
+
+    def obtener_tamano_pagina(self, request):
+        try:
+            tamano = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            tamano = self.page_size
+        return max(1, min(tamano, self.max_page_size))
+
+    def pide_total(self, request):
+        return request.query_params.get(self.total_query_param, '').lower() in VALORES_VERDADEROS
+
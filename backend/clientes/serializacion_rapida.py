@@ -0,0 +1,243 @@
+"""
+Serialización de solo lectura precompilada
+Para las consultas y listados de más tráfico las filas salen de values() y se
+convierten a dicts con una función por campo preparada una sola vez a partir
+del serializer de DRF (mismos nombres, orden y formato), sin instanciar
+modelos ni recorrer los campos de DRF por objeto. El nombre completo y la
+edad se calculan en la consulta
+"""
+import json
+from datetime import date
+from decimal import Decimal
+from django.db.models import Case, CharField, IntegerField, Q, Value, When
+from django.db.models.functions import Concat, ExtractYear
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.settings import api_settings
+from .serializers import (
+    CamposDinamicosMixin,
+    ClientePerfilSerializer,
+    ClienteSerializer,
+    CompraSimpleSerializer,
+    campos_solicitados,
+)
+
+
+# Mismo resultado que JSONRenderer con la configuración de DRF (compacto, UTF-8),
+# sin el encoder de respaldo: los valores ya son tipos nativos de JSON
+_codificador = json.JSONEncoder(
+    ensure_ascii=not api_settings.UNICODE_JSON,
+    allow_nan=not api_settings.STRICT_JSON,
+    separators=(',', ':') if api_settings.COMPACT_JSON else None,
+    check_circular=False,
+)
+
+
+def codificar_json(datos):
+    return _codificador.encode(datos).encode('utf-8')
+
+
+class RespuestaJSON(HttpResponse):
+    """Respuesta con el mismo cuerpo y content type que Response + JSONRenderer"""
+
+    def __init__(self, datos, status=200, **kwargs):
+        super().__init__(codificar_json(datos), status=status, content_type='application/json', **kwargs)
+
+
+# === CONVERTIDORES POR TIPO DE CAMPO ===
+
+def _iso_z(texto):
+    return texto[:-6] + 'Z' if texto.endswith('+00:00') else texto
+
+
+def _fecha_hora(valor):
+    # Igual que DateTimeField: en la zona horaria actual, ISO 8601 con Z para UTC
+    return _iso_z(valor.astimezone(timezone.get_current_timezone()).isoformat())
+
+
+def _fecha(valor):
+    return valor.isoformat()
+
+
+def _decimal(decimales):
+    exponente = Decimal(1).scaleb(-decimales)
+    return lambda valor: f'{valor.quantize(exponente):f}'
+
+
+def convertidor(campo):
+    """Función valor -> representación equivalente a campo.to_representation (None si es identidad)"""
+    if isinstance(campo, serializers.DateTimeField):
+        return _fecha_hora
+    if isinstance(campo, serializers.DateField):
+        return _fecha
+    if isinstance(campo, serializers.DecimalField):
+        if getattr(campo, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING) and not campo.localize:
+            return _decimal(campo.decimal_places)
+        return campo.to_representation
+    if isinstance(campo, (serializers.CharField, serializers.ChoiceField, serializers.IntegerField,
+                          serializers.BooleanField, serializers.ReadOnlyField)):
+        return None
+    return campo.to_representation
+
+
+# === CAMPOS CALCULADOS ===
+
+def _opcional_con_espacio(campo):
+    return Case(
+        When(Q(**{f'{campo}__isnull': True}) | Q(**{campo: ''}), then=Value('')),
+        default=Concat(Value(' '), campo),
+        output_field=CharField(),
+    )
+
+
+def nombre_completo_sql():
+    """Cliente.nombre_completo: nombres y apellidos, omitiendo los segundos vacíos"""
+    return Concat(
+        'primer_nombre', _opcional_con_espacio('segundo_nombre'),
+        Value(' '), 'primer_apellido', _opcional_con_espacio('segundo_apellido'),
+        output_field=CharField(),
+    )
+
+
+def edad_sql():
+    """Cliente.edad: años cumplidos a la fecha de hoy"""
+    hoy = date.today()
+    sin_cumplir = Q(fecha_nacimiento__month__gt=hoy.month) | Q(fecha_nacimiento__month=hoy.month, fecha_nacimiento__day__gt=hoy.day)
+    return Value(hoy.year) - ExtractYear('fecha_nacimiento') - Case(
+        When(sin_cumplir, then=Value(1)), default=Value(0), output_field=IntegerField()
+    )
+
+
+def dias_desde(fecha_compra):
+    """Compra.dias_desde_compra a partir de fecha_compra"""
+    return (timezone.now().date() - fecha_compra.date()).days
+
+
+class FormatoLectura:
+    """
+    Forma de salida de un serializer de solo lectura, preparada una vez.
+
+    - calculados: campo -> función que retorna la expresión SQL (se evalúa en
+      cada consulta, así las que dependen de la fecha usan la de hoy)
+    - derivados: campo -> (columna, función) para valores que salen de otra columna
+    Los serializers anidados se leen por sus columnas relacionadas (a__b).
+    """
+
+    def __init__(self, serializer_class, calculados=None, derivados=None, prefijo=''):
+        self.serializer_class = serializer_class
+        self.calculados = calculados or {}
+        self._convertidores = {}  # frozenset de la selección (None = todos) -> convertidor de filas
+        self.campos = []  # (nombre, columna o FormatoLectura anidado, convertidor)
+        for nombre, campo in serializer_class().fields.items():
+            if isinstance(campo, serializers.BaseSerializer):
+                anidado = FormatoLectura(type(campo), prefijo=f'{prefijo}{campo.source}__')
+                self.campos.append((nombre, anidado, None))
+            elif nombre in self.calculados:
+                self.campos.append((nombre, nombre, None))
+            elif derivados and nombre in derivados:
+                columna, funcion = derivados[nombre]
+                self.campos.append((nombre, prefijo + columna, funcion))
+            else:
+                self.campos.append((nombre, prefijo + campo.source, convertidor(campo)))
+
+    def seleccion(self, request=None):
+        """
+        Campos de la respuesta con ?fields= / ?expand= como CamposDinamicosMixin.
+        Lanza ValidationError con los campos desconocidos.
+        """
+        if request is None or not issubclass(self.serializer_class, CamposDinamicosMixin):
+            return None
+        campos = campos_solicitados(request)
+        if campos is None:
+            return None
+        expandidos = campos_solicitados(request, 'expand') or set()
+        desconocidos = (campos | expandidos) - {nombre for nombre, _, _ in self.campos}
+        if desconocidos:
+            raise serializers.ValidationError({
+                'fields': f'Campos no válidos: {", ".join(sorted(desconocidos))}'
+            })
+        return campos | expandidos
+
+    def _campos(self, seleccion):
+        return [campo for campo in self.campos if seleccion is None or campo[0] in seleccion]
+
+    def columnas(self, seleccion=None):
+        columnas = []
+        for _, fuente, _ in self._campos(seleccion):
+            columnas += fuente.columnas() if isinstance(fuente, FormatoLectura) else [fuente]
+        return list(dict.fromkeys(columnas))
+
+    def consulta(self, queryset, seleccion=None, adicionales=()):
+        """values() con las columnas de la selección, los calculados y `adicionales` (p. ej. el orden)"""
+        campos = self._campos(seleccion)
+        anotaciones = {
+            nombre: self.calculados[nombre]() for nombre, _, _ in campos if nombre in self.calculados
+        }
+        columnas = self.columnas(seleccion)
+        return queryset.annotate(**anotaciones).values(
+            *columnas, *(columna for columna in adicionales if columna not in columnas)
+        )
+
+    def convertidor_filas(self, seleccion=None):
+        """
+        Función fila de values() -> dict de salida, en el orden del serializer.
+        Se arma una vez por selección de campos y queda guardada en el formato.
+        """
+        clave = None if seleccion is None else frozenset(seleccion)
+        convertir = self._convertidores.get(clave)
+        if convertir is None:
+            convertir = self._convertidores[clave] = self._armar_convertidor(seleccion)
+        return convertir
+
+    def _armar_convertidor(self, seleccion):
+        # (nombre, columna, función); un anidado lee la fila completa (columna None)
+        pasos = [
+            (nombre, None, fuente.convertidor_filas()) if isinstance(fuente, FormatoLectura)
+            else (nombre, fuente, funcion)
+            for nombre, fuente, funcion in self._campos(seleccion)
+        ]
+
+        def convertir(fila):
+            salida = {}
+            for nombre, columna, funcion in pasos:
+                if columna is None:
+                    salida[nombre] = funcion(fila)
+                    continue
+                valor = fila[columna]
+                salida[nombre] = valor if funcion is None or valor is None else funcion(valor)
+            return salida
+
+        return convertir
+
+    def convertir(self, filas, seleccion=None):
+        convertir = self.convertidor_filas(seleccion)
+        return [convertir(fila) for fila in filas]
+
+    def primero(self, queryset, seleccion=None, adicionales=()):
+        """(fila de values(), dict de salida) del primer resultado, o (None, None)"""
+        fila = next(iter(self.consulta(queryset, seleccion, adicionales)[:1]), None)
+        if fila is None:
+            return None, None
+        return fila, self.convertidor_filas(seleccion)(fila)
+
+    async def aprimero(self, queryset, seleccion=None, adicionales=()):
+        """primero() con el ORM asíncrono"""
+        filas = [fila async for fila in self.consulta(queryset, seleccion, adicionales)[:1]]
+        fila = filas[0] if filas else None
+        if fila is None:
+            return None, None
+        return fila, self.convertidor_filas(seleccion)(fila)
+
+
+FORMATO_PERFIL = FormatoLectura(ClientePerfilSerializer)
+
+FORMATO_CLIENTE = FormatoLectura(
+    ClienteSerializer,
+    calculados={'nombre_completo': nombre_completo_sql, 'edad': edad_sql},
+)
+
+FORMATO_COMPRA_SIMPLE = FormatoLectura(
+    CompraSimpleSerializer,
+    derivados={'dias_desde_compra': ('fecha_compra', dias_desde)},
+)
@@ -1,5 +1,48 @@
+from django.urls import reverse
 from rest_framework import serializers
-from .models import TipoDocumento, Cliente, Compra
+from .models import TipoDocumento, Cliente, Compra, TrabajoExportacion
+
+
+def campos_solicitados(request, parametro='fields'):
+    """Conjunto de campos pedidos en ?fields=a,b (o ?expand=...), None si no se especifica"""
+    valor = request.query_params.get(parametro) if request is not None else None
+    if not valor:
+        return None
+    return {campo.strip() for campo in valor.split(',') if campo.strip()}
+
+
+class CamposDinamicosMixin:
+    """
+    Campos dispersos para serializers de nivel superior:
+    - ?fields=id,numero_orden,total  serializa solo esos campos
+    - ?fields=id,total&expand=cliente agrega el objeto anidado a esos campos
+    Sin ?fields= se serializan todos los campos. Los serializers anidados no
+    se filtran: al construirse todavía no tienen el contexto de la petición.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        campos = campos_solicitados(request)
+        if campos is None:
+            return
+
+        expandidos = campos_solicitados(request, 'expand') or set()
+        desconocidos = (campos | expandidos) - set(self.fields)
+        if desconocidos:
+            raise serializers.ValidationError({
+                'fields': f'Campos no válidos: {", ".join(sorted(desconocidos))}'
+            })
+
+        for nombre in list(self.fields):
+            if nombre not in campos and nombre not in expandidos:
+                self.fields.pop(nombre)
+
+    @classmethod
+    def incluye_campo(cls, request, nombre):
+        """Indica si la respuesta incluirá `nombre` (para decidir select_related)"""
+        campos = campos_solicitados(request)
+        return campos is None or nombre in campos or nombre in (campos_solicitados(request, 'expand') or ())
 
 
 class TipoDocumentoSerializer(serializers.ModelSerializer):
@@ -29,7 +72,7 @@ class ClientePerfilSerializer(serializers.ModelSerializer):
         fields = ['numero_documento', 'nombre', 'apellido', 'correo', 'telefono']
 
 
-class ClienteSerializer(serializers.ModelSerializer):
+class ClienteSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     tipo_documento = TipoDocumentoSerializer(read_only=True)
     nombre_completo = serializers.ReadOnlyField()
     edad = serializers.ReadOnlyField()
@@ -46,7 +89,7 @@ class ClienteSerializer(serializers.ModelSerializer):
         ]
 
 
-class CompraSerializer(serializers.ModelSerializer):
+class CompraSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     cliente = ClienteSerializer(read_only=True)
     dias_desde_compra = serializers.ReadOnlyField()
     margen_descuento = serializers.ReadOnlyField()
@@ -74,4 +117,26 @@ class CompraSimpleSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'numero_orden', 'fecha_compra', 'descripcion_productos',
             'total', 'estado', 'metodo_pago', 'canal_venta', 'dias_desde_compra'
-        ]
\ No newline at end of file
+        ]
+
+
+class TrabajoExportacionSerializer(serializers.ModelSerializer):
+    """Estado y avance de un trabajo de exportación en segundo plano"""
+    url_estado = serializers.SerializerMethodField()
+    url_descarga = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = TrabajoExportacion
+        fields = [
+            'id', 'tipo', 'parametros', 'estado', 'progreso',
+            'nombre_descarga', 'tamano', 'mensaje_error',
+            'fecha_creacion', 'fecha_fin', 'url_estado', 'url_descarga'
+        ]
+    
+    def get_url_estado(self, trabajo):
+        return reverse('clientes:estado_exportacion', args=[trabajo.pk])
+    
+    def get_url_descarga(self, trabajo):
+        if trabajo.estado != 'COMPLETADO':
+            return None
+        return reverse('clientes:descargar_exportacion', args=[trabajo.pk])
@@ -0,0 +1,99 @@
+"""
+Búsqueda de clientes sobre el índice de texto completo FTS5 de SQLite
+La tabla clientes_cliente_fts (migración 0005) indexa nombres, documento,
+correo, teléfono y ubicación, y se mantiene sincronizada con triggers
+"""
+import re
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+
+TABLA_BUSQUEDA = 'clientes_cliente_fts'
+
+# Campos usados cuando el motor no es SQLite (búsqueda LIKE tradicional)
+CAMPOS_BUSQUEDA_ALTERNATIVA = ['primer_nombre', 'primer_apellido', 'numero_documento', 'correo']
+
+SQL_COINCIDENCIAS = f'SELECT rowid FROM {TABLA_BUSQUEDA} WHERE {TABLA_BUSQUEDA} MATCH %s'
+
+# rank usa los pesos bm25 configurados en la migración; menor es más relevante
+SQL_RELEVANCIA = (
+    f'SELECT rank FROM {TABLA_BUSQUEDA} '
+    f'WHERE {TABLA_BUSQUEDA} MATCH %s AND rowid = clientes_cliente.id'
+)
+
+
+def busqueda_texto_disponible(alias='default'):
+    return connections[alias].vendor == 'sqlite'
+
+
+def expresion_busqueda(texto, columna=None):
+    """
+    Convierte texto libre en una expresión MATCH de FTS5 con coincidencia por prefijo.
+
+    Cada palabra se vuelve una frase entre comillas terminada en *, así la
+    puntuación del usuario nunca se interpreta como sintaxis de FTS5:
+    'juan.pe gómez' -> "juan pe"* "gomez"*   (todas las palabras deben coincidir)
+    Con `columna` la expresión se restringe a esa columna del índice.
+    """
+    frases = []
+    for palabra in (texto or '').split():
+        tokens = re.findall(r'\w+', palabra)
+        if tokens:
+            frases.append(f'"{" ".join(tokens)}"*')
+
+    if columna:
+        frases = [f'{columna} : {frase}' for frase in frases]
+    return ' '.join(frases)
+
+
+def filtrar_clientes(queryset, texto='', ciudad='', departamento='', por_relevancia=False):
+    """
+    Filtra un QuerySet de Cliente con el índice de texto completo.
+
+    - texto: busca en nombres, documento, correo y teléfono
+    - ciudad / departamento: restringen a esa columna del índice
+    - por_relevancia: anota `relevancia` (bm25) y ordena por ella
+
+    En motores distintos de SQLite se usa icontains sobre los mismos campos.
+    """
+    if not busqueda_texto_disponible(queryset.db):
+        return _filtrar_con_like(queryset, texto, ciudad, departamento)
+
+    expresion = ' '.join(filter(None, [
+        expresion_busqueda(texto),
+        expresion_busqueda(ciudad, 'ciudad'),
+        expresion_busqueda(departamento, 'departamento'),
+    ]))
+    if not expresion:
+        return queryset
+
+    queryset = queryset.filter(id__in=RawSQL(SQL_COINCIDENCIAS, [expresion]))
+    if por_relevancia and expresion_busqueda(texto):
+        queryset = queryset.annotate(
+            relevancia=RawSQL(SQL_RELEVANCIA, [expresion])
+        ).order_by('relevancia', '-fecha_registro', '-id')
+    return queryset
+
+
+def _filtrar_con_like(queryset, texto, ciudad, departamento):
+    if ciudad:
+        queryset = queryset.filter(ciudad__icontains=ciudad)
+    if departamento:
+        queryset = queryset.filter(departamento__icontains=departamento)
+    if texto:
+        condicion = Q()
+        for campo in CAMPOS_BUSQUEDA_ALTERNATIVA:
+            condicion |= Q(**{f'{campo}__icontains': texto})
+        queryset = queryset.filter(condicion)
+    return queryset
+
+
+def reconstruir_indice_busqueda(alias='default'):
+    """Regenera el índice completo desde clientes_cliente (tras cargas con SQL directo)"""
+    if not busqueda_texto_disponible(alias):
+        return False
+    with connections[alias].cursor() as cursor:
+        cursor.execute(f"INSERT INTO {TABLA_BUSQUEDA}({TABLA_BUSQUEDA}) VALUES ('rebuild')")
+        cursor.execute(f"INSERT INTO {TABLA_BUSQUEDA}({TABLA_BUSQUEDA}) VALUES ('optimize')")
+    return True
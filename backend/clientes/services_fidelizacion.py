@@ -0,0 +1,81 @@
+"""
+Motor de fidelización basado en consultas agregadas
+Calcula los candidatos a fidelización en una sola pasada agrupada por cliente
+sobre el resumen diario de compras
+"""
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.db.models import F, Sum
+from django.utils import timezone
+from .models import Cliente, Compra, ResumenDiarioCliente
+
+
+# Criterios por defecto del programa de fidelización
+MONTO_MINIMO_FIDELIZACION = Decimal('5000000')
+DIAS_VENTANA_FIDELIZACION = 30
+
+
+def inicio_ventana(dias=DIAS_VENTANA_FIDELIZACION):
+    """
+    Retorna la fecha y el instante (medianoche local) desde los que se cuentan
+    las compras de la ventana de los últimos `dias` días (0 = solo hoy, None =
+    ventana por defecto). Lanza ValueError si `dias` es negativo.
+    """
+    if dias is None:
+        dias = DIAS_VENTANA_FIDELIZACION
+    if dias < 0:
+        raise ValueError(f'La ventana de fidelización no puede ser negativa: {dias} días')
+    hoy = timezone.localdate() if settings.USE_TZ else date.today()
+    fecha_desde = hoy - timedelta(days=dias)
+    inicio = datetime.combine(fecha_desde, time.min)
+    if settings.USE_TZ:
+        inicio = timezone.make_aware(inicio)
+    return fecha_desde, inicio
+
+
+def candidatos_fidelizacion(monto_minimo=MONTO_MINIMO_FIDELIZACION, dias=DIAS_VENTANA_FIDELIZACION):
+    """
+    QuerySet de clientes activos cuyas compras válidas dentro de la ventana
+    suman al menos `monto_minimo`, ordenados de mayor a menor monto.
+
+    Se calcula sobre ResumenDiarioCliente (una fila por cliente y día), no
+    sobre las compras. Cada cliente se anota con:
+    - total_ventana: monto total de compras en la ventana
+    - cantidad_ventana: cantidad de compras en la ventana
+    - ultima_compra_ventana: fecha de la última compra en la ventana
+      (la última compra válida del cliente cae necesariamente en la ventana)
+    """
+    fecha_desde, _ = inicio_ventana(dias)
+
+    # El filtro sobre la relación antes de annotate restringe el JOIN agregado
+    return Cliente.objects.filter(
+        activo=True,
+        resumen_diario__fecha__gte=fecha_desde,
+        resumen_diario__cantidad_valida__gt=0,
+    ).annotate(
+        total_ventana=Sum('resumen_diario__total_valido'),
+        cantidad_ventana=Sum('resumen_diario__cantidad_valida'),
+        ultima_compra_ventana=F('ultima_compra'),
+    ).filter(
+        total_ventana__gte=monto_minimo
+    ).order_by('-total_ventana', 'id')
+
+
+def resumen_compras_ventana(cliente, dias=DIAS_VENTANA_FIDELIZACION):
+    """Total, cantidad y última compra de un cliente dentro de la ventana"""
+    fecha_desde, inicio = inicio_ventana(dias)
+
+    resumen = ResumenDiarioCliente.totales(desde=fecha_desde, cliente_id=cliente.pk)
+    ultima_compra = cliente.ultima_compra if resumen['cantidad_valida'] else None
+
+    return {
+        'total': resumen['total_valido'],
+        'cantidad': resumen['cantidad_valida'],
+        'ultima_compra': ultima_compra,
+        'fecha_desde': fecha_desde,
+        'compras': cliente.compras.filter(
+            fecha_compra__gte=inicio,
+            estado__in=Compra.ESTADOS_VALIDOS
+        ),
+    }
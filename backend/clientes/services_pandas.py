@@ -1,94 +1,325 @@
 """
 Servicios de análisis de datos con Pandas
 Automatización de procesamiento de información de clientes y compras
+
+Las tablas se cargan por lotes (paginación keyset por id) directamente en
+arreglos tipados: ids int64, montos float64, fechas datetime64[ns] con la
+zona horaria del proyecto y categóricos para los campos de pocos valores.
+Cada análisis declara las columnas que usa y solo esas se consultan
 """
+from functools import wraps
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
-from decimal import Decimal
-from django.db.models import Sum, Count, Q
+from django.conf import settings
+from django.db import connection
+from django.db.models import CharField, FloatField
+from django.db.models.functions import Cast
+from pandas.api.types import union_categoricals
 from .models import Cliente, Compra, TipoDocumento
+from .cache_dataframes import CacheDataFrames
+from .cache_reportes import con_cache_reportes, version_datos
+
+
+TAMANO_LOTE_ANALISIS = 20000
+
+# Tipos de columna: 'int64', 'int32', 'float64', 'bool', 'texto', 'fecha_hora',
+# una lista de categorías fijas o 'categoria' (categorías según los datos)
+CATEGORIA = 'categoria'
+
+
+def _categorias(opciones):
+    return [codigo for codigo, _ in opciones]
+
+
+def _dinero(campo):
+    # La conversión a float la hace la base: sin un Decimal por fila
+    return Cast(campo, FloatField())
+
+
+def _fecha_hora_consulta(campo):
+    if connection.vendor == 'sqlite' and settings.USE_TZ:
+        # SQLite guarda el instante UTC como texto ISO: se lee tal cual y se
+        # convierte por lote, sin el datetime con zona que arma Django por fila
+        return Cast(campo, CharField())
+    return campo
+
+
+# columna -> (campo o expresión del ORM, tipo)
+COLUMNAS_CLIENTES = {
+    'id': ('id', 'int64'),
+    'tipo_documento': ('tipo_documento_id', 'tipo_documento'),  # nombre del catálogo
+    'numero_documento': ('numero_documento', 'texto'),
+    'primer_nombre': ('primer_nombre', 'texto'),
+    'segundo_nombre': ('segundo_nombre', 'texto'),
+    'primer_apellido': ('primer_apellido', 'texto'),
+    'segundo_apellido': ('segundo_apellido', 'texto'),
+    'correo': ('correo', 'texto'),
+    'telefono': ('telefono', 'texto'),
+    'genero': ('genero', _categorias(Cliente.GENERO_CHOICES)),
+    'direccion': ('direccion', 'texto'),
+    'ciudad': ('ciudad', CATEGORIA),
+    'departamento': ('departamento', CATEGORIA),
+    'activo': ('activo', 'bool'),
+    'fecha_registro': ('fecha_registro', 'fecha_hora'),
+    'ultima_compra': ('ultima_compra', 'fecha_hora'),
+    'total_compras': (_dinero('total_compras'), 'float64'),
+}
+
+COLUMNAS_COMPRAS = {
+    'id': ('id', 'int64'),
+    'cliente_id': ('cliente_id', 'int64'),
+    'numero_orden': ('numero_orden', 'texto'),
+    'fecha_compra': ('fecha_compra', 'fecha_hora'),
+    'descripcion_productos': ('descripcion_productos', 'texto'),
+    'cantidad_productos': ('cantidad_productos', 'int32'),
+    'subtotal': (_dinero('subtotal'), 'float64'),
+    'descuento': (_dinero('descuento'), 'float64'),
+    'impuestos': (_dinero('impuestos'), 'float64'),
+    'costo_envio': (_dinero('costo_envio'), 'float64'),
+    'total': (_dinero('total'), 'float64'),
+    'metodo_pago': ('metodo_pago', _categorias(Compra.METODO_PAGO_CHOICES)),
+    'numero_cuotas': ('numero_cuotas', 'int32'),
+    'canal_venta': ('canal_venta', _categorias(Compra.CANAL_VENTA_CHOICES)),
+    'ciudad_entrega': ('ciudad_entrega', CATEGORIA),
+    'estado': ('estado', _categorias(Compra.ESTADO_CHOICES)),
+    'fecha_entrega_real': ('fecha_entrega_real', 'fecha_hora'),
+}
+
+TABLAS_ANALISIS = {
+    'clientes': (Cliente, COLUMNAS_CLIENTES),
+    'compras': (Compra, COLUMNAS_COMPRAS),
+}
+
+
+class _ColumnaTipada:
+    """
+    Acumula los lotes de una columna como arreglos del tipo final.
+    Las categorías fijas conservan sus códigos entre lotes; un valor fuera de
+    ellas (datos anteriores a las opciones actuales) se agrega al final.
+    """
+
+    def __init__(self, tipo, nombres_tipo_documento=None):
+        self.tipo = tipo
+        self.nombres = nombres_tipo_documento
+        if tipo == 'tipo_documento':
+            self.categorias = sorted(set(nombres_tipo_documento.values()))
+        elif isinstance(tipo, list):
+            self.categorias = list(tipo)
+        self.partes = []
+
+    def agregar(self, valores):
+        tipo = self.tipo
+        if tipo in ('int64', 'int32', 'float64', 'bool'):
+            # None en montos opcionales queda como NaN
+            parte = np.array(valores, dtype=tipo)
+        elif tipo == 'fecha_hora':
+            # Texto ISO en UTC o datetime con zona; se guarda el instante UTC sin zona
+            parte = pd.to_datetime(valores, utc=True, format='ISO8601').tz_localize(None).to_numpy('datetime64[ns]')
+        elif tipo == CATEGORIA:
+            parte = pd.Categorical(valores)
+        elif tipo == 'tipo_documento':
+            parte = self._codigos([self.nombres.get(valor) for valor in valores])
+        elif isinstance(tipo, list):
+            parte = self._codigos(valores)
+        else:
+            parte = np.array(valores, dtype=object)
+        self.partes.append(parte)
+
+    def _codigos(self, valores):
+        valores = np.array(valores, dtype=object)
+        codigos = pd.Index(self.categorias).get_indexer(valores)
+        nuevas = set(valores[(codigos < 0) & pd.notna(valores)])
+        if nuevas:
+            self.categorias += sorted(nuevas)
+            codigos = pd.Index(self.categorias).get_indexer(valores)
+        return codigos
+
+    def terminar(self):
+        tipo = self.tipo
+        if tipo == CATEGORIA:
+            return union_categoricals(self.partes, sort_categories=True)
+        arreglo = np.concatenate(self.partes)
+        if tipo == 'fecha_hora':
+            return pd.DatetimeIndex(arreglo).tz_localize('UTC').tz_convert(settings.TIME_ZONE)
+        if tipo == 'tipo_documento' or isinstance(tipo, list):
+            return pd.Categorical.from_codes(arreglo, categories=self.categorias)
+        return arreglo
+
+
+def cargar_tabla(tabla, columnas=None, tamano_lote=TAMANO_LOTE_ANALISIS):
+    """
+    DataFrame tipado con `columnas` de `tabla` ('clientes' o 'compras'), en
+    orden de id. Sin `columnas` se cargan todas; 'id' se incluye siempre.
+
+    Las filas se leen con values_list en lotes de `tamano_lote` que continúan
+    después del último id (sin OFFSET) y cada lote se convierte a arreglos
+    antes de leer el siguiente: no se construye un dict por fila ni una
+    columna de objetos para los valores numéricos, fechas o categóricos.
+    Lanza ValueError si la tabla o alguna columna no existe.
+    """
+    if tabla not in TABLAS_ANALISIS:
+        raise ValueError(f'Tabla no soportada: {tabla} (use {", ".join(TABLAS_ANALISIS)})')
+    modelo, definicion = TABLAS_ANALISIS[tabla]
+    columnas = list(dict.fromkeys(['id', *(definicion if columnas is None else columnas)]))
+    desconocidas = [columna for columna in columnas if columna not in definicion]
+    if desconocidas:
+        raise ValueError(f'Columnas no válidas para {tabla}: {", ".join(desconocidas)}')
+
+    # id -> nombre del catálogo de tipos de documento
+    nombres = dict(TipoDocumento.objects.values_list('id', 'nombre')) if 'tipo_documento' in columnas else None
+    acumuladas = [_ColumnaTipada(definicion[columna][1], nombres) for columna in columnas]
+    # Los campos van por nombre; las expresiones (montos) como anotaciones c<i>
+    campos = [
+        _fecha_hora_consulta(campo) if tipo == 'fecha_hora' else campo
+        for campo, tipo in (definicion[columna] for columna in columnas)
+    ]
+    anotaciones = {f'c{i}': campo for i, campo in enumerate(campos) if not isinstance(campo, str)}
+    consulta = modelo.objects.annotate(**anotaciones).order_by('id').values_list(*(
+        campo if isinstance(campo, str) else f'c{i}' for i, campo in enumerate(campos)
+    ))
+
+    ultimo = None
+    while True:
+        lote = consulta if ultimo is None else consulta.filter(id__gt=ultimo)
+        filas = list(lote[:tamano_lote])
+        valores = list(zip(*filas)) if filas else [()] * len(columnas)
+        for acumulada, valores_columna in zip(acumuladas, valores):
+            acumulada.agregar(valores_columna)
+        if len(filas) < tamano_lote:
+            break
+        ultimo = filas[-1][0]
+
+    return pd.DataFrame({columna: acumulada.terminar() for columna, acumulada in zip(columnas, acumuladas)})
+
+
+# Instantánea de las tablas compartida por el proceso: los análisis leen de
+# aquí sus columnas y el merge de compras con clientes
+cache_dataframes = CacheDataFrames(cargar_tabla)
+
+
+def combinar_compras_clientes(columnas_compras, columnas_clientes):
+    """Compras con los datos de su cliente (id_compra / id_cliente)"""
+    return pd.merge(
+        cache_dataframes.tabla('compras', columnas_compras),
+        cache_dataframes.tabla('clientes', columnas_clientes),
+        left_on='cliente_id',
+        right_on='id',
+        suffixes=('_compra', '_cliente')
+    )
+
+
+def con_columnas(**columnas):
+    """
+    Declara las columnas que usa un análisis por tabla, p. ej.
+    @con_columnas(compras=('fecha_compra', 'total')): antes de ejecutarlo se
+    cargan solo esas (las tablas no declaradas no se consultan).
+    """
+    def decorador(metodo):
+        @wraps(metodo)
+        def envoltura(self, *args, **kwargs):
+            self.cargar_datos(columnas)
+            return metodo(self, *args, **kwargs)
+        envoltura.columnas = columnas
+        return envoltura
+    return decorador
+
+
+def _mes(fechas):
+    """Mes de cada fecha en la hora local (to_period no conserva la zona horaria)"""
+    return fechas.dt.tz_localize(None).dt.to_period('M')
+
+
+def _fecha_local(valor):
+    fecha = pd.Timestamp(valor)
+    return fecha.tz_localize(settings.TIME_ZONE) if fecha.tzinfo is None else fecha
+
+
+# Compras que cuentan como completadas para la fidelización
+ESTADOS_COMPLETADOS = ['COMPLETADA', 'ENTREGADO']
 
 
 class AnalisisClientesPandas:
     """
     Servicio de análisis automatizado de clientes usando Pandas
     Proporciona funcionalidades avanzadas de procesamiento de datos
+    
+    Los resultados de los análisis se guardan en cache_reportes por versión
+    de los datos: se recalculan solo si cambió algún cliente o compra.
+    Los DataFrames salen de cache_dataframes, compartidos con las demás
+    peticiones: son de solo lectura.
     """
     
     def __init__(self):
         self.df_clientes = None
         self.df_compras = None
         self.df_completo = None
+        self.version = None
     
-    def cargar_datos(self):
-        """Carga los datos desde Django ORM a DataFrames de Pandas"""
-        
-        # Cargar clientes
-        clientes_data = Cliente.objects.select_related('tipo_documento').values(
-            'id', 'nombre', 'apellido', 'email', 'telefono', 'direccion',
-            'tipo_documento__nombre', 'numero_documento', 'fecha_registro'
-        )
-        self.df_clientes = pd.DataFrame(list(clientes_data))
-        
-        # Cargar compras
-        compras_data = Compra.objects.select_related('cliente').values(
-            'id', 'cliente_id', 'fecha_compra', 'monto', 'estado',
-            'descripcion', 'cliente__nombre', 'cliente__apellido',
-            'cliente__numero_documento'
-        )
-        self.df_compras = pd.DataFrame(list(compras_data))
-        
-        # Convertir tipos de datos
-        if not self.df_clientes.empty:
-            self.df_clientes['fecha_registro'] = pd.to_datetime(self.df_clientes['fecha_registro'])
-        
-        if not self.df_compras.empty:
-            self.df_compras['fecha_compra'] = pd.to_datetime(self.df_compras['fecha_compra'])
-            self.df_compras['monto'] = self.df_compras['monto'].astype(float)
-            
+    def cargar_datos(self, columnas=None):
+        """
+        Carga los datos desde Django ORM a DataFrames tipados de Pandas.
+        `columnas`: tabla ('clientes' / 'compras') -> columnas a cargar; sin
+        `columnas` se cargan todas las de ambas tablas. Una tabla ya cargada
+        con esas columnas no se vuelve a consultar; las demás se toman de la
+        instantánea compartida del proceso.
+        """
+        if columnas is None:
+            columnas = {tabla: list(definicion) for tabla, (_, definicion) in TABLAS_ANALISIS.items()}
+
+        for tabla, nombres in columnas.items():
+            atributo = f'df_{tabla}'
+            actual = getattr(self, atributo)
+            if actual is not None and set(nombres) <= set(actual.columns):
+                continue
+            # Todas las tablas de la misma versión de los datos
+            self.version = self.version or version_datos()
+            anteriores = [] if actual is None else list(actual.columns)
+            setattr(self, atributo, cache_dataframes.tabla(tabla, [*anteriores, *nombres], self.version))
+            self.df_completo = None
+
         return self
     
     def generar_dataframe_completo(self):
         """Genera un DataFrame completo con información consolidada de clientes y compras"""
-        if self.df_clientes.empty or self.df_compras.empty:
+        if self.df_clientes is None or self.df_compras is None:
             self.cargar_datos()
         
-        # Merge de datos
-        self.df_completo = pd.merge(
-            self.df_compras,
-            self.df_clientes,
-            left_on='cliente_id',
-            right_on='id',
-            suffixes=('_compra', '_cliente')
-        )
+        if self.df_completo is None:
+            # Merge de datos, compartido por los análisis con las mismas columnas
+            columnas_compras = tuple(self.df_compras.columns)
+            columnas_clientes = tuple(self.df_clientes.columns)
+            self.df_completo = cache_dataframes.derivado(
+                ('completo', columnas_compras, columnas_clientes),
+                lambda: combinar_compras_clientes(columnas_compras, columnas_clientes),
+                self.version
+            )
         
         return self.df_completo
     
+    @con_cache_reportes('analisis_fidelizacion')
+    @con_columnas(
+        clientes=('primer_nombre', 'primer_apellido', 'numero_documento', 'correo', 'telefono'),
+        compras=('cliente_id', 'fecha_compra', 'total', 'estado'),
+    )
     def analisis_fidelizacion_automatizado(self):
         """
         Análisis automatizado de fidelización usando Pandas
         Identifica clientes con compras >$5MM COP mensuales
         """
-        if self.df_completo is None:
-            self.generar_dataframe_completo()
+        df_completo = self.generar_dataframe_completo()
         
-        # Filtrar solo compras completadas
-        df_completadas = self.df_completo[
-            self.df_completo['estado'].isin(['COMPLETADA', 'ENTREGADA'])
-        ].copy()
-        
-        # Agregar columna de año-mes para agrupación
-        df_completadas['year_month'] = df_completadas['fecha_compra'].dt.to_period('M')
+        # Filtrar solo compras completadas y agregar columna de año-mes para agrupación
+        df_completadas = df_completo[df_completo['estado'].isin(ESTADOS_COMPLETADOS)]
+        df_completadas = df_completadas.assign(year_month=_mes(df_completadas['fecha_compra']))
         
         # Calcular compras mensuales por cliente usando pandas
         compras_mensuales = df_completadas.groupby(['cliente_id', 'year_month']).agg({
-            'monto': 'sum',
+            'total': 'sum',
             'id_compra': 'count',
-            'cliente__nombre': 'first',
-            'cliente__apellido': 'first',
-            'numero_documento_x': 'first',
-            'email': 'first',
+            'primer_nombre': 'first',
+            'primer_apellido': 'first',
+            'numero_documento': 'first',
+            'correo': 'first',
             'telefono': 'first'
         }).reset_index()
         
@@ -135,41 +366,47 @@ class AnalisisClientesPandas:
             'ranking_clientes': []
         }
     
+    @con_cache_reportes('reporte_exportacion')
+    @con_columnas(
+        clientes=('tipo_documento', 'numero_documento', 'primer_nombre', 'primer_apellido', 'fecha_registro'),
+        compras=('cliente_id', 'fecha_compra', 'total', 'estado'),
+    )
     def generar_reporte_exportacion_pandas(self, formato='excel'):
         """
         Genera reportes de exportación usando pandas con análisis automatizado
         """
-        if self.df_completo is None:
-            self.generar_dataframe_completo()
+        df_completo = self.generar_dataframe_completo()
+        df_clientes, df_compras = self.df_clientes, self.df_compras
         
         # Análisis por tipo de documento
-        analisis_tipo_doc = self.df_clientes.groupby('tipo_documento__nombre').agg({
+        analisis_tipo_doc = df_clientes.groupby('tipo_documento', observed=True).agg({
             'id': 'count',
             'fecha_registro': ['min', 'max']
-        }).round(2)
+        })
         analisis_tipo_doc.columns = ['cantidad_clientes', 'primer_registro', 'ultimo_registro']
         
         # Análisis de compras por estado
-        analisis_compras = self.df_compras.groupby('estado').agg({
-            'monto': ['sum', 'mean', 'count'],
+        analisis_compras = df_compras.groupby('estado', observed=True).agg({
+            'total': ['sum', 'mean', 'count'],
             'fecha_compra': ['min', 'max']
-        }).round(2)
+        })
         analisis_compras.columns = ['monto_total', 'monto_promedio', 'cantidad', 'fecha_min', 'fecha_max']
+        analisis_compras = analisis_compras.round({'monto_total': 2, 'monto_promedio': 2})
         
         # Análisis temporal (compras por mes)
-        self.df_compras['mes'] = self.df_compras['fecha_compra'].dt.to_period('M')
-        analisis_temporal = self.df_compras.groupby('mes').agg({
-            'monto': ['sum', 'mean'],
+        analisis_temporal = df_compras.groupby(_mes(df_compras['fecha_compra']).rename('mes')).agg({
+            'total': ['sum', 'mean'],
             'id': 'count'
         }).round(2)
         analisis_temporal.columns = ['monto_total', 'monto_promedio', 'cantidad_compras']
         
         # Top clientes por compras
-        top_clientes = self.df_completo.groupby(['cliente_id', 'cliente__nombre', 'cliente__apellido', 'numero_documento_x']).agg({
-            'monto': ['sum', 'count'],
+        top_clientes = df_completo.groupby(['cliente_id', 'primer_nombre', 'primer_apellido', 'numero_documento']).agg({
+            'total': ['sum', 'count'],
             'fecha_compra': ['min', 'max']
-        }).round(2)
+        })
         top_clientes.columns = ['monto_total', 'cantidad_compras', 'primera_compra', 'ultima_compra']
+        top_clientes['monto_total'] = top_clientes['monto_total'].round(2)
         top_clientes = top_clientes.reset_index().sort_values('monto_total', ascending=False).head(10)
         
         return {
@@ -177,44 +414,46 @@ class AnalisisClientesPandas:
             'resumen_compras_estado': analisis_compras.to_dict('index'),
             'analisis_temporal': analisis_temporal.to_dict('index'),
             'top_10_clientes': top_clientes.to_dict('records'),
-            'total_clientes': len(self.df_clientes),
-            'total_compras': len(self.df_compras),
-            'monto_total_ventas': float(self.df_compras['monto'].sum()),
-            'ticket_promedio': float(self.df_compras['monto'].mean())
+            'total_clientes': len(df_clientes),
+            'total_compras': len(df_compras),
+            'monto_total_ventas': float(df_compras['total'].sum()),
+            'ticket_promedio': float(df_compras['total'].mean())
         }
     
+    @con_cache_reportes('busqueda_avanzada')
+    @con_columnas(clientes=(
+        'tipo_documento', 'numero_documento', 'primer_nombre', 'primer_apellido',
+        'correo', 'telefono', 'fecha_registro',
+    ))
     def busqueda_avanzada_pandas(self, filtros):
         """
         Búsqueda avanzada de clientes usando pandas para mejor performance
         """
-        if self.df_clientes.empty:
-            self.cargar_datos()
-        
-        df_filtrado = self.df_clientes.copy()
+        df_filtrado = self.df_clientes
         
         # Aplicar filtros usando pandas
         if filtros.get('query'):
             query = filtros['query'].lower()
             mask = (
-                df_filtrado['nombre'].str.lower().str.contains(query, na=False) |
-                df_filtrado['apellido'].str.lower().str.contains(query, na=False) |
-                df_filtrado['email'].str.lower().str.contains(query, na=False) |
-                df_filtrado['numero_documento'].str.contains(query, na=False) |
-                df_filtrado['telefono'].str.contains(query, na=False)
+                df_filtrado['primer_nombre'].str.lower().str.contains(query, na=False, regex=False) |
+                df_filtrado['primer_apellido'].str.lower().str.contains(query, na=False, regex=False) |
+                df_filtrado['correo'].str.lower().str.contains(query, na=False, regex=False) |
+                df_filtrado['numero_documento'].str.contains(query, na=False, regex=False) |
+                df_filtrado['telefono'].str.contains(query, na=False, regex=False)
             )
             df_filtrado = df_filtrado[mask]
         
         if filtros.get('tipo_documento'):
             df_filtrado = df_filtrado[
-                df_filtrado['tipo_documento__nombre'] == filtros['tipo_documento']
+                df_filtrado['tipo_documento'] == filtros['tipo_documento']
             ]
         
         if filtros.get('fecha_desde'):
-            fecha_desde = pd.to_datetime(filtros['fecha_desde'])
+            fecha_desde = _fecha_local(filtros['fecha_desde'])
             df_filtrado = df_filtrado[df_filtrado['fecha_registro'] >= fecha_desde]
         
         if filtros.get('fecha_hasta'):
-            fecha_hasta = pd.to_datetime(filtros['fecha_hasta'])
+            fecha_hasta = _fecha_local(filtros['fecha_hasta'])
             df_filtrado = df_filtrado[df_filtrado['fecha_registro'] <= fecha_hasta]
         
         # Ordenamiento
@@ -225,18 +464,17 @@ class AnalisisClientesPandas:
         
         return df_filtrado.to_dict('records')
     
+    @con_cache_reportes('prediccion_tendencias')
+    @con_columnas(compras=('fecha_compra', 'total'))
     def prediccion_tendencias(self):
         """
         Análisis predictivo de tendencias usando pandas
         """
-        if self.df_compras.empty:
-            self.cargar_datos()
+        df_compras = self.df_compras
         
         # Tendencia de ventas por mes
-        ventas_mensuales = self.df_compras.groupby(
-            self.df_compras['fecha_compra'].dt.to_period('M')
-        ).agg({
-            'monto': ['sum', 'mean', 'count']
+        ventas_mensuales = df_compras.groupby(_mes(df_compras['fecha_compra'])).agg({
+            'total': ['sum', 'mean', 'count']
         }).round(2)
         
         ventas_mensuales.columns = ['ventas_totales', 'ticket_promedio', 'cantidad_transacciones']
@@ -260,5 +498,8 @@ class AnalisisClientesPandas:
 
 
 def obtener_servicio_pandas():
-    """Factory function para obtener instancia del servicio de análisis"""
-    return AnalisisClientesPandas()
\ No newline at end of file
+    """
+    Factory function para obtener instancia del servicio de análisis.
+    La instancia es liviana: las tablas vienen de cache_dataframes.
+    """
+    return AnalisisClientesPandas()
@@ -1,3 +1,1907 @@
-from django.test import TestCase
+import gzip
+import json
+import math
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+from importlib import import_module
+from io import BytesIO, StringIO
+from pathlib import Path
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+import numpy as np
+import pandas as pd
+from unittest import mock, skipUnless
+from django.apps import apps as django_apps
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import Max, Sum
+from django.test import AsyncRequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+import pyarrow as pa
+import pyarrow.parquet as pq
+from openpyxl import load_workbook
+from rest_framework.renderers import JSONRenderer
+from .models import (
+    TipoDocumento, Cliente, Compra, PuntoControlImportacion, ResumenDiarioCliente, SecuenciaOrden,
+    TrabajoExportacion,
+)
+from .importacion import PuntoControl
+from .numeracion import AsignadorNumeroOrden
+from .cache_clientes import CachePerfilesCliente, cache_perfiles
+from .cache_compartida import FileBasedCacheDepuracionPeriodica
+from .cache_reportes import CacheReportes, cache_reportes, version_datos
+from .compresion import comprimir_fragmentos
+from .serializacion_rapida import FORMATO_CLIENTE, FORMATO_COMPRA_SIMPLE, FORMATO_PERFIL, codificar_json
+from .serializers import ClientePerfilSerializer, ClienteSerializer, CompraSimpleSerializer
+from .exportacion import ANCHO_MAXIMO_COLUMNA, LibroExcel, generar_csv_clientes, generar_txt_clientes
+from .exportacion_columnar import generar_columnar, lotes_compras
+from .services_busqueda import filtrar_clientes
+from .services_fidelizacion import DIAS_VENTANA_FIDELIZACION, candidatos_fidelizacion, inicio_ventana
+from .cache_dataframes import CacheDataFrames
+from .services_pandas import cache_dataframes, cargar_tabla, obtener_servicio_pandas
+from .trabajos_exportacion import parametros_fidelizacion, ruta_archivo
+from . import views_async
 
-# Create your tests here.
+
+# Un "SCAN <tabla>" sin "USING ... INDEX" es un recorrido completo de la tabla
+SCAN_COMPLETO = re.compile(r'^SCAN (\w+)(?: AS \w+)?$')
+ORDEN_TEMPORAL = 'USE TEMP B-TREE FOR ORDER BY'
+
+
+def crear_datos_plan():
+    """Datos mínimos para que cada vista ejecute todas sus consultas"""
+    cc = TipoDocumento.objects.create(codigo='CC', nombre='Cédula de Ciudadanía')
+    TipoDocumento.objects.create(codigo='CE', nombre='Cédula de Extranjería')
+
+    clientes = []
+    for i in range(30):
+        clientes.append(Cliente.objects.create(
+            tipo_documento=cc,
+            numero_documento=f'{1000 + i}',
+            primer_nombre='Ana' if i % 2 else 'Luis',
+            primer_apellido='Pérez',
+            correo=f'cliente{i}@correo.com',
+            telefono='573001234567',
+            fecha_nacimiento=date(1990, 1, 1),
+            direccion='Calle 1',
+            ciudad='Bogotá' if i % 3 else 'Medellín',
+            departamento='Cundinamarca',
+            activo=i % 10 != 0,
+        ))
+
+    ahora = timezone.now()
+    estados = ['COMPLETADA', 'PENDIENTE', 'CANCELADA', 'ENTREGADO']
+    for i in range(120):
+        Compra.objects.create(
+            cliente=clientes[i % len(clientes)],
+            fecha_compra=ahora - timedelta(days=i),
+            descripcion_productos='Producto',
+            subtotal=Decimal('100000.00'),
+            total=Decimal('119000.00'),
+            metodo_pago='PSE' if i % 2 else 'NEQUI',
+            direccion_entrega='Calle 1',
+            ciudad_entrega='Bogotá',
+            estado=estados[i % len(estados)],
+        )
+    return clientes
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class DatosPlanTestCase(TestCase):
+    """Base de las pruebas sobre los datos de crear_datos_plan(), disponibles en cls.clientes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.clientes = crear_datos_plan()
+
+
+class VentanaFidelizacionTests(DatosPlanTestCase):
+    """Candidatos a fidelización: ventana de días, umbral, orden y cantidad de consultas"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # La única compra de hoy es del primer cliente
+        Cliente.objects.filter(pk=cls.clientes[0].pk).update(activo=True)
+
+        # Clientes en los bordes del umbral (500.000) y de la ventana por defecto
+        tipo = TipoDocumento.objects.get(codigo='CC')
+        _, inicio = inicio_ventana()
+        ayer = timezone.now() - timedelta(days=1)
+        compras = {
+            'exacto': [(Decimal('250000.00'), ayer, 'COMPLETADA'), (Decimal('250000.00'), inicio, 'ENTREGADO')],
+            'debajo': [(Decimal('499999.99'), ayer, 'PENDIENTE')],
+            'fuera': [(Decimal('1000000.00'), inicio - timedelta(seconds=1), 'COMPLETADA'), (Decimal('100.00'), ayer, 'COMPLETADA')],
+            'cancelada': [(Decimal('1000000.00'), ayer, 'CANCELADA')],
+            'mayor': [(Decimal('900000.00'), ayer, 'COMPLETADA')],
+            'empate_a': [(Decimal('600000.00'), ayer, 'COMPLETADA')],
+            'empate_b': [(Decimal('300000.00'), ayer, 'COMPLETADA'), (Decimal('300000.00'), ayer, 'ENVIADO')],
+        }
+        cls.creados = {}
+        for numero, (nombre, lista) in enumerate(compras.items()):
+            cls.creados[nombre] = crear_cliente(tipo, f'{9000 + numero}')
+            for total, fecha, estado in lista:
+                crear_compra(cls.creados[nombre], total, fecha, estado)
+        inactivo = crear_cliente(tipo, '9100', activo=False)
+        crear_compra(inactivo, Decimal('1000000.00'), ayer)
+
+    def candidatos_por_cliente(self, monto_minimo, dias=DIAS_VENTANA_FIDELIZACION):
+        """Recorrido cliente por cliente reemplazado por candidatos_fidelizacion (consultas por cliente)"""
+        _, inicio = inicio_ventana(dias)
+        candidatos = []
+        for cliente in Cliente.objects.filter(activo=True):
+            compras = list(cliente.compras.filter(fecha_compra__gte=inicio, estado__in=Compra.ESTADOS_VALIDOS))
+            total = sum((compra.total for compra in compras), Decimal('0'))
+            if compras and total >= monto_minimo:
+                candidatos.append((cliente.pk, total, len(compras)))
+        candidatos.sort(key=lambda candidato: (-candidato[1], candidato[0]))
+        return candidatos
+
+    def test_mismos_candidatos_que_el_recorrido_por_cliente(self):
+        for monto_minimo, dias in ((Decimal('500000'), 30), (Decimal('1000'), 30), (Decimal('1000'), 7), (Decimal('0.01'), 0)):
+            with self.subTest(monto_minimo=monto_minimo, dias=dias):
+                self.assertEqual(
+                    [
+                        (cliente.pk, cliente.total_ventana, cliente.cantidad_ventana)
+                        for cliente in candidatos_fidelizacion(monto_minimo, dias)
+                    ],
+                    self.candidatos_por_cliente(monto_minimo, dias)
+                )
+
+    def test_umbral_y_orden(self):
+        candidatos = [cliente.pk for cliente in candidatos_fidelizacion(Decimal('500000'))]
+        creados = self.creados
+        # Mayor monto primero, empates por id; el umbral es inclusivo
+        self.assertEqual(candidatos, [
+            creados['mayor'].pk, creados['empate_a'].pk, creados['empate_b'].pk, creados['exacto'].pk,
+        ])
+
+    def test_consultas_constantes(self):
+        with self.assertNumQueries(1):
+            antes = len(list(candidatos_fidelizacion(Decimal('1000'))))
+        with self.assertNumQueries(1):
+            Cliente.obtener_candidatos_fidelizacion(Decimal('1000'))
+
+        tipo = TipoDocumento.objects.get(codigo='CC')
+        for numero in range(20):
+            crear_compra(crear_cliente(tipo, f'{9200 + numero}'), Decimal('5000.00'), timezone.now())
+        with self.assertNumQueries(1):
+            self.assertEqual(len(list(candidatos_fidelizacion(Decimal('1000')))), antes + 20)
+
+    def test_cero_dias_es_solo_hoy(self):
+        hoy = list(candidatos_fidelizacion(Decimal('1000'), dias=0))
+        self.assertEqual([cliente.pk for cliente in hoy], [self.clientes[0].pk])
+        self.assertEqual(hoy[0].cantidad_ventana, 1)
+        self.assertEqual(inicio_ventana(0)[0], timezone.localdate())
+
+        # Sin días se usa la ventana por defecto
+        self.assertEqual(inicio_ventana(None), inicio_ventana(DIAS_VENTANA_FIDELIZACION))
+        self.assertGreater(len(Cliente.obtener_candidatos_fidelizacion(Decimal('1000'))), 1)
+        self.assertEqual(len(Cliente.obtener_candidatos_fidelizacion(Decimal('1000'), dias=0)), 1)
+
+    def test_dias_negativos(self):
+        with self.assertRaises(ValueError):
+            list(candidatos_fidelizacion(Decimal('1000'), dias=-1))
+        self.assertEqual(parametros_fidelizacion({'dias': '-5'})[1], DIAS_VENTANA_FIDELIZACION)
+        self.assertEqual(parametros_fidelizacion({'dias': '0'})[1], 0)
+
+
+def crear_cliente(tipo_documento, numero_documento, **campos):
+    return Cliente.objects.create(**{
+        'tipo_documento': tipo_documento,
+        'numero_documento': numero_documento,
+        'primer_nombre': 'Ana',
+        'primer_apellido': 'Pérez',
+        'correo': f'cliente{numero_documento}@correo.com',
+        'telefono': '573001234567',
+        'fecha_nacimiento': date(1990, 1, 1),
+        'direccion': 'Calle 1',
+        'ciudad': 'Bogotá',
+        'departamento': 'Cundinamarca',
+        **campos,
+    })
+
+
+def crear_compra(cliente, total, fecha_compra, estado='COMPLETADA', **campos):
+    return Compra.objects.create(**{
+        'cliente': cliente,
+        'fecha_compra': fecha_compra,
+        'descripcion_productos': 'Producto',
+        'subtotal': total,
+        'total': total,
+        'metodo_pago': 'PSE',
+        'direccion_entrega': 'Calle 1',
+        'ciudad_entrega': 'Bogotá',
+        'estado': estado,
+        **campos,
+    })
+
+
+class EstadisticasComprasClienteTests(TestCase):
+    """total_compras y ultima_compra se mantienen con deltas atómicos en cada escritura de Compra"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cc = TipoDocumento.objects.create(codigo='CC', nombre='Cédula de Ciudadanía')
+        cls.ana = crear_cliente(cls.cc, '1001')
+        cls.luis = crear_cliente(cls.cc, '1002')
+        cls.ahora = timezone.now()
+
+    def assertEstadisticasFrescas(self, *clientes):
+        """Las estadísticas mantenidas coinciden con recalcularlas desde las compras"""
+        for cliente in clientes:
+            cliente.refresh_from_db()
+            resumen = cliente.compras.filter(estado__in=Compra.ESTADOS_VALIDOS).aggregate(
+                total=Sum('total'), ultima=Max('fecha_compra')
+            )
+            self.assertEqual(cliente.total_compras, resumen['total'] or Decimal('0'))
+            self.assertEqual(cliente.ultima_compra, resumen['ultima'])
+
+    def test_creacion_y_cambios_de_estado(self):
+        antigua = crear_compra(self.ana, Decimal('100.00'), self.ahora - timedelta(days=5))
+        reciente = crear_compra(self.ana, Decimal('50.00'), self.ahora - timedelta(days=1))
+        crear_compra(self.ana, Decimal('999.00'), self.ahora, estado='CANCELADA')
+        self.assertEstadisticasFrescas(self.ana)
+        self.assertEqual(self.ana.total_compras, Decimal('150.00'))
+        self.assertEqual(self.ana.ultima_compra, reciente.fecha_compra)
+
+        # Sale del conjunto válido: la última compra vuelve a la anterior
+        reciente.estado = 'CANCELADA'
+        reciente.save()
+        self.assertEstadisticasFrescas(self.ana)
+        self.assertEqual(self.ana.ultima_compra, antigua.fecha_compra)
+
+        # Vuelve a entrar
+        reciente.estado = 'ENTREGADO'
+        reciente.save()
+        self.assertEstadisticasFrescas(self.ana)
+        self.assertEqual(self.ana.total_compras, Decimal('150.00'))
+
+    def test_cambio_de_monto_de_fecha_y_de_cliente(self):
+        compra = crear_compra(self.ana, Decimal('100.00'), self.ahora - timedelta(days=2))
+        otra = crear_compra(self.ana, Decimal('10.00'), self.ahora - timedelta(days=3))
+
+        compra.total = Decimal('80.00')
+        compra.save()
+        self.assertEstadisticasFrescas(self.ana)
+
+        compra.fecha_compra = self.ahora - timedelta(days=10)
+        compra.save()
+        self.assertEstadisticasFrescas(self.ana)
+        self.assertEqual(self.ana.ultima_compra, otra.fecha_compra)
+
+        compra.cliente = self.luis
+        compra.save()
+        self.assertEstadisticasFrescas(self.ana, self.luis)
+        self.assertEqual(self.luis.total_compras, Decimal('80.00'))
+
+    def test_eliminacion(self):
+        antigua = crear_compra(self.ana, Decimal('100.00'), self.ahora - timedelta(days=5))
+        reciente = crear_compra(self.ana, Decimal('50.00'), self.ahora - timedelta(days=1))
+        reciente.delete()
+        self.assertEstadisticasFrescas(self.ana)
+        self.assertEqual(self.ana.ultima_compra, antigua.fecha_compra)
+
+        # También en borrados masivos
+        Compra.objects.filter(cliente=self.ana).delete()
+        self.assertEstadisticasFrescas(self.ana)
+        self.assertIsNone(self.ana.ultima_compra)
+
+    def test_guardado_del_cliente_no_pisa_las_estadisticas(self):
+        desactualizado = Cliente.objects.get(pk=self.ana.pk)
+        crear_compra(self.ana, Decimal('100.00'), self.ahora)
+        desactualizado.telefono = '573009999999'
+        desactualizado.save()
+        self.assertEstadisticasFrescas(self.ana)
+        self.assertEqual(self.ana.telefono, '573009999999')
+
+        # Una instancia nueva con pk explícito se inserta completa
+        nuevo = Cliente(
+            pk=9999, tipo_documento=self.cc, numero_documento='1003', primer_nombre='Eva',
+            primer_apellido='Gómez', correo='eva@correo.com', telefono='573001111111',
+            fecha_nacimiento=date(1991, 1, 1), direccion='Calle 2', ciudad='Cali',
+            departamento='Valle', total_compras=Decimal('0.00'),
+        )
+        nuevo.save()
+        self.assertTrue(Cliente.objects.filter(pk=9999, numero_documento='1003').exists())
+
+        # Igual una copia de un cliente existente con otro pk
+        copia = Cliente.objects.get(pk=self.luis.pk)
+        copia.pk, copia.numero_documento, copia.correo = 9998, '1004', 'copia@correo.com'
+        copia.save()
+        self.assertTrue(Cliente.objects.filter(pk=9998).exists())
+        self.assertTrue(Cliente.objects.filter(pk=self.luis.pk).exists())
+
+
+class ResumenDiarioClienteTests(TestCase):
+    """El resumen diario coincide con una agregación nueva de las compras"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cc = TipoDocumento.objects.create(codigo='CC', nombre='Cédula de Ciudadanía')
+        cls.cliente = crear_cliente(cc, '1000')
+        cls.otro = crear_cliente(cc, '1001')
+
+    def agregacion_fresca(self):
+        esperado = {}
+        for compra in Compra.objects.all():
+            fila = esperado.setdefault(
+                (compra.cliente_id, timezone.localdate(compra.fecha_compra)),
+                dict.fromkeys(ResumenDiarioCliente.CAMPOS_TOTALES, 0)
+            )
+            if compra.estado in Compra.ESTADOS_VALIDOS:
+                fila['total_valido'] += compra.total
+                fila['cantidad_valida'] += 1
+            elif compra.estado == 'CANCELADA':
+                fila['total_cancelado'] += compra.total
+            elif compra.estado == 'DEVUELTA':
+                fila['total_devuelto'] += compra.total
+        return esperado
+
+    def resumen_actual(self):
+        # Las filas que quedaron en cero tras retirar compras equivalen a no tener fila
+        return {
+            (fila['cliente_id'], fila['fecha']): {campo: fila[campo] for campo in ResumenDiarioCliente.CAMPOS_TOTALES}
+            for fila in ResumenDiarioCliente.objects.values('cliente_id', 'fecha', *ResumenDiarioCliente.CAMPOS_TOTALES)
+            if any(fila[campo] for campo in ResumenDiarioCliente.CAMPOS_TOTALES)
+        }
+
+    def assertResumenFresco(self):
+        self.assertEqual(self.resumen_actual(), self.agregacion_fresca())
+
+    def test_escrituras_de_compras(self):
+        ahora = timezone.now()
+        primera = crear_compra(self.cliente, Decimal('100.00'), ahora)
+        segunda = crear_compra(self.cliente, Decimal('50.00'), ahora - timedelta(days=3), estado='PENDIENTE')
+        crear_compra(self.otro, Decimal('70.00'), ahora, estado='DEVUELTA')
+        self.assertResumenFresco()
+
+        primera.total = Decimal('120.00')
+        primera.save()
+        self.assertResumenFresco()
+
+        segunda.estado = 'CANCELADA'
+        segunda.save()
+        self.assertResumenFresco()
+
+        # Cambio de día y de cliente
+        primera.fecha_compra = ahora - timedelta(days=10)
+        primera.cliente = self.otro
+        primera.save()
+        self.assertResumenFresco()
+
+        segunda.delete()
+        primera.delete()
+        self.assertResumenFresco()
+
+    def test_reconstruir_por_bloques(self):
+        ahora = timezone.now()
+        for i in range(6):
+            crear_compra(self.cliente if i % 2 else self.otro, Decimal('10.00') * (i + 1), ahora - timedelta(days=i))
+        esperado = self.agregacion_fresca()
+        ResumenDiarioCliente.objects.update(total_valido=0, cantidad_valida=0)
+
+        # Más ids que variables admite una consulta de SQLite
+        connection.ensure_connection()
+        limite = connection.connection.getlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER)
+        ids = list(range(100000, 100000 + limite)) + [self.cliente.pk, self.otro.pk]
+        generadas = ResumenDiarioCliente.reconstruir(ids, tamano_lote=2)
+        self.assertEqual(generadas, len(esperado))
+        self.assertEqual(self.resumen_actual(), esperado)
+
+        ResumenDiarioCliente.objects.all().delete()
+        salida = StringIO()
+        call_command('reconstruir_resumen_diario', stdout=salida)
+        self.assertIn(f'{len(esperado)} filas', salida.getvalue())
+        self.assertEqual(self.resumen_actual(), esperado)
+
+    def test_poblado_de_la_migracion(self):
+        migracion = import_module('clientes.migrations.0003_resumendiariocliente')
+        ahora = timezone.now()
+        crear_compra(self.cliente, Decimal('30.00'), ahora)
+        crear_compra(self.cliente, Decimal('20.00'), ahora, estado='CANCELADA')
+        crear_compra(self.otro, Decimal('40.00'), ahora - timedelta(days=40), estado='ENTREGADO')
+        ResumenDiarioCliente.objects.all().delete()
+        Cliente.objects.update(total_compras=0, ultima_compra=None)
+
+        migracion.poblar_resumen_y_estadisticas(django_apps, None)
+        self.assertResumenFresco()
+        self.cliente.refresh_from_db()
+        self.assertEqual(self.cliente.total_compras, Decimal('30.00'))
+        self.assertEqual(self.cliente.ultima_compra, ahora)
+
+
+class NumeracionOrdenTests(TransactionTestCase):
+    """Números de orden por bloques reservados de la secuencia del día"""
+
+    FORMATO = re.compile(r'^ORD-\d{6}-\d{9}$')
+
+    def test_formato_y_bloques_sin_solapamiento(self):
+        # Dos asignadores simulan dos procesos que reservan bloques intercalados
+        primero, segundo = AsignadorNumeroOrden(tamano_bloque=5), AsignadorNumeroOrden(tamano_bloque=5)
+        numeros = primero.reservar(3) + segundo.reservar(4) + primero.reservar(4) + [segundo.siguiente()]
+
+        self.assertTrue(all(self.FORMATO.match(numero) and len(numero) == 20 for numero in numeros))
+        self.assertTrue(all(numero[4:10] == timezone.localdate().strftime('%y%m%d') for numero in numeros))
+        self.assertEqual(len(set(numeros)), len(numeros))
+        # Bloques 1-5 y 6-10 para el primero y el segundo, 11-15 para la segunda reserva del primero
+        self.assertEqual(sorted(int(numero[-9:]) for numero in numeros), [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12])
+        self.assertEqual(SecuenciaOrden.objects.get().ultimo_valor, 15)
+
+    def test_cambio_de_dia(self):
+        asignador = AsignadorNumeroOrden(tamano_bloque=10)
+        hoy = asignador.siguiente()
+        with mock.patch('clientes.numeracion.timezone.localdate', return_value=timezone.localdate() + timedelta(days=1)):
+            manana = asignador.siguiente()
+        self.assertNotEqual(hoy[:10], manana[:10])
+        # El día nuevo empieza su propia secuencia, sin usar lo que quedaba del bloque anterior
+        self.assertEqual(int(manana[-9:]), 1)
+        self.assertEqual(SecuenciaOrden.objects.count(), 2)
+
+    def test_dentro_de_una_transaccion_reserva_solo_lo_necesario(self):
+        asignador = AsignadorNumeroOrden(tamano_bloque=100)
+        with self.assertRaises(ZeroDivisionError), transaction.atomic():
+            self.assertEqual([int(numero[-9:]) for numero in asignador.reservar(2)], [1, 2])
+            self.assertEqual(SecuenciaOrden.objects.get().ultimo_valor, 2)
+            1 / 0
+
+        # La reserva revertida no quedó en memoria: los números siguen siendo únicos
+        with transaction.atomic():
+            self.assertEqual(int(asignador.siguiente()[-9:]), 1)
+        self.assertEqual(int(asignador.siguiente()[-9:]), 2)
+        self.assertEqual(SecuenciaOrden.objects.get().ultimo_valor, 101)
+
+
+class ImportacionClientesTests(TestCase):
+    """importar_clientes: las columnas opcionales ausentes no se sobrescriben"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cc = TipoDocumento.objects.create(codigo='CC', nombre='Cédula de Ciudadanía')
+        cls.completo = crear_cliente(
+            cc, '1000', segundo_nombre='María', segundo_apellido='Gómez', genero='F', codigo_postal='110111'
+        )
+        cls.inactivo = crear_cliente(cc, '1001', activo=False)
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.archivo = str(Path(directorio.name) / 'clientes.csv')
+
+    def importar(self, filas):
+        pd.DataFrame([{
+            'tipo_documento': 'CC',
+            'primer_apellido': 'Pérez',
+            'correo': f'cliente{fila["numero_documento"]}@correo.com',
+            'telefono': '573001234567',
+            'fecha_nacimiento': '1990-01-01',
+            'direccion': 'Calle 2',
+            'ciudad': 'Cali',
+            'departamento': 'Valle del Cauca',
+            **fila,
+        } for fila in filas]).to_csv(self.archivo, index=False)
+        call_command('importar_clientes', self.archivo, stdout=StringIO())
+
+    def test_archivo_sin_columnas_opcionales(self):
+        self.importar([
+            {'numero_documento': '1000', 'primer_nombre': 'Ana Lucía'},
+            {'numero_documento': '1001', 'primer_nombre': 'Luis'},
+            {'numero_documento': '1002', 'primer_nombre': 'Nuevo'},
+        ])
+
+        self.completo.refresh_from_db()
+        self.assertEqual(self.completo.primer_nombre, 'Ana Lucía')
+        self.assertEqual(self.completo.ciudad, 'Cali')
+        self.assertEqual(
+            (self.completo.segundo_nombre, self.completo.segundo_apellido,
+             self.completo.genero, self.completo.codigo_postal),
+            ('María', 'Gómez', 'F', '110111')
+        )
+        # Sin columna activo un cliente inactivo sigue inactivo
+        self.inactivo.refresh_from_db()
+        self.assertEqual(self.inactivo.primer_nombre, 'Luis')
+        self.assertFalse(self.inactivo.activo)
+        # Los clientes nuevos toman los valores por defecto
+        nuevo = Cliente.objects.get(numero_documento='1002')
+        self.assertTrue(nuevo.activo)
+        self.assertIsNone(nuevo.segundo_nombre)
+
+    def test_archivo_con_columnas_opcionales(self):
+        self.importar([
+            {'numero_documento': '1000', 'primer_nombre': 'Ana', 'genero': 'o', 'activo': 'no'},
+            {'numero_documento': '1001', 'primer_nombre': 'Luis', 'genero': '', 'activo': 'si'},
+        ])
+
+        self.completo.refresh_from_db()
+        self.assertEqual(self.completo.genero, 'O')
+        self.assertFalse(self.completo.activo)
+        self.assertEqual(self.completo.segundo_nombre, 'María')
+        self.inactivo.refresh_from_db()
+        self.assertTrue(self.inactivo.activo)
+
+
+class ImportacionComprasTests(TestCase):
+    """importar_compras: reanudación sin duplicados y números de orden ya registrados"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cc = TipoDocumento.objects.create(codigo='CC', nombre='Cédula de Ciudadanía')
+        cls.cliente = crear_cliente(cc, '1000')
+        crear_compra(cls.cliente, Decimal('50000.00'), timezone.now(), numero_orden='ORD-EXISTENTE')
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.directorio = Path(directorio.name)
+
+    def escribir_archivo(self, numeros_orden):
+        ruta = self.directorio / 'compras.csv'
+        pd.DataFrame({
+            'numero_documento': '1000',
+            'numero_orden': numeros_orden,
+            'descripcion_productos': 'Producto',
+            'subtotal': '100000',
+            'total': '119000',
+            'metodo_pago': 'PSE',
+            'direccion_entrega': 'Calle 1',
+            'ciudad_entrega': 'Bogotá',
+            'estado': 'COMPLETADA',
+        }).to_csv(ruta, index=False)
+        return str(ruta)
+
+    def importar(self, archivo, *argumentos):
+        salida = StringIO()
+        call_command('importar_compras', archivo, '--tamano-lote', '2', *argumentos, stdout=salida)
+        return salida.getvalue()
+
+    def test_reanudar_despues_de_una_caida_no_duplica(self):
+        archivo = self.escribir_archivo([''] * 6)
+        guardar = PuntoControl.guardar
+        llamadas = []
+
+        def caer_en_el_segundo_lote(punto_control, **datos):
+            # La caída ocurre con el lote ya insertado y antes del commit
+            guardar(punto_control, **datos)
+            llamadas.append(datos)
+            if len(llamadas) == 2:
+                raise RuntimeError('caída simulada')
+
+        with mock.patch.object(PuntoControl, 'guardar', autospec=True, side_effect=caer_en_el_segundo_lote):
+            with self.assertRaises(RuntimeError):
+                self.importar(archivo)
+        self.assertEqual(self.cliente.compras.count(), 1 + 2)
+        # El punto de control solo guarda el avance; los clientes se reconstruyen al reanudar
+        self.assertEqual(PuntoControl('importar_compras', archivo).cargar(), {'filas_procesadas': 2})
+
+        salida = self.importar(archivo, '--reanudar')
+        self.assertIn('Reanudando después de 2 filas', salida)
+        self.assertEqual(self.cliente.compras.count(), 1 + 6)
+        self.assertEqual(
+            Compra.objects.values('numero_orden').distinct().count(), Compra.objects.count()
+        )
+        # El punto de control se elimina al terminar
+        self.assertFalse(PuntoControlImportacion.objects.exists())
+
+        self.cliente.refresh_from_db()
+        self.assertEqual(self.cliente.total_compras, Decimal('50000.00') + 6 * Decimal('119000.00'))
+
+    def test_numero_orden_existente_se_rechaza(self):
+        archivo = self.escribir_archivo(['ORD-NUEVA-1', 'ORD-EXISTENTE', 'ORD-NUEVA-2'])
+        errores = self.directorio / 'rechazos.csv'
+        salida = self.importar(archivo, '--errores', str(errores))
+
+        self.assertEqual(
+            sorted(self.cliente.compras.values_list('numero_orden', flat=True)),
+            ['ORD-EXISTENTE', 'ORD-NUEVA-1', 'ORD-NUEVA-2']
+        )
+        self.assertEqual(self.cliente.compras.get(numero_orden='ORD-EXISTENTE').total, Decimal('50000.00'))
+        rechazos = pd.read_csv(errores, dtype=str)
+        self.assertEqual(rechazos['numero_orden'].tolist(), ['ORD-EXISTENTE'])
+        self.assertEqual(rechazos['motivo_rechazo'].tolist(), ['numero_orden ya existe'])
+        self.assertIn('Importación finalizada: 3 filas (2 válidas, 1 rechazadas)', salida)
+
+    def test_montos_dentro_de_la_precision_de_cada_campo(self):
+        archivo = self.directorio / 'montos.csv'
+        pd.read_csv(self.escribir_archivo(['ORD-M1', 'ORD-M2', 'ORD-M3']), dtype=str).assign(
+            costo_envio=['99999999.99', '100000000', '99999999.999'],
+            total=['100000000', '100000000', '100000000'],
+        ).to_csv(archivo, index=False)
+        errores = self.directorio / 'rechazos.csv'
+        self.importar(str(archivo), '--errores', str(errores))
+
+        self.assertEqual(self.cliente.compras.get(numero_orden='ORD-M1').costo_envio, Decimal('99999999.99'))
+        rechazos = pd.read_csv(errores, dtype=str)
+        self.assertEqual(rechazos['numero_orden'].tolist(), ['ORD-M2', 'ORD-M3'])
+        self.assertEqual(set(rechazos['motivo_rechazo']), {'costo_envio inválido'})
+
+    def test_fechas_con_desfases_mezclados(self):
+        archivo = self.directorio / 'fechas.csv'
+        fechas = [
+            '2025-03-01 10:00:00-05:00',  # con desfase
+            '2025-03-01T15:00:00Z',  # UTC
+            '2025-03-01 10:00:00',  # sin zona: America/Bogota
+            'no es una fecha',
+        ]
+        pd.read_csv(self.escribir_archivo([f'ORD-F{i}' for i in range(len(fechas))]), dtype=str).assign(
+            fecha_compra=fechas
+        ).to_csv(archivo, index=False)
+        errores = self.directorio / 'rechazos.csv'
+        salida = self.importar(str(archivo), '--errores', str(errores))
+
+        self.assertIn('4 filas (3 válidas, 1 rechazadas)', salida)
+        esperada = datetime(2025, 3, 1, 15, 0, tzinfo=dt_timezone.utc)
+        for numero_orden in ('ORD-F0', 'ORD-F1', 'ORD-F2'):
+            self.assertEqual(Compra.objects.get(numero_orden=numero_orden).fecha_compra, esperada)
+        self.assertEqual(pd.read_csv(errores, dtype=str)['motivo_rechazo'].tolist(), ['fecha_compra inválida'])
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN es específico de SQLite')
+class PlanesConsultaTests(DatosPlanTestCase):
+    """
+    Regresión de planes de consulta: ejecuta cada vista, captura sus consultas
+    y falla si una consulta caliente recorre una tabla completa o necesita
+    ordenar en un B-tree temporal en lugar de usar un índice.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.cliente = cls.clientes[1]
+        cls.compra = cls.cliente.compras.first()
+
+    def setUp(self):
+        # Con las cachés llenas las vistas de consulta no ejecutan SQL
+        cache_perfiles.limpiar()
+        cache_reportes.limpiar()
+
+    def rutas(self):
+        """
+        (url, permite_recorrido, permite_orden_temporal) de cada vista.
+        La exportación a Excel lee la tabla completa por diseño; los tipos de
+        documento son una tabla de pocas filas; el reporte de fidelización y la
+        búsqueda por relevancia ordenan por valores calculados, y una búsqueda
+        de texto ordena solo las filas que coinciden en vez de recorrer el
+        índice de fecha_registro completo.
+        """
+        cliente, compra = self.cliente, self.compra
+        return [
+            (reverse('clientes:consultar_cliente_por_documento', args=[cliente.numero_documento]), False, False),
+            (reverse('clientes:buscar_cliente') + f'?tipo_documento=CC&numero_documento={cliente.numero_documento}', False, False),
+            (reverse('clientes:compras_cliente', args=[cliente.id]), False, False),
+            (reverse('clientes:compras_cliente', args=[cliente.id]) + '?estado=COMPLETADA', False, False),
+            (reverse('clientes:estadisticas_cliente', args=[cliente.id]), False, False),
+            (reverse('clientes:cliente_list'), False, False),
+            (reverse('clientes:cliente_list') + '?page=2', False, False),
+            (reverse('clientes:cliente_list') + '?search=ana&orden=recientes', False, True),
+            (reverse('clientes:cliente_list') + '?search=perez&ciudad=bogota', False, True),
+            (reverse('clientes:cliente_detail', args=[cliente.id]), False, False),
+            (reverse('clientes:compra_list'), False, False),
+            (reverse('clientes:compra_list') + '?estado=COMPLETADA', False, False),
+            (reverse('clientes:compra_list') + '?metodo_pago=PSE', False, False),
+            (reverse('clientes:compra_detail', args=[compra.id]), False, False),
+            (reverse('clientes:tipos_documento'), True, True),
+            (reverse('clientes:reporte_fidelizacion') + '?monto_minimo=100000', False, True),
+            (reverse('clientes:exportar_csv'), False, False),
+            (reverse('clientes:exportar_arrow') + '?tabla=compras', False, False),
+            (reverse('clientes:exportar_excel'), True, True),
+        ]
+
+    def capturar_planes(self, url):
+        """Ejecuta la vista y retorna [(sql, [detalle del plan, ...]), ...]"""
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(url)
+            if respuesta.streaming:
+                b''.join(respuesta.streaming_content)
+        self.assertLess(respuesta.status_code, 500, url)
+
+        planes = []
+        with connection.cursor() as cursor:
+            for consulta in consultas.captured_queries:
+                sql = consulta['sql']
+                if not sql.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+                    continue
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                planes.append((sql, [fila[-1] for fila in cursor.fetchall()]))
+        return planes
+
+    def test_rutas_calientes_usan_indices(self):
+        for url, permite_recorrido, permite_orden_temporal in self.rutas():
+            with self.subTest(url=url):
+                for sql, plan in self.capturar_planes(url):
+                    detalle = '\n  '.join(plan)
+                    for paso in plan:
+                        if not permite_recorrido:
+                            self.assertIsNone(
+                                SCAN_COMPLETO.match(paso),
+                                f'Recorrido completo de tabla en {url}\n{sql}\n  {detalle}'
+                            )
+                        if not permite_orden_temporal:
+                            self.assertNotIn(
+                                ORDEN_TEMPORAL, paso,
+                                f'Ordenamiento temporal en {url}\n{sql}\n  {detalle}'
+                            )
+
+    def test_consulta_por_documento_usa_indice_parcial_o_unico(self):
+        url = reverse('clientes:consultar_cliente_por_documento', args=[self.cliente.numero_documento])
+        planes = [paso for _, plan in self.capturar_planes(url) for paso in plan]
+        self.assertTrue(any(paso.startswith('SEARCH clientes_cliente USING INDEX') for paso in planes), planes)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'El índice FTS5 es específico de SQLite')
+class BusquedaClientesTests(DatosPlanTestCase):
+    """Índice de texto completo: normalización, prefijos y sincronización con Cliente"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.cliente = cls.clientes[3]
+        cls.cliente.primer_nombre = 'José'
+        cls.cliente.primer_apellido = 'Núñez'
+        cls.cliente.save()
+
+    def buscar(self, **filtros):
+        return list(filtrar_clientes(Cliente.objects.all(), **filtros).values_list('id', flat=True))
+
+    def test_ignora_tildes_y_mayusculas(self):
+        self.assertEqual(self.buscar(texto='JOSE nunez'), [self.cliente.id])
+        self.assertEqual(self.buscar(texto='josé NÚÑEZ'), [self.cliente.id])
+
+    def test_coincidencia_por_prefijo_y_columna(self):
+        self.assertEqual(self.buscar(texto='nuñ'), [self.cliente.id])
+        self.assertCountEqual(
+            self.buscar(texto='100'),
+            [cliente.id for cliente in self.clientes if cliente.numero_documento.startswith('100')]
+        )
+        self.assertEqual(
+            len(self.buscar(ciudad='medellin')),
+            Cliente.objects.filter(ciudad='Medellín').count()
+        )
+        self.assertEqual(self.buscar(texto='pérez', ciudad='bogota', departamento='cundinamarca'),
+                         self.buscar(ciudad='bogotá'))
+
+    def test_sincroniza_actualizaciones_y_eliminaciones(self):
+        self.cliente.primer_nombre = 'Zacarías'
+        self.cliente.save()
+        self.assertEqual(self.buscar(texto='zacarias'), [self.cliente.id])
+        self.assertEqual(self.buscar(texto='jose'), [])
+
+        self.cliente.compras.all().delete()
+        self.cliente.delete()
+        self.assertEqual(self.buscar(texto='zacarias'), [])
+
+    def test_ordena_por_relevancia(self):
+        otro = self.clientes[5]
+        otro.ciudad = 'Nuñez'
+        otro.save()
+        resultado = self.buscar(texto='nunez', por_relevancia=True)
+        self.assertEqual(resultado, [self.cliente.id, otro.id])
+
+
+class CachePerfilesTests(DatosPlanTestCase):
+    """Caché read-through de consultas por documento e invalidación por escritura"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.cliente = cls.clientes[1]
+
+    def setUp(self):
+        cache_perfiles.limpiar()
+        self.url_consulta = reverse('clientes:consultar_cliente_por_documento', args=[self.cliente.numero_documento])
+        self.url_buscar = reverse('clientes:buscar_cliente') + f'?tipo_documento=cc&numero_documento={self.cliente.numero_documento}'
+
+    def test_segunda_consulta_no_usa_base_de_datos(self):
+        self.assertEqual(self.client.get(self.url_consulta).status_code, 200)
+        with self.assertNumQueries(0):
+            respuesta = self.client.get(self.url_consulta)
+        self.assertEqual(respuesta.json()['data']['nombre'], self.cliente.primer_nombre)
+
+        self.client.get(self.url_buscar)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url_buscar).json()['id'], self.cliente.id)
+
+    def test_invalida_al_modificar_cliente(self):
+        self.client.get(self.url_consulta)
+        self.cliente.primer_nombre = 'Marta'
+        self.cliente.save()
+        self.assertEqual(self.client.get(self.url_consulta).json()['data']['nombre'], 'Marta')
+
+        self.cliente.activo = False
+        self.cliente.save()
+        self.assertEqual(self.client.get(self.url_consulta).status_code, 404)
+
+    def test_invalida_al_registrar_compra(self):
+        total_anterior = Decimal(self.client.get(self.url_buscar).json()['total_compras'])
+        Compra.objects.create(
+            cliente=self.cliente,
+            descripcion_productos='Producto',
+            subtotal=Decimal('1000.00'),
+            total=Decimal('1000.00'),
+            metodo_pago='PSE',
+            direccion_entrega='Calle 1',
+            ciudad_entrega='Bogotá',
+            estado='COMPLETADA',
+        )
+        total = Decimal(self.client.get(self.url_buscar).json()['total_compras'])
+        self.assertEqual(total, total_anterior + Decimal('1000.00'))
+
+    def test_no_guarda_fallos_y_distingue_tipo_invalido(self):
+        url = reverse('clientes:buscar_cliente') + '?tipo_documento=XX&numero_documento=1'
+        self.assertEqual(self.client.get(url).status_code, 400)
+        self.assertEqual(cache_perfiles.estadisticas()['entradas'], 0)
+
+    def test_invalidacion_desde_otro_proceso(self):
+        # Otra instancia con la misma caché compartida hace de otro worker
+        otro_proceso = CachePerfilesCliente()
+        cargas = []
+
+        def cargar():
+            cargas.append(1)
+            return self.cliente.id, self.cliente.numero_documento, {'cargas': len(cargas)}
+
+        clave = ('perfil', self.cliente.numero_documento)
+        self.assertEqual(cache_perfiles.obtener(clave, cargar), {'cargas': 1})
+        self.assertEqual(cache_perfiles.obtener(clave, cargar), {'cargas': 1})
+
+        otro_proceso.invalidar(cliente_id=self.cliente.id)
+        self.assertEqual(cache_perfiles.obtener(clave, cargar), {'cargas': 2})
+        otro_proceso.invalidar_varios(numeros_documento=[self.cliente.numero_documento])
+        self.assertEqual(cache_perfiles.obtener(clave, cargar), {'cargas': 3})
+        otro_proceso.limpiar()
+        self.assertEqual(cache_perfiles.obtener(clave, cargar), {'cargas': 4})
+
+        # Una versión expulsada de la caché compartida cuenta como fallo
+        caches[cache_perfiles.alias].delete(CachePerfilesCliente._clave_version(('cliente', self.cliente.id)))
+        self.assertEqual(cache_perfiles.obtener(clave, cargar), {'cargas': 5})
+        self.assertEqual(cache_perfiles.obtener(clave, cargar), {'cargas': 5})
+
+        # Si otro proceso recrea la versión expulsada, las entradas anteriores no vuelven a ser válidas
+        otro_proceso.invalidar(cliente_id=self.cliente.id)
+        caches[cache_perfiles.alias].delete(CachePerfilesCliente._clave_version(('cliente', self.cliente.id)))
+        otro_proceso.obtener(clave, cargar)
+        self.assertEqual(cache_perfiles.obtener(clave, cargar), {'cargas': 7})
+
+    def test_no_guarda_cargas_concurrentes_con_una_invalidacion(self):
+        otro_proceso = CachePerfilesCliente()
+        clave = ('perfil', self.cliente.numero_documento)
+
+        def cargar_durante_escritura():
+            otro_proceso.invalidar(cliente_id=self.cliente.id)
+            return self.cliente.id, self.cliente.numero_documento, {'n': 'anterior'}
+
+        self.assertEqual(cache_perfiles.obtener(clave, cargar_durante_escritura), {'n': 'anterior'})
+        self.assertEqual(
+            cache_perfiles.obtener(clave, lambda: (self.cliente.id, self.cliente.numero_documento, {'n': 'nuevo'})),
+            {'n': 'nuevo'}
+        )
+
+    def test_cache_compartida_revisa_el_limite_cada_n_escrituras(self):
+        with tempfile.TemporaryDirectory() as directorio:
+            cache = FileBasedCacheDepuracionPeriodica(directorio, {'OPTIONS': {'MAX_ENTRIES': 4, 'CULL_CADA': 5}})
+            with mock.patch.object(cache, '_list_cache_files', wraps=cache._list_cache_files) as listar:
+                for numero in range(10):
+                    cache.set(f'clave{numero}', numero)
+            self.assertEqual(listar.call_count, 2)
+            self.assertLess(len(cache._list_cache_files()), 10)
+
+    def test_expulsion_lru_y_ttl(self):
+        cache = CachePerfilesCliente(max_entradas=2, ttl=60)
+        for numero in (1, 2):
+            cache.obtener(numero, lambda numero=numero: (numero, str(numero), {'n': numero}))
+        cache.obtener(1, lambda: self.fail('debía estar en caché'))
+        cache.obtener(3, lambda: (3, '3', {'n': 3}))
+
+        self.assertEqual(cache.obtener(2, lambda: None), None)  # la menos usada salió
+        self.assertEqual(cache.obtener(1, lambda: None), {'n': 1})
+        self.assertEqual(cache.estadisticas()['expulsiones'], 1)
+
+        expirada = CachePerfilesCliente(max_entradas=2, ttl=0)
+        expirada.obtener(1, lambda: (1, '1', {'n': 1}))
+        self.assertEqual(expirada.obtener(1, lambda: (1, '1', {'n': 'nuevo'})), {'n': 'nuevo'})
+
+
+class ValidadoresETagTests(DatosPlanTestCase):
+    """Respuestas condicionales: 304 sin serializar mientras el recurso no cambie"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.cliente = cls.clientes[1]
+
+    def setUp(self):
+        cache_perfiles.limpiar()
+        self.urls = [
+            reverse('clientes:cliente_detail', args=[self.cliente.id]),
+            reverse('clientes:estadisticas_cliente', args=[self.cliente.id]),
+            reverse('clientes:compras_cliente', args=[self.cliente.id]),
+            reverse('clientes:consultar_cliente_por_documento', args=[self.cliente.numero_documento]),
+        ]
+
+    def test_responde_304_con_una_consulta(self):
+        # El perfil por documento toma su ETag de la caché de perfiles: sin consultas
+        for url, consultas in zip(self.urls, (1, 1, 1, 0)):
+            with self.subTest(url=url):
+                etag = self.client.get(url).headers['ETag']
+                with self.assertNumQueries(consultas):
+                    respuesta = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(respuesta.status_code, 304)
+                self.assertEqual(respuesta.headers['ETag'], etag)
+
+        # Sin la entrada en caché el perfil se carga y sigue respondiendo 304
+        cache_perfiles.limpiar()
+        with self.assertNumQueries(1):
+            respuesta = self.client.get(self.urls[3], HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 304)
+
+    def test_etag_cambia_con_el_cliente_y_sus_compras(self):
+        etags = {url: self.client.get(url).headers['ETag'] for url in self.urls}
+
+        compra = self.cliente.compras.first()
+        compra.estado = 'CANCELADA'
+        compra.save()
+        for url in self.urls[:3]:
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etags[url]).status_code, 200, url)
+
+        # El perfil por documento no incluye compras: solo cambia con el cliente
+        perfil = self.urls[3]
+        self.assertEqual(self.client.get(perfil, HTTP_IF_NONE_MATCH=etags[perfil]).status_code, 304)
+        self.cliente.correo = 'nuevo@correo.com'
+        self.cliente.save()
+        self.assertEqual(self.client.get(perfil, HTTP_IF_NONE_MATCH=etags[perfil]).status_code, 200)
+
+    def test_cliente_inexistente_no_genera_etag(self):
+        respuesta = self.client.get(reverse('clientes:cliente_detail', args=[999999]))
+        self.assertEqual(respuesta.status_code, 404)
+        self.assertNotIn('ETag', respuesta.headers)
+
+
+@override_settings(CONSULTA_LOTE_MAX_DOCUMENTOS=2000)
+class ConsultaPorLoteTests(DatosPlanTestCase):
+    """Consulta de muchos documentos con consultas IN por bloques"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.url = reverse('clientes:consultar_clientes_por_lote')
+
+    def consultar(self, documentos):
+        return self.client.post(self.url, {'documentos': documentos}, content_type='application/json')
+
+    def test_retorna_perfiles_en_orden_y_no_encontrados(self):
+        activo, inactivo = self.clientes[2], self.clientes[0]
+        respuesta = self.consultar([activo.numero_documento, 'no-existe', inactivo.numero_documento, activo.numero_documento])
+
+        datos = respuesta.json()
+        individual = self.client.get(
+            reverse('clientes:consultar_cliente_por_documento', args=[activo.numero_documento])
+        ).json()['data']
+        self.assertEqual(datos['data'], [individual])
+        self.assertEqual(datos['no_encontrados'], ['no-existe', inactivo.numero_documento])
+        self.assertEqual(datos['total_solicitados'], 3)
+
+    def test_valida_tipo_de_documento(self):
+        cliente = self.clientes[1]
+        datos = self.consultar([
+            {'numero_documento': cliente.numero_documento, 'tipo_documento': 'ce'},
+            {'numero_documento': self.clientes[3].numero_documento, 'tipo_documento': 'cc'},
+        ]).json()
+        self.assertEqual([perfil['numero_documento'] for perfil in datos['data']], [self.clientes[3].numero_documento])
+        self.assertEqual(datos['no_encontrados'], [cliente.numero_documento])
+
+    def test_bloques_de_consulta_y_limite(self):
+        documentos = [f'{numero}' for numero in range(1000, 2900)]
+        with self.assertNumQueries(3):
+            datos = self.consultar(documentos).json()
+        self.assertEqual(datos['total_encontrados'], 27)
+
+        self.assertEqual(self.consultar(documentos + ['x'] * 101).status_code, 400)
+        self.assertEqual(self.consultar([]).status_code, 400)
+
+
+class PaginacionKeysetTests(DatosPlanTestCase):
+    """Paginación por cursor de compras y clientes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.cliente = cls.clientes[1]
+
+    def recorrer(self, url):
+        ids, paginas = [], 0
+        while url:
+            datos = self.client.get(url).json()
+            ids += [fila['id'] for fila in datos['results']]
+            url, paginas = datos['next'], paginas + 1
+        return ids, paginas
+
+    def test_recorre_todo_sin_repetidos_ni_conteo(self):
+        url = reverse('clientes:compra_list') + '?page_size=25'
+        with CaptureQueriesContext(connection) as consultas:
+            primera = self.client.get(url).json()
+        self.assertNotIn('count', primera)
+        self.assertFalse([c['sql'] for c in consultas.captured_queries if 'COUNT(' in c['sql']])
+
+        ids, paginas = self.recorrer(url)
+        esperado = list(Compra.objects.order_by('-fecha_compra', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, esperado)
+        self.assertEqual(paginas, 5)
+
+    def test_estable_con_inserciones_y_pagina_anterior(self):
+        url = reverse('clientes:cliente_list') + '?page_size=10'
+        primera = self.client.get(url).json()
+        segunda = self.client.get(primera['next']).json()
+
+        # Un cliente nuevo queda al inicio y no desplaza las páginas siguientes
+        Cliente.objects.create(
+            tipo_documento=self.cliente.tipo_documento, numero_documento='9999',
+            primer_nombre='Nuevo', primer_apellido='Cliente', correo='nuevo@correo.com',
+            telefono='573001234567', fecha_nacimiento=date(1990, 1, 1),
+            direccion='Calle 1', ciudad='Cali', departamento='Valle',
+        )
+        self.assertEqual(self.client.get(primera['next']).json()['results'], segunda['results'])
+
+        anterior = self.client.get(segunda['previous']).json()
+        self.assertEqual(anterior['results'], primera['results'])
+        nuevos = self.client.get(anterior['previous']).json()
+        self.assertEqual([fila['numero_documento'] for fila in nuevos['results']], ['9999'])
+        self.assertIsNone(nuevos['previous'])
+
+    def test_total_opcional_y_compatibilidad(self):
+        url = reverse('clientes:compras_cliente', args=[self.cliente.id])
+        datos = self.client.get(url + '?incluir_total=1').json()
+        self.assertEqual(datos['count'], self.cliente.compras.count())
+        self.assertEqual(len(datos['results']), 4)
+
+        heredada = self.client.get(url + '?page=1&page_size=2').json()
+        self.assertEqual((heredada['page'], heredada['total_pages']), (1, 2))
+        self.assertEqual(self.client.get(reverse('clientes:compra_list') + '?page=2').json()['count'], 120)
+
+        self.assertEqual(self.client.get(url + '?cursor=no-es-un-cursor').status_code, 404)
+
+    @skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN es específico de SQLite')
+    def test_pagina_por_cursor_usa_indice(self):
+        planes = PlanesConsultaTests.capturar_planes
+        for url in (
+            reverse('clientes:compra_list') + '?page_size=10',
+            reverse('clientes:cliente_list') + '?page_size=10',
+            reverse('clientes:compras_cliente', args=[self.cliente.id]) + '?page_size=2',
+        ):
+            siguiente = self.client.get(url).json()['next']
+            for sql, plan in planes(self, siguiente):
+                for paso in plan:
+                    self.assertIsNone(SCAN_COMPLETO.match(paso), f'{sql}\n{plan}')
+                    self.assertNotIn(ORDEN_TEMPORAL, paso, f'{sql}\n{plan}')
+
+
+class CamposDispersosTests(DatosPlanTestCase):
+    """Consultas fijas por página y ?fields= / ?expand= en compras y clientes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.compra = Compra.objects.order_by('-fecha_compra', '-id').first()
+
+    def test_listados_sin_n_mas_1(self):
+        for url, consultas in (
+            (reverse('clientes:compra_list'), 1),
+            (reverse('clientes:compra_list') + '?page_size=100', 1),
+            (reverse('clientes:cliente_list') + '?page_size=30', 1),
+            (reverse('clientes:compra_detail', args=[self.compra.id]), 1),
+            (reverse('clientes:cliente_detail', args=[self.clientes[1].id]), 2),  # + validador ETag
+        ):
+            with self.subTest(url=url), self.assertNumQueries(consultas):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_fields_omite_cliente_y_su_join(self):
+        url = reverse('clientes:compra_list') + '?fields=id,numero_orden,total'
+        with CaptureQueriesContext(connection) as consultas:
+            datos = self.client.get(url).json()
+        self.assertEqual(set(datos['results'][0]), {'id', 'numero_orden', 'total'})
+        self.assertNotIn('JOIN', consultas.captured_queries[0]['sql'])
+
+        datos = self.client.get(url + '&expand=cliente').json()
+        self.assertEqual(datos['results'][0]['cliente']['id'], self.compra.cliente_id)
+        self.assertIn('edad', datos['results'][0]['cliente'])
+
+    def test_campos_en_detalle_y_clientes(self):
+        url = reverse('clientes:compra_detail', args=[self.compra.id]) + '?fields=estado'
+        self.assertEqual(self.client.get(url).json(), {'estado': self.compra.estado})
+
+        datos = self.client.get(reverse('clientes:cliente_list') + '?fields=id,nombre_completo').json()
+        self.assertEqual(set(datos['results'][0]), {'id', 'nombre_completo'})
+
+    def test_campo_desconocido_es_400(self):
+        respuesta = self.client.get(reverse('clientes:compra_list') + '?fields=id,no_existe')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('no_existe', respuesta.json()['fields'])
+
+
+class EstadisticasClienteTests(DatosPlanTestCase):
+    """estadisticas_cliente con agregación condicional en una consulta"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.cliente = cls.clientes[1]
+        cls.url = reverse('clientes:estadisticas_cliente', args=[cls.cliente.id])
+
+    def test_consultas_fijas_y_resultados(self):
+        # validador ETag + agregación + las dos compras extremas
+        with self.assertNumQueries(3):
+            datos = self.client.get(self.url).json()
+
+        compras = self.cliente.compras.all()
+        self.assertEqual(datos['total_compras'], compras.count())
+        self.assertEqual(datos['compras_completadas'], compras.filter(estado='COMPLETADA').count())
+        self.assertEqual(datos['compras_pendientes'], compras.filter(estado='PENDIENTE').count())
+        self.assertEqual(datos['compra_mas_reciente']['id'], compras.order_by('-fecha_compra').first().id)
+        self.assertEqual(datos['compra_mas_antigua']['id'], compras.order_by('fecha_compra').first().id)
+
+        for nombre, campo in (('por_estado', 'estado'), ('por_canal', 'canal_venta'), ('por_metodo_pago', 'metodo_pago')):
+            for codigo, resumen in datos[nombre].items():
+                filtradas = compras.filter(**{campo: codigo})
+                self.assertEqual(resumen['cantidad'], filtradas.count(), (nombre, codigo))
+                self.assertEqual(resumen['monto'], float(sum(c.total for c in filtradas)), (nombre, codigo))
+
+    def test_cliente_sin_compras(self):
+        self.cliente.compras.all().delete()
+        datos = self.client.get(self.url).json()
+        self.assertEqual(datos['total_compras'], 0)
+        self.assertIsNone(datos['compra_mas_reciente'])
+        self.assertEqual(datos['por_estado']['COMPLETADA'], {'cantidad': 0, 'monto': 0.0})
+
+
+class ExportacionCsvTests(DatosPlanTestCase):
+    """Exportación CSV por lotes transmitida con StreamingHttpResponse"""
+
+    def test_transmite_todas_las_filas_en_orden(self):
+        respuesta = self.client.get(reverse('clientes:exportar_csv'))
+        self.assertTrue(respuesta.streaming)
+        contenido = b''.join(respuesta.streaming_content).decode('utf-8')
+
+        filas = contenido.splitlines()
+        self.assertEqual(filas[0].split(',')[:3], ['ID', 'Tipo Documento', 'Número Documento'])
+        esperado = list(Cliente.objects.order_by('-fecha_registro', '-id').values_list('id', flat=True))
+        self.assertEqual([int(fila.split(',')[0]) for fila in filas[1:]], esperado)
+
+        # El tamaño del lote no cambia el resultado
+        self.assertEqual(''.join(generar_csv_clientes(tamano_lote=7)), contenido)
+
+
+class ExportacionTxtTests(DatosPlanTestCase):
+    """Reporte TXT transmitido por lotes con fichas vectorizadas"""
+
+    def test_encabezado_agregado_y_fichas_en_orden(self):
+        respuesta = self.client.get(reverse('clientes:exportar_txt'))
+        self.assertTrue(respuesta.streaming)
+        contenido = b''.join(respuesta.streaming_content).decode('utf-8')
+        lineas = contenido.split('\n')
+
+        for linea in ('Total de clientes: 30', 'Clientes activos: 27', 'Clientes inactivos: 3',
+                      'Tipos de documento: 1', 'Ciudades diferentes: 2', 'Cédula de Ciudadanía: 30 clientes'):
+            self.assertIn(linea, lineas)
+        self.assertNotIn('Cédula de Extranjería: 0 clientes', lineas)
+
+        esperado = list(Cliente.objects.order_by('-fecha_registro', '-id').values_list('id', flat=True))
+        self.assertEqual([int(linea[4:]) for linea in lineas if linea.startswith('ID: ')], esperado)
+        self.assertIn('Nombre: Ana Pérez', lineas)
+        self.assertEqual(lineas[-1], 'Sistema de Gestión de Clientes - Ríos del Desierto')
+
+        # El tamaño del lote no cambia el resultado
+        self.assertEqual(''.join(generar_txt_clientes(tamano_lote=7)), contenido)
+
+
+class ExportacionExcelTests(DatosPlanTestCase):
+    """Excel completo escrito en modo de solo escritura sobre un archivo temporal"""
+
+    def test_hojas_filas_y_anchos(self):
+        respuesta = self.client.get(reverse('clientes:exportar_excel'))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(respuesta.streaming)
+        libro = load_workbook(BytesIO(b''.join(respuesta.streaming_content)))
+
+        self.assertEqual(libro.sheetnames, [
+            'Clientes', 'Análisis Tipos Doc', 'Análisis Compras', 'Top 20 Clientes', 'Estadísticas',
+        ])
+        clientes = list(libro['Clientes'].values)
+        self.assertEqual(clientes[0][:3], ('ID', 'Tipo Documento', 'Número Documento'))
+        esperado = list(Cliente.objects.order_by('-fecha_registro', '-id').values_list('id', flat=True))
+        self.assertEqual([fila[0] for fila in clientes[1:]], esperado)
+        self.assertEqual(libro['Clientes'].column_dimensions['E'].width, len('cliente10@correo.com') + 2)
+
+        estados = {fila[0]: fila[3] for fila in list(libro['Análisis Compras'].values)[1:]}
+        self.assertEqual(estados, {'CANCELADA': 30, 'COMPLETADA': 30, 'ENTREGADO': 30, 'PENDIENTE': 30})
+        self.assertEqual(len(list(libro['Top 20 Clientes'].values)), 21)
+        metricas = dict(list(libro['Estadísticas'].values)[1:])
+        self.assertEqual(metricas['Total Clientes'], 30)
+        self.assertEqual(metricas['Clientes Inactivos'], 3)
+        self.assertEqual(metricas['Total Compras'], 120)
+
+    def test_anchos_con_el_maximo_de_todos_los_lotes(self):
+        libro = LibroExcel()
+        libro.agregar_hoja('Hoja', [
+            pd.DataFrame({'Nombre': ['Ana'], 'Ciudad': ['Bogotá']}),
+            pd.DataFrame({'Nombre': ['A' * 30], 'Ciudad': ['Cali']}),
+            pd.DataFrame({'Nombre': ['Luis'], 'Ciudad': ['C' * 80]}),
+        ])
+        hoja = load_workbook(libro.guardar())['Hoja']
+        self.assertEqual(hoja.column_dimensions['A'].width, 32)
+        self.assertEqual(hoja.column_dimensions['B'].width, ANCHO_MAXIMO_COLUMNA)
+        self.assertEqual([fila[0] for fila in hoja.values], ['Nombre', 'Ana', 'A' * 30, 'Luis'])
+
+
+@override_settings(EXPORTACIONES_WORKERS=0)
+class TrabajosExportacionTests(DatosPlanTestCase):
+    """Exportaciones en segundo plano con avance, reutilización y descarga por rangos"""
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ajuste = override_settings(EXPORTACIONES_DIR=directorio.name)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+
+    def solicitar(self, tipo, **parametros):
+        return self.client.post(
+            reverse('clientes:solicitar_exportacion'),
+            {'tipo': tipo, 'parametros': parametros},
+            content_type='application/json'
+        )
+
+    def descargar(self, datos, **encabezados):
+        respuesta = self.client.get(reverse('clientes:descargar_exportacion', args=[datos['id']]), headers=encabezados)
+        return respuesta, b''.join(respuesta.streaming_content) if respuesta.streaming else respuesta.content
+
+    def test_genera_reutiliza_y_vence_con_cambios(self):
+        respuesta = self.solicitar('csv')
+        self.assertEqual(respuesta.status_code, 202)
+        datos = respuesta.json()
+        self.assertFalse(datos['reutilizado'])
+
+        estado = self.client.get(datos['url_estado']).json()
+        self.assertEqual((estado['estado'], estado['progreso']), ('COMPLETADO', 100))
+        _, contenido = self.descargar(datos)
+        self.assertEqual(contenido.decode('utf-8'), ''.join(generar_csv_clientes()))
+
+        # Mismos parámetros y datos: mismo trabajo y mismo archivo
+        repetida = self.solicitar('csv')
+        self.assertEqual(repetida.status_code, 200)
+        self.assertEqual(repetida.json()['id'], datos['id'])
+
+        # Un cambio en los datos genera un archivo nuevo y vence el anterior
+        cliente = self.clientes[0]
+        cliente.ciudad = 'Cali'
+        cliente.save()
+        nueva = self.solicitar('csv').json()
+        self.assertNotEqual(nueva['id'], datos['id'])
+        vencido = TrabajoExportacion.objects.get(pk=datos['id'])
+        self.assertEqual(vencido.estado, 'VENCIDO')
+        self.assertEqual(self.descargar(datos)[0].status_code, 410)
+
+        # El archivo vencido se conserva para las descargas en curso hasta cumplir la retención
+        self.assertTrue(ruta_archivo(vencido).exists())
+        cliente.ciudad = 'Cartagena'
+        cliente.save()
+        with override_settings(EXPORTACIONES_RETENCION_VENCIDOS=0):
+            self.solicitar('csv')
+        self.assertFalse(ruta_archivo(vencido).exists())
+        self.assertEqual(TrabajoExportacion.objects.get(pk=datos['id']).archivo, '')
+
+    def test_descarga_por_rangos(self):
+        datos = self.solicitar('txt').json()
+        completa, contenido = self.descargar(datos)
+        self.assertEqual(completa.status_code, 200)
+        self.assertEqual(completa['Accept-Ranges'], 'bytes')
+
+        parcial, fragmento = self.descargar(datos, Range='bytes=10-19')
+        self.assertEqual(parcial.status_code, 206)
+        self.assertEqual(parcial['Content-Range'], f'bytes 10-19/{len(contenido)}')
+        self.assertEqual(fragmento, contenido[10:20])
+
+        self.assertEqual(self.descargar(datos, Range='bytes=-5')[1], contenido[-5:])
+        self.assertEqual(self.descargar(datos, Range=f'bytes={len(contenido)}-')[0].status_code, 416)
+        # If-Range con un ETag distinto: archivo completo
+        self.assertEqual(self.descargar(datos, Range='bytes=0-9', **{'If-Range': '"otro"'})[1], contenido)
+
+    def test_parametros_y_errores(self):
+        self.assertEqual(self.solicitar('pdf').status_code, 400)
+
+        excel = self.solicitar('excel').json()
+        self.assertEqual(load_workbook(BytesIO(self.descargar(excel)[1])).sheetnames[0], 'Clientes')
+
+        # Los parámetros se normalizan: mismo criterio, mismo trabajo
+        fidelizacion = self.solicitar('fidelizacion', monto_minimo='1000', dias=30).json()
+        self.assertEqual(fidelizacion['estado'], 'COMPLETADO')
+        self.assertEqual(self.solicitar('fidelizacion', monto_minimo=1000).json()['id'], fidelizacion['id'])
+
+        sin_candidatos = self.solicitar('fidelizacion', monto_minimo='999999999999').json()
+        self.assertEqual(sin_candidatos['estado'], 'ERROR')
+        self.assertIn('No se encontraron clientes', sin_candidatos['mensaje_error'])
+        self.assertEqual(self.descargar(sin_candidatos)[0].status_code, 409)
+
+        parquet = self.solicitar('parquet', tabla='compras').json()
+        self.assertTrue(parquet['nombre_descarga'].startswith('compras_'))
+        self.assertEqual(pq.read_table(BytesIO(self.descargar(parquet)[1])).num_rows, 120)
+        self.assertEqual(self.solicitar('arrow', tabla='productos').status_code, 400)
+
+    def test_falla_al_iniciar_marca_error(self):
+        with mock.patch(
+            'clientes.trabajos_exportacion.directorio_exportaciones', side_effect=PermissionError('sin permiso')
+        ):
+            datos = self.solicitar('txt').json()
+        self.assertEqual(datos['estado'], 'ERROR')
+        self.assertEqual(datos['mensaje_error'], 'sin permiso')
+        # Un trabajo con error no se reutiliza
+        self.assertEqual(self.solicitar('txt').json()['estado'], 'COMPLETADO')
+
+    def test_solicitudes_simultaneas_comparten_trabajo(self):
+        # Trabajo en curso de otra solicitud igual, confirmado después de que esta lo buscó
+        en_curso = self.solicitar('csv').json()
+        TrabajoExportacion.objects.filter(pk=en_curso['id']).update(estado='EN_PROCESO')
+        filtrar = TrabajoExportacion.objects.filter
+        busquedas = []
+
+        def buscar_antes_del_commit(*args, **kwargs):
+            busquedas.append(kwargs)
+            return TrabajoExportacion.objects.none() if len(busquedas) == 1 else filtrar(*args, **kwargs)
+
+        with mock.patch.object(TrabajoExportacion.objects, 'filter', side_effect=buscar_antes_del_commit):
+            respuesta = self.solicitar('csv')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['id'], en_curso['id'])
+        self.assertEqual(TrabajoExportacion.objects.count(), 1)
+
+
+class CacheReportesTests(DatosPlanTestCase):
+    """Caché de reportes por (reporte, parámetros, versión de los datos)"""
+
+    def setUp(self):
+        cache_reportes.limpiar()
+        cache_reportes.aciertos = cache_reportes.fallos = cache_reportes.invalidaciones = 0
+
+    def reporte(self, **parametros):
+        respuesta = self.client.get(reverse('clientes:reporte_fidelizacion'), {'monto_minimo': '1000', **parametros})
+        return respuesta, b''.join(respuesta.streaming_content) if respuesta.streaming else respuesta.content
+
+    def test_reporte_repetido_sale_de_cache_hasta_una_escritura(self):
+        primera, contenido = self.reporte()
+        self.assertEqual(primera.status_code, 200)
+
+        # Un acierto solo consulta la versión de los datos
+        with self.assertNumQueries(2):
+            repetida, repetido = self.reporte()
+        self.assertEqual(repetido, contenido)
+        self.assertEqual((cache_reportes.aciertos, cache_reportes.fallos), (1, 1))
+
+        # Otros parámetros son otra entrada; los resultados vacíos también se guardan
+        self.assertEqual(self.reporte(monto_minimo='999999999999')[0].status_code, 404)
+        self.assertEqual(self.reporte(monto_minimo='999999999999')[0].status_code, 404)
+        self.assertEqual(cache_reportes.aciertos, 2)
+
+        compra = self.clientes[0].compras.first()
+        compra.estado = 'CANCELADA'
+        compra.save()
+        self.reporte()
+        estadisticas = self.client.get(reverse('clientes:estadisticas_cache_reportes')).json()
+        self.assertEqual((estadisticas['aciertos'], estadisticas['fallos']), (2, 3))
+        self.assertEqual(estadisticas['tasa_aciertos'], 0.4)
+        self.assertEqual(estadisticas['invalidaciones'], 2)
+
+    def test_version_cambia_con_borrados_y_tipos_de_documento(self):
+        version = version_datos()
+        tipo = TipoDocumento.objects.get(codigo='CC')
+        tipo.nombre = 'Cédula'
+        tipo.save()
+        self.assertNotEqual(version_datos(), version)
+
+        version = version_datos()
+        Compra.objects.filter(pk=self.clientes[0].compras.first().pk).delete()
+        self.assertNotEqual(version_datos(), version)
+
+    def test_version_sin_recorrer_tablas(self):
+        with CaptureQueriesContext(connection) as consultas:
+            version_datos()
+        self.assertEqual(len(consultas), 1)
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {consultas[0]["sql"]}')
+            plan = [fila[-1] for fila in cursor.fetchall()]
+        self.assertFalse([paso for paso in plan if paso.startswith('SCAN clientes_')], plan)
+
+    def test_expulsion_por_tamano(self):
+        cache = CacheReportes(max_bytes=3000)
+        for numero in range(3):
+            cache.obtener('reporte', numero, lambda: b'x' * 1000, version=('v1',))
+        self.assertEqual(cache.estadisticas()['expulsiones'], 1)
+        self.assertLessEqual(cache.estadisticas()['bytes'], 3000)
+
+        # La entrada más antigua fue expulsada; la más reciente sigue en caché
+        cache.obtener('reporte', 2, lambda: self.fail('debía salir de caché'), version=('v1',))
+        self.assertEqual(cache.obtener('reporte', 0, lambda: 'recalculado', version=('v1',)), 'recalculado')
+
+        cache.obtener('grande', 0, lambda: b'x' * 5000, version=('v1',))
+        self.assertEqual(cache.estadisticas()['omitidas_por_tamano'], 1)
+
+        # Otra versión de los datos descarta todo lo anterior
+        cache.obtener('reporte', 2, lambda: 'nuevo', version=('v2',))
+        self.assertEqual(cache.estadisticas()['entradas'], 1)
+
+
+class ExportacionColumnarTests(DatosPlanTestCase):
+    """Exportaciones Parquet y Arrow IPC con tipos explícitos y row groups por lote"""
+
+    def descargar(self, nombre, **parametros):
+        respuesta = self.client.get(reverse(f'clientes:{nombre}'), parametros)
+        self.assertTrue(respuesta.streaming)
+        return b''.join(respuesta.streaming_content)
+
+    def test_parquet_de_clientes_con_tipos(self):
+        tabla = pq.read_table(BytesIO(self.descargar('exportar_parquet')))
+        self.assertEqual(tabla.num_rows, 30)
+        self.assertEqual(tabla.schema.field('total_compras').type, pa.decimal128(12, 2))
+        self.assertEqual(tabla.schema.field('fecha_registro').type.tz, 'America/Bogota')
+        self.assertTrue(pa.types.is_dictionary(tabla.schema.field('tipo_documento').type))
+        self.assertEqual(
+            tabla.column('id').to_pylist(),
+            list(Cliente.objects.order_by('-fecha_registro', '-id').values_list('id', flat=True))
+        )
+
+    def test_arrow_de_compras_y_fidelizacion(self):
+        compras = pa.ipc.open_stream(self.descargar('exportar_arrow', tabla='compras')).read_all()
+        self.assertEqual(compras.num_rows, 120)
+        self.assertEqual(compras.column('total').to_pylist()[0], Decimal('119000.00'))
+        self.assertEqual(
+            compras.column('estado').type, pa.dictionary(pa.int16(), pa.string())
+        )
+        self.assertEqual(sorted(set(compras.column('metodo_pago').to_pylist())), ['NEQUI', 'PSE'])
+
+        fidelizacion = pq.read_table(BytesIO(self.descargar('exportar_parquet', tabla='fidelizacion', monto_minimo='1000')))
+        self.assertGreater(fidelizacion.num_rows, 0)
+        self.assertEqual(fidelizacion.column_names[:2], ['cliente_id', 'tipo_documento'])
+
+        respuesta = self.client.get(reverse('clientes:exportar_parquet'), {'tabla': 'productos'})
+        self.assertEqual(respuesta.status_code, 400)
+
+    def test_un_row_group_por_lote(self):
+        columnas, lotes = lotes_compras(tamano_lote=7)
+        archivo = pq.ParquetFile(BytesIO(b''.join(generar_columnar('parquet', columnas, lotes))))
+        self.assertEqual(archivo.num_row_groups, math.ceil(120 / 7))
+        self.assertEqual(archivo.metadata.num_rows, 120)
+
+    def test_conserva_valores_fuera_de_las_opciones(self):
+        # Género en blanco y un estado anterior a las opciones actuales
+        Cliente.objects.filter(pk=self.clientes[0].pk).update(genero='')
+        compra = Compra.objects.order_by('-fecha_compra', '-id').first()
+        Compra.objects.filter(pk=compra.pk).update(estado='ANTIGUO')
+
+        clientes = pq.read_table(BytesIO(self.descargar('exportar_parquet')))
+        self.assertEqual(clientes.column('genero').to_pylist().count(''), 1)
+        self.assertEqual(clientes.column('genero').null_count, Cliente.objects.filter(genero__isnull=True).count())
+
+        for formato in ('parquet', 'arrow'):
+            with self.subTest(formato=formato):
+                columnas, lotes = lotes_compras(tamano_lote=7)
+                contenido = BytesIO(b''.join(generar_columnar(formato, columnas, lotes)))
+                compras = pq.read_table(contenido) if formato == 'parquet' else pa.ipc.open_stream(contenido).read_all()
+                self.assertEqual(compras.column('estado').to_pylist()[0], 'ANTIGUO')
+                self.assertEqual(
+                    compras.column('estado').to_pylist()[1:],
+                    list(Compra.objects.order_by('-fecha_compra', '-id').values_list('estado', flat=True))[1:]
+                )
+
+
+class VistasAsincronasTests(DatosPlanTestCase):
+    """Las vistas asíncronas responden igual que las síncronas (cuerpo, código y ETag)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.cliente = cls.clientes[1]
+
+    def setUp(self):
+        cache_perfiles.limpiar()
+        self.fabrica = AsyncRequestFactory()
+
+    def casos(self):
+        """(vista asíncrona, url, argumentos de la vista)"""
+        cliente = self.cliente
+        documento = reverse('clientes:consultar_cliente_por_documento', args=[cliente.numero_documento])
+        buscar = reverse('clientes:buscar_cliente')
+        compras = reverse('clientes:compras_cliente', args=[cliente.id])
+        return [
+            (views_async.consultar_cliente_por_documento, documento, {'numero_documento': cliente.numero_documento}),
+            (views_async.consultar_cliente_por_documento,
+             reverse('clientes:consultar_cliente_por_documento', args=['000']), {'numero_documento': '000'}),
+            (views_async.buscar_cliente, f'{buscar}?tipo_documento=cc&numero_documento={cliente.numero_documento}', {}),
+            (views_async.buscar_cliente, f'{buscar}?tipo_documento=CE&numero_documento={cliente.numero_documento}', {}),
+            (views_async.buscar_cliente, f'{buscar}?tipo_documento=XX&numero_documento=1', {}),
+            (views_async.buscar_cliente, buscar, {}),
+            (views_async.compras_cliente, compras + '?page_size=2&incluir_total=1', {'cliente_id': cliente.id}),
+            (views_async.compras_cliente, compras + '?estado=PENDIENTE', {'cliente_id': cliente.id}),
+            (views_async.compras_cliente, compras + '?page=2&page_size=3', {'cliente_id': cliente.id}),
+            (views_async.compras_cliente, compras + '?cursor=no-es-un-cursor', {'cliente_id': cliente.id}),
+            (views_async.compras_cliente,
+             reverse('clientes:compras_cliente', args=[self.clientes[0].id]), {'cliente_id': self.clientes[0].id}),
+        ]
+
+    async def responder(self, vista, url, argumentos, **encabezados):
+        respuesta = await vista(self.fabrica.get(url, headers=encabezados), **argumentos)
+        return respuesta, (json.loads(respuesta.content) if respuesta.content else None)
+
+    async def test_mismas_respuestas_que_las_vistas_sincronas(self):
+        for vista, url, argumentos in self.casos():
+            with self.subTest(url=url):
+                esperada = await self.async_client.get(url)
+                # Sin caché la vista asíncrona consulta la base; con caché, la respuesta guardada
+                for _ in range(2):
+                    respuesta, datos = await self.responder(vista, url, argumentos)
+                    self.assertEqual(respuesta.status_code, esperada.status_code)
+                    self.assertEqual(datos, esperada.json())
+                    self.assertEqual(respuesta.headers.get('ETag'), esperada.headers.get('ETag'))
+
+    async def test_recorre_compras_por_cursor(self):
+        url = reverse('clientes:compras_cliente', args=[self.cliente.id]) + '?page_size=1'
+        ids = []
+        while url:
+            _, datos = await self.responder(views_async.compras_cliente, url, {'cliente_id': self.cliente.id})
+            ids += [fila['id'] for fila in datos['results']]
+            url = datos['next']
+        self.assertEqual(ids, [compra.id async for compra in self.cliente.compras.order_by('-fecha_compra', '-id')])
+
+    async def test_responde_304_y_rechaza_escrituras(self):
+        vista, url, argumentos = self.casos()[6]
+        etag = (await self.responder(vista, url, argumentos))[0].headers['ETag']
+        respuesta, _ = await self.responder(vista, url, argumentos, if_none_match=etag)
+        self.assertEqual(respuesta.status_code, 304)
+
+        respuesta = await vista(self.fabrica.post(url), **argumentos)
+        self.assertEqual(respuesta.status_code, 405)
+
+
+def descomprimir(datos, codificacion):
+    if codificacion == 'gzip':
+        return gzip.decompress(datos)
+    return pa.CompressedInputStream(pa.BufferReader(datos), 'zstd').read()
+
+
+class CompresionRespuestasTests(DatosPlanTestCase):
+    """Compresión zstd / gzip de listados JSON y exportaciones, con cuerpos precomprimidos"""
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.directorio = Path(directorio.name)
+        ajuste = override_settings(EXPORTACIONES_DIR=directorio.name, EXPORTACIONES_WORKERS=0)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+
+    def obtener(self, url, codificacion=None, **encabezados):
+        if codificacion:
+            encabezados['Accept-Encoding'] = codificacion
+        respuesta = self.client.get(url, headers=encabezados)
+        contenido = b''.join(respuesta.streaming_content) if respuesta.streaming else respuesta.content
+        return respuesta, contenido
+
+    def test_negocia_la_codificacion(self):
+        url = reverse('clientes:compra_list') + '?page_size=50'
+        _, original = self.obtener(url)
+        for aceptadas, esperada in (
+            ('gzip, deflate, br, zstd', 'zstd'),
+            ('gzip', 'gzip'),
+            ('zstd;q=0.5, gzip', 'gzip'),
+            ('zstd;q=0, gzip;q=0', None),
+            ('identity', None),
+        ):
+            with self.subTest(aceptadas=aceptadas):
+                respuesta, contenido = self.obtener(url, aceptadas)
+                self.assertEqual(respuesta.get('Content-Encoding'), esperada)
+                self.assertIn('Accept-Encoding', respuesta['Vary'])
+                if esperada:
+                    self.assertLess(len(contenido), len(original))
+                    contenido = descomprimir(contenido, esperada)
+                self.assertEqual(contenido, original)
+
+    def test_etag_debil_sigue_validando(self):
+        url = reverse('clientes:compras_cliente', args=[self.clientes[1].id])
+        respuesta, _ = self.obtener(url, 'gzip')
+        self.assertTrue(respuesta['ETag'].startswith('W/"'))
+        respuesta, _ = self.obtener(url, 'gzip', **{'If-None-Match': respuesta['ETag']})
+        self.assertEqual(respuesta.status_code, 304)
+
+    def test_fragmentos_se_entregan_a_medida_que_llegan(self):
+        for codificacion in ('gzip', 'zstd'):
+            with self.subTest(codificacion=codificacion):
+                fragmentos = comprimir_fragmentos(iter(['a' * 1000, 'b' * 1000]), codificacion)
+                primero = next(fragmentos)
+                # El primer fragmento ya se puede descomprimir sin esperar al resto
+                if codificacion == 'gzip':
+                    self.assertEqual(zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(primero), b'a' * 1000)
+                resto = b''.join(fragmentos)
+                self.assertEqual(descomprimir(primero + resto, codificacion), b'a' * 1000 + b'b' * 1000)
+
+    def test_exportacion_repetida_se_sirve_precomprimida(self):
+        url = reverse('clientes:exportar_csv')
+        _, original = self.obtener(url)
+
+        primera, contenido = self.obtener(url, 'zstd')
+        self.assertTrue(primera.streaming)
+        self.assertNotIn('Content-Length', primera)
+        self.assertEqual(descomprimir(contenido, 'zstd'), original)
+        guardados = list((self.directorio / 'comprimidos').glob('*.zst'))
+        self.assertEqual(len(guardados), 1)
+
+        with CaptureQueriesContext(connection) as consultas:
+            repetida, contenido_repetido = self.obtener(url, 'zstd')
+        self.assertEqual(contenido_repetido, contenido)
+        self.assertEqual(int(repetida['Content-Length']), len(contenido))
+        self.assertFalse([c['sql'] for c in consultas.captured_queries if 'LIMIT 5000' in c['sql']])
+
+        # Con datos nuevos se genera otra copia y la anterior se descarta
+        cliente = self.clientes[0]
+        cliente.ciudad = 'Cali'
+        cliente.save()
+        _, nuevo = self.obtener(url, 'zstd')
+        self.assertIn(b'Cali', descomprimir(nuevo, 'zstd'))
+        self.assertNotEqual(list((self.directorio / 'comprimidos').glob('*.zst')), guardados)
+        self.assertEqual(len(list((self.directorio / 'comprimidos').glob('*.zst'))), 1)
+
+    def test_descarga_de_trabajo_comprimida_y_rangos_sin_comprimir(self):
+        datos = self.client.post(
+            reverse('clientes:solicitar_exportacion'), {'tipo': 'txt'}, content_type='application/json'
+        ).json()
+        url = reverse('clientes:descargar_exportacion', args=[datos['id']])
+        _, original = self.obtener(url)
+
+        for _ in range(2):
+            respuesta, contenido = self.obtener(url, 'gzip')
+            self.assertEqual(respuesta['Content-Encoding'], 'gzip')
+            self.assertEqual(descomprimir(contenido, 'gzip'), original)
+        self.assertEqual(len(list(self.directorio.glob(f"{datos['id']}.txt.gz"))), 1)
+
+        parcial, fragmento = self.obtener(url, 'gzip', Range='bytes=0-9')
+        self.assertEqual(parcial.status_code, 206)
+        self.assertNotIn('Content-Encoding', parcial)
+        self.assertEqual(fragmento, original[:10])
+
+
+class SerializacionRapidaTests(DatosPlanTestCase):
+    """La serialización precompilada produce los mismos bytes que los serializers de DRF"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        hoy = date.today()
+        hace_30 = date(hoy.year - 30, hoy.month, min(hoy.day, 28))
+        # Segundos nombres vacíos o nulos y cumpleaños alrededor de hoy para nombre_completo y edad
+        for i, (segundo, nacimiento) in enumerate((
+            ('María', hace_30),
+            ('', hace_30 + timedelta(days=1)),
+            (None, hace_30 - timedelta(days=1)),
+        )):
+            cliente = cls.clientes[i + 1]
+            cliente.segundo_nombre = segundo
+            cliente.segundo_apellido = segundo
+            cliente.fecha_nacimiento = nacimiento
+            cliente.save()
+
+    def assertMismosBytes(self, formato, serializer_class, queryset, seleccion=None):
+        filas = formato.convertir(formato.consulta(queryset, seleccion), seleccion)
+        esperado = serializer_class(list(queryset), many=True).data
+        self.assertEqual(codificar_json(filas), JSONRenderer().render(esperado))
+
+    def test_mismos_bytes_que_drf(self):
+        clientes = Cliente.objects.select_related('tipo_documento').order_by('id')
+        self.assertMismosBytes(FORMATO_CLIENTE, ClienteSerializer, clientes)
+        self.assertMismosBytes(FORMATO_PERFIL, ClientePerfilSerializer, clientes)
+        self.assertMismosBytes(FORMATO_COMPRA_SIMPLE, CompraSimpleSerializer, Compra.objects.order_by('-fecha_compra', '-id'))
+
+    def test_convertidor_por_seleccion_se_arma_una_vez(self):
+        convertir = FORMATO_CLIENTE.convertidor_filas({'id', 'edad'})
+        self.assertIs(FORMATO_CLIENTE.convertidor_filas(['edad', 'id']), convertir)
+        self.assertIsNot(FORMATO_CLIENTE.convertidor_filas(), convertir)
+
+        # La zona horaria se resuelve en cada conversión, no al armar el convertidor
+        FORMATO_COMPRA_SIMPLE.convertidor_filas()
+        with timezone.override('UTC'):
+            self.assertMismosBytes(FORMATO_COMPRA_SIMPLE, CompraSimpleSerializer, Compra.objects.order_by('-fecha_compra', '-id'))
+
+    def test_listado_con_campos_dispersos(self):
+        url = reverse('clientes:cliente_list')
+        for parametros in ('', '?fields=id,edad,nombre_completo', '?fields=id&expand=tipo_documento', '?search=ana'):
+            with self.subTest(parametros=parametros):
+                datos = self.client.get(url + parametros).json()
+                ids = [fila['id'] for fila in datos['results']]
+                clientes = Cliente.objects.select_related('tipo_documento').in_bulk(ids)
+                esperado = [
+                    {campo: valor for campo, valor in fila.items() if campo in datos['results'][0]}
+                    for fila in ClienteSerializer([clientes[i] for i in ids], many=True).data
+                ]
+                self.assertEqual(datos['results'], esperado)
+        self.assertEqual(self.client.get(url + '?fields=id,clave').status_code, 400)
+
+
+@override_settings(CACHE_DATAFRAMES_REFRESCO=0)
+class CargaTipadaPandasTests(DatosPlanTestCase):
+    """Carga por lotes a columnas tipadas, solo con las columnas de cada análisis"""
+
+    def setUp(self):
+        cache_reportes.limpiar()
+        cache_dataframes.limpiar()
+
+    def test_tipos_y_lotes(self):
+        compras = cargar_tabla('compras', ['fecha_compra', 'total', 'estado', 'metodo_pago', 'ciudad_entrega'], tamano_lote=7)
+        self.assertEqual(list(compras['id']), list(Compra.objects.order_by('id').values_list('id', flat=True)))
+        self.assertEqual(compras['id'].dtype, 'int64')
+        self.assertEqual(compras['total'].dtype, 'float64')
+        self.assertEqual(str(compras['fecha_compra'].dt.tz), 'America/Bogota')
+        primera = Compra.objects.order_by('id').first()
+        self.assertEqual(compras['fecha_compra'].iloc[0], primera.fecha_compra)
+        self.assertEqual(compras['total'].iloc[0], 119000.0)
+        # Categorías fijas: todas las opciones del modelo, con el mismo orden en cada carga
+        self.assertEqual(list(compras['estado'].cat.categories), [codigo for codigo, _ in Compra.ESTADO_CHOICES])
+        self.assertEqual(compras['estado'].value_counts()['CANCELADA'], 30)
+        self.assertEqual(list(compras['ciudad_entrega'].cat.categories), ['Bogotá'])
+
+        clientes = cargar_tabla('clientes', ['tipo_documento', 'ciudad', 'ultima_compra'])
+        self.assertEqual(list(clientes['tipo_documento'].cat.categories), ['Cédula de Ciudadanía', 'Cédula de Extranjería'])
+        self.assertEqual(clientes['ciudad'].value_counts().to_dict(), {'Bogotá': 20, 'Medellín': 10})
+        self.assertEqual(
+            list(clientes['ultima_compra']),
+            list(Cliente.objects.order_by('id').values_list('ultima_compra', flat=True))
+        )
+
+        with self.assertRaises(ValueError):
+            cargar_tabla('compras', ['monto'])
+
+    def test_valor_fuera_de_las_opciones_se_conserva(self):
+        Compra.objects.filter(pk=Compra.objects.order_by('id').first().pk).update(estado='ENTREGADA')
+        compras = cargar_tabla('compras', ['estado'], tamano_lote=50)
+        self.assertEqual(compras['estado'].iloc[0], 'ENTREGADA')
+        self.assertEqual(compras['estado'].isna().sum(), 0)
+
+    def test_cada_analisis_consulta_solo_sus_columnas(self):
+        servicio = obtener_servicio_pandas()
+        with CaptureQueriesContext(connection) as consultas:
+            resultado = servicio.prediccion_tendencias()
+        self.assertIn('proyeccion_proximo_mes', resultado)
+        sql = ' '.join(consulta['sql'] for consulta in consultas.captured_queries)
+        self.assertIn('"fecha_compra"', sql)
+        self.assertNotIn('"descripcion_productos"', sql)
+        self.assertNotIn('"clientes_cliente"."correo"', sql)
+        self.assertIsNone(servicio.df_clientes)
+        self.assertEqual(list(servicio.df_compras.columns), ['id', 'fecha_compra', 'total'])
+
+        reporte = servicio.generar_reporte_exportacion_pandas()
+        self.assertEqual(reporte['total_compras'], 120)
+        self.assertEqual(reporte['resumen_compras_estado']['CANCELADA']['cantidad'], 30)
+        # La segunda carga agrega columnas a las ya cargadas
+        self.assertIn('fecha_compra', servicio.df_compras.columns)
+
+        encontrados = obtener_servicio_pandas().busqueda_avanzada_pandas({
+            'query': 'ana', 'tipo_documento': 'Cédula de Ciudadanía', 'fecha_desde': '2000-01-01'
+        })
+        self.assertEqual(len(encontrados), 15)
+
+        fidelizacion = obtener_servicio_pandas().analisis_fidelizacion_automatizado()
+        self.assertEqual(fidelizacion['clientes_fidelizados'], [])
+
+
+@override_settings(CACHE_DATAFRAMES_REFRESCO=0)
+class CacheDataFramesTests(DatosPlanTestCase):
+    """Instantánea de DataFrames compartida por el proceso, por versión de los datos"""
+
+    def setUp(self):
+        cache_reportes.limpiar()
+        cache_dataframes.limpiar()
+
+    def test_peticiones_comparten_las_columnas_cargadas(self):
+        primera = obtener_servicio_pandas()
+        primera.prediccion_tendencias()
+        cache_reportes.limpiar()
+
+        # Otra instancia solo consulta la versión de los datos, una vez
+        segunda = obtener_servicio_pandas()
+        with self.assertNumQueries(1):
+            segunda.prediccion_tendencias()
+        self.assertTrue(np.shares_memory(primera.df_compras['total'].to_numpy(), segunda.df_compras['total'].to_numpy()))
+
+        # Con más columnas se cargan solo las que faltan
+        with CaptureQueriesContext(connection) as consultas:
+            cache_dataframes.tabla('compras', ['fecha_compra', 'estado'])
+        carga = consultas.captured_queries[-1]['sql']
+        self.assertIn('"estado"', carga)
+        self.assertNotIn('"total"', carga)
+
+        # El merge de compras y clientes también se comparte
+        completo = obtener_servicio_pandas().analisis_fidelizacion_automatizado
+        completo()
+        cache_reportes.limpiar()
+        otra = obtener_servicio_pandas()
+        otra.cargar_datos(otra.analisis_fidelizacion_automatizado.columnas)
+        self.assertIs(otra.generar_dataframe_completo(), cache_dataframes.derivado(
+            ('completo', tuple(otra.df_compras.columns), tuple(otra.df_clientes.columns)), lambda: self.fail('debía salir de caché')
+        ))
+
+    def test_refresco_al_cambiar_la_version(self):
+        antes = obtener_servicio_pandas().generar_reporte_exportacion_pandas()
+        self.assertFalse(cache_dataframes.refrescar())
+
+        compra = self.clientes[0].compras.first()
+        compra.estado = 'CANCELADA'
+        compra.save()
+        self.assertTrue(cache_dataframes.refrescar())
+        columnas = cache_dataframes.estadisticas()['columnas']
+        self.assertEqual(set(columnas['compras']), {'id', 'cliente_id', 'fecha_compra', 'total', 'estado'})
+        self.assertEqual(len(cache_dataframes.estadisticas()['derivados']), 1)
+
+        # Después del refresco el análisis no vuelve a cargar las tablas
+        cache_reportes.limpiar()
+        cargas = cache_dataframes.cargas
+        despues = obtener_servicio_pandas().generar_reporte_exportacion_pandas()
+        self.assertEqual(cache_dataframes.cargas, cargas)
+        self.assertEqual(
+            despues['resumen_compras_estado']['CANCELADA']['cantidad'],
+            antes['resumen_compras_estado']['CANCELADA']['cantidad'] + 1
+        )
+
+        estadisticas = self.client.get(reverse('clientes:estadisticas_cache_dataframes')).json()
+        self.assertEqual(estadisticas['refrescos'], 1)
+        self.assertGreater(estadisticas['bytes'], 0)
+        self.assertIn('estado', estadisticas['columnas']['compras'])
+
+    def test_expulsion_por_tamano_y_una_sola_carga_concurrente(self):
+        cargas = []
+
+        def cargar(tabla, columnas):
+            cargas.append(tuple(columnas))
+            time.sleep(0.05)
+            return pd.DataFrame({columna: np.arange(100, dtype='int64') for columna in ['id', *columnas]})
+
+        cache = CacheDataFrames(cargar, max_bytes=2500)
+        hilos = [threading.Thread(target=cache.tabla, args=('compras', ['a'], ('v1',))) for _ in range(4)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        self.assertEqual(len(cargas), 1)
+
+        # Cada columna ocupa 800 bytes: con la tercera se expulsa la menos usada
+        cache.tabla('compras', ['b', 'c'], ('v1',))
+        estadisticas = cache.estadisticas()
+        self.assertLessEqual(estadisticas['bytes'], 2500)
+        self.assertEqual(estadisticas['expulsiones'], 1)
+        self.assertEqual(set(estadisticas['columnas']['compras']), {'id', 'b', 'c'})
+
+        # Otra versión de los datos descarta todo lo anterior
+        cache.tabla('compras', ['a'], ('v2',))
+        self.assertEqual(cache.estadisticas()['entradas'], 2)
+
+    def test_asignacion_en_el_lugar_no_altera_la_instantanea(self):
+        cache = CacheDataFrames(lambda tabla, columnas: pd.DataFrame({'id': np.arange(3), 'a': np.zeros(3)}))
+        marco = cache.tabla('compras', ['a'], ('v1',))
+        marco.loc[0, 'a'] = -1
+        marco['a'] += 1
+        self.assertEqual(list(cache.tabla('compras', ['a'], ('v1',))['a']), [0.0, 0.0, 0.0])
+
+    @override_settings(CACHE_DATAFRAMES_REFRESCO=0.02, CACHE_DATAFRAMES_INACTIVIDAD=0.01)
+    def test_inactividad_libera_la_instantanea_y_detiene_el_hilo(self):
+        cache = CacheDataFrames(lambda tabla, columnas: pd.DataFrame({'id': np.arange(3), 'a': np.zeros(3)}))
+        cache.tabla('compras', ['a'], ('v1',))
+        hilo = cache._hilo
+        hilo.join(5)
+        self.assertFalse(hilo.is_alive())
+        estadisticas = cache.estadisticas()
+        self.assertEqual((estadisticas['entradas'], estadisticas['bytes']), (0, 0))
+        self.assertEqual(estadisticas['expiraciones_por_inactividad'], 1)
+
+        # La siguiente petición vuelve a cargar y reinicia el hilo
+        cache.tabla('compras', ['a'], ('v1',))
+        self.assertEqual(cache.cargas, 2)
+        self.assertIsNot(cache._hilo, hilo)
+        cache._hilo.join(5)
@@ -0,0 +1,328 @@
+"""
+Trabajos de exportación en segundo plano
+Las exportaciones se encolan en un pool de hilos local (sin broker externo),
+su avance queda en TrabajoExportacion y el archivo terminado se guarda en
+disco; una solicitud con los mismos parámetros sobre datos sin cambios
+reutiliza el archivo anterior
+"""
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.utils import timezone
+from .exportacion import (
+    generar_csv_clientes,
+    generar_txt_clientes,
+    libro_excel_completo,
+    libro_reporte_fidelizacion,
+    reporte_fidelizacion,
+)
+from .cache_reportes import version_datos
+from .exportacion_columnar import FORMATOS_COLUMNARES, fuente_columnar, generar_columnar
+from .models import TrabajoExportacion
+from .services_fidelizacion import DIAS_VENTANA_FIDELIZACION, MONTO_MINIMO_FIDELIZACION
+
+
+CONTENT_TYPE_EXCEL = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+ESTADOS_ACTIVOS = ('PENDIENTE', 'EN_PROCESO')
+
+
+# === PARÁMETROS ===
+
+def parametros_fidelizacion(datos):
+    """
+    Monto mínimo y ventana en días del reporte de fidelización.
+    Los valores ausentes o inválidos (incluidos los días negativos) toman el
+    criterio por defecto.
+    """
+    try:
+        monto_minimo = Decimal(str(datos.get('monto_minimo', MONTO_MINIMO_FIDELIZACION)))
+    except (ValueError, TypeError, ArithmeticError):
+        monto_minimo = MONTO_MINIMO_FIDELIZACION
+    try:
+        dias = int(datos.get('dias', DIAS_VENTANA_FIDELIZACION))
+    except (ValueError, TypeError):
+        dias = DIAS_VENTANA_FIDELIZACION
+    if dias < 0:
+        dias = DIAS_VENTANA_FIDELIZACION
+    return monto_minimo, dias
+
+
+def _hash(*partes):
+    return hashlib.sha256(json.dumps(partes, sort_keys=True, default=str).encode()).hexdigest()
+
+
+# === FORMATOS ===
+
+def _escribir_csv(archivo, parametros, progreso):
+    for fragmento in generar_csv_clientes(progreso=progreso):
+        archivo.write(fragmento.encode('utf-8'))
+
+
+def _escribir_txt(archivo, parametros, progreso):
+    for fragmento in generar_txt_clientes(progreso=progreso):
+        archivo.write(fragmento.encode('utf-8'))
+
+
+def _escribir_excel(archivo, parametros, progreso):
+    libro_excel_completo(progreso).guardar(archivo)
+
+
+def _escribir_fidelizacion(archivo, parametros, progreso):
+    monto_minimo, dias = parametros_fidelizacion(parametros)
+    reporte = reporte_fidelizacion(monto_minimo, dias)
+    if reporte.empty:
+        raise ValueError(f'No se encontraron clientes con compras del último mes >= ${monto_minimo:,.0f} COP')
+    libro_reporte_fidelizacion(reporte, monto_minimo).guardar(archivo)
+
+
+def _normalizar_fidelizacion(datos):
+    monto_minimo, dias = parametros_fidelizacion(datos)
+    return {'monto_minimo': str(monto_minimo), 'dias': dias}
+
+
+def _escritor_columnar(formato):
+    def escribir(archivo, parametros, progreso):
+        monto_minimo, dias = parametros_fidelizacion(parametros)
+        columnas, lotes = fuente_columnar(parametros['tabla'], monto_minimo, dias)
+        for fragmento in generar_columnar(formato, columnas, lotes):
+            archivo.write(fragmento)
+    return escribir
+
+
+def _normalizar_columnar(datos):
+    tabla = datos.get('tabla', 'clientes')
+    if tabla not in ('clientes', 'compras', 'fidelizacion'):
+        raise ValueError(f'Tabla no soportada: {tabla} (use clientes, compras o fidelizacion)')
+    if tabla == 'fidelizacion':
+        return {'tabla': tabla, **_normalizar_fidelizacion(datos)}
+    return {'tabla': tabla}
+
+
+# tipo -> extensión, content type, prefijo del nombre de descarga (texto o función de los
+# parámetros), escritor y normalizador de parámetros
+FORMATOS_EXPORTACION = {
+    'csv': {
+        'extension': '.csv',
+        'content_type': 'text/csv; charset=utf-8',
+        'prefijo': 'clientes_pandas_export',
+        'escribir': _escribir_csv,
+        'parametros': lambda datos: {},
+    },
+    'excel': {
+        'extension': '.xlsx',
+        'content_type': CONTENT_TYPE_EXCEL,
+        'prefijo': 'reporte_completo_pandas',
+        'escribir': _escribir_excel,
+        'parametros': lambda datos: {},
+    },
+    'txt': {
+        'extension': '.txt',
+        'content_type': 'text/plain; charset=utf-8',
+        'prefijo': 'clientes_reporte',
+        'escribir': _escribir_txt,
+        'parametros': lambda datos: {},
+    },
+    'fidelizacion': {
+        'extension': '.xlsx',
+        'content_type': CONTENT_TYPE_EXCEL,
+        'prefijo': 'reporte_fidelizacion_pandas',
+        'escribir': _escribir_fidelizacion,
+        'parametros': _normalizar_fidelizacion,
+    },
+    **{
+        formato: {
+            **FORMATOS_COLUMNARES[formato],
+            'prefijo': lambda parametros: parametros['tabla'],
+            'escribir': _escritor_columnar(formato),
+            'parametros': _normalizar_columnar,
+        }
+        for formato in FORMATOS_COLUMNARES
+    },
+}
+
+
+# === POOL DE TRABAJOS ===
+
+class PoolTrabajos:
+    """
+    Pool de hilos del proceso para las exportaciones.
+
+    Se crea al encolar el primer trabajo; un proceso hijo (fork) crea el suyo.
+    Con EXPORTACIONES_WORKERS = 0 los trabajos se ejecutan en el mismo hilo
+    que los solicita (útil en pruebas y depuración).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._executor = None
+
+    def enviar(self, trabajo_id):
+        workers = getattr(settings, 'EXPORTACIONES_WORKERS', 2)
+        if workers <= 0:
+            ejecutar_trabajo(trabajo_id)
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='exportacion')
+            self._executor.submit(self._ejecutar, trabajo_id)
+
+    @staticmethod
+    def _ejecutar(trabajo_id):
+        try:
+            ejecutar_trabajo(trabajo_id)
+        finally:
+            # Cada hilo del pool abre su propia conexión a la base
+            connections.close_all()
+
+
+pool_trabajos = PoolTrabajos()
+
+
+def directorio_exportaciones():
+    directorio = Path(getattr(settings, 'EXPORTACIONES_DIR', settings.BASE_DIR / 'exportaciones'))
+    directorio.mkdir(parents=True, exist_ok=True)
+    return directorio
+
+
+def ruta_archivo(trabajo):
+    return directorio_exportaciones() / trabajo.archivo
+
+
+def _abandonado(trabajo):
+    """Un trabajo activo sin avance reciente quedó huérfano (p. ej. el proceso se reinició)"""
+    limite = timedelta(seconds=getattr(settings, 'EXPORTACIONES_TRABAJO_VENCIDO', 600))
+    return trabajo.fecha_actualizacion < timezone.now() - limite
+
+
+def solicitar_exportacion(tipo, datos=None):
+    """
+    Retorna (trabajo, reutilizado) para exportar `tipo` con los parámetros `datos`.
+
+    Si ya existe un trabajo con la misma huella (parámetros y versión de los
+    datos) terminado con su archivo en disco, o todavía en curso, se retorna
+    ese trabajo; si no, se crea uno nuevo y se encola en el pool.
+    Lanza ValueError si el tipo no existe.
+    """
+    if tipo not in FORMATOS_EXPORTACION:
+        raise ValueError(f"Tipo de exportación no soportado: {tipo} (use {', '.join(FORMATOS_EXPORTACION)})")
+
+    parametros = FORMATOS_EXPORTACION[tipo]['parametros'](datos or {})
+    clave = _hash(tipo, parametros)
+    huella = _hash(clave, version_datos())
+
+    for trabajo in TrabajoExportacion.objects.filter(huella=huella, estado__in=('COMPLETADO', *ESTADOS_ACTIVOS)):
+        if trabajo.estado == 'COMPLETADO' and ruta_archivo(trabajo).exists():
+            return trabajo, True
+        if trabajo.estado in ESTADOS_ACTIVOS and not _abandonado(trabajo):
+            return trabajo, True
+        if trabajo.estado in ESTADOS_ACTIVOS:
+            _finalizar(trabajo.pk, estado='ERROR', mensaje_error='Trabajo abandonado sin terminar')
+
+    try:
+        # La restricción única de huella en los estados activos impide que dos
+        # solicitudes simultáneas creen dos trabajos iguales
+        with transaction.atomic():
+            trabajo = TrabajoExportacion.objects.create(tipo=tipo, parametros=parametros, clave=clave, huella=huella)
+    except IntegrityError:
+        # Otra solicitud creó el trabajo al mismo tiempo: se busca de nuevo
+        return solicitar_exportacion(tipo, datos)
+    pool_trabajos.enviar(trabajo.pk)
+    trabajo.refresh_from_db()
+    return trabajo, False
+
+
+# === EJECUCIÓN ===
+
+def _finalizar(trabajo_id, **campos):
+    TrabajoExportacion.objects.filter(pk=trabajo_id).update(
+        fecha_actualizacion=timezone.now(), fecha_fin=timezone.now(), **campos
+    )
+
+
+def ejecutar_trabajo(trabajo_id):
+    """
+    Genera el archivo de un trabajo pendiente informando el avance.
+    Cualquier falla deja el trabajo en ERROR con su mensaje: ninguna queda
+    solo en el Future descartado del pool.
+    """
+    try:
+        trabajo = _generar_archivo(trabajo_id)
+    except Exception as e:
+        TrabajoExportacion.objects.filter(pk=trabajo_id, estado__in=ESTADOS_ACTIVOS).update(
+            estado='ERROR', mensaje_error=str(e) or type(e).__name__,
+            fecha_actualizacion=timezone.now(), fecha_fin=timezone.now()
+        )
+        return
+    _vencer_anteriores(trabajo)
+
+
+def _generar_archivo(trabajo_id):
+    """
+    Escribe el archivo como .parcial y lo renombra al terminar, así nunca se
+    sirve un archivo incompleto. Retorna el trabajo completado.
+    """
+    trabajo = TrabajoExportacion.objects.get(pk=trabajo_id)
+    formato = FORMATOS_EXPORTACION[trabajo.tipo]
+    trabajo.archivo = f'{trabajo.pk}{formato["extension"]}'
+    prefijo = formato['prefijo'](trabajo.parametros) if callable(formato['prefijo']) else formato['prefijo']
+    trabajo.nombre_descarga = f'{prefijo}_{timezone.localdate().strftime("%Y%m%d")}{formato["extension"]}'
+    trabajo.estado = 'EN_PROCESO'
+    trabajo.save(update_fields=['archivo', 'nombre_descarga', 'estado', 'fecha_actualizacion'])
+
+    ruta = ruta_archivo(trabajo)
+    parcial = ruta.with_name(ruta.name + '.parcial')
+    avance = {'porcentaje': 0}
+
+    def progreso(fraccion):
+        # Solo se escribe en la base cuando cambia el porcentaje entero
+        porcentaje = min(int(fraccion * 100), 99)
+        if porcentaje > avance['porcentaje']:
+            avance['porcentaje'] = porcentaje
+            TrabajoExportacion.objects.filter(pk=trabajo_id).update(
+                progreso=porcentaje, fecha_actualizacion=timezone.now()
+            )
+
+    try:
+        with open(parcial, 'wb') as archivo:
+            formato['escribir'](archivo, trabajo.parametros, progreso)
+        os.replace(parcial, ruta)
+    finally:
+        parcial.unlink(missing_ok=True)
+
+    _finalizar(trabajo_id, estado='COMPLETADO', progreso=100, tamano=ruta.stat().st_size)
+    return trabajo
+
+
+def _vencer_anteriores(trabajo):
+    """
+    Los archivos de los mismos parámetros sobre versiones anteriores de los
+    datos ya no se reutilizan ni se descargan. Sus archivos se borran después
+    de EXPORTACIONES_RETENCION_VENCIDOS segundos, para no cortar las descargas
+    que ya estaban en curso.
+    """
+    TrabajoExportacion.objects.filter(
+        clave=trabajo.clave, estado='COMPLETADO'
+    ).exclude(huella=trabajo.huella).update(estado='VENCIDO', fecha_actualizacion=timezone.now())
+    _borrar_archivos_vencidos()
+
+
+def _borrar_archivos_vencidos():
+    retencion = timedelta(seconds=getattr(settings, 'EXPORTACIONES_RETENCION_VENCIDOS', 3600))
+    vencidos = TrabajoExportacion.objects.filter(
+        estado='VENCIDO', fecha_actualizacion__lt=timezone.now() - retencion
+    ).exclude(archivo='')
+    for vencido in vencidos:
+        # El archivo y sus copias comprimidas para descarga
+        for archivo in directorio_exportaciones().glob(f'{vencido.pk}.*'):
+            archivo.unlink(missing_ok=True)
+    vencidos.update(archivo='')
@@ -1,17 +1,29 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import views, views_async
+
+# Bajo ASGI las consultas de clientes usan las vistas asíncronas
+consultas = views_async if settings.VISTAS_ASINCRONAS else views
 
 app_name = 'clientes'
 
 urlpatterns = [
+    # Consulta de muchos documentos en una sola petición (antes de consulta/<str>/)
+    path('consulta/lote/', views.consultar_clientes_por_lote, name='consultar_clientes_por_lote'),
+    
     # Endpoint para consulta directa por número de documento
-    path('consulta/<str:numero_documento>/', views.consultar_cliente_por_documento, name='consultar_cliente_por_documento'),
+    path('consulta/<str:numero_documento>/', consultas.consultar_cliente_por_documento, name='consultar_cliente_por_documento'),
     
     # Endpoint para buscar clientes con parámetros
-    path('buscar/', views.buscar_cliente, name='buscar_cliente'),
+    path('buscar/', consultas.buscar_cliente, name='buscar_cliente'),
+    
+    # Aciertos y fallos de las cachés de perfiles, de reportes y de DataFrames
+    path('cache/estadisticas/', views.estadisticas_cache_perfiles, name='estadisticas_cache_perfiles'),
+    path('cache/reportes/estadisticas/', views.estadisticas_cache_reportes, name='estadisticas_cache_reportes'),
+    path('cache/dataframes/estadisticas/', views.estadisticas_cache_dataframes, name='estadisticas_cache_dataframes'),
     
     # Compras de un cliente específico
-    path('<int:cliente_id>/compras/', views.compras_cliente, name='compras_cliente'),
+    path('<int:cliente_id>/compras/', consultas.compras_cliente, name='compras_cliente'),
     
     # Estadísticas de un cliente
     path('<int:cliente_id>/estadisticas/', views.estadisticas_cliente, name='estadisticas_cliente'),
@@ -21,6 +33,13 @@ urlpatterns = [
     path('exportar/csv/', views.exportar_clientes_csv_pandas, name='exportar_csv'),
     path('exportar/excel/', views.exportar_clientes_excel_pandas, name='exportar_excel'),
     path('exportar/txt/', views.exportar_clientes_txt_pandas, name='exportar_txt'),
+    path('exportar/parquet/', views.exportar_parquet, name='exportar_parquet'),
+    path('exportar/arrow/', views.exportar_arrow, name='exportar_arrow'),
+    
+    # Exportaciones en segundo plano: solicitud, avance y descarga (con rangos)
+    path('exportaciones/', views.crear_trabajo_exportacion, name='solicitar_exportacion'),
+    path('exportaciones/<uuid:trabajo_id>/', views.estado_trabajo_exportacion, name='estado_exportacion'),
+    path('exportaciones/<uuid:trabajo_id>/descarga/', views.descargar_trabajo_exportacion, name='descargar_exportacion'),
     
     # CRUD básico para clientes
     path('', views.ClienteListView.as_view(), name='cliente_list'),
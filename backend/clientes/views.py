@@ -1,25 +1,113 @@
 from rest_framework import generics, status
 from rest_framework.decorators import api_view
+from rest_framework.pagination import PageNumberPagination
+from django.conf import settings
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
-from django.db.models import Q, Sum
-from django.http import HttpResponse
-from decimal import Decimal
-import openpyxl
-from openpyxl.styles import Font, Alignment, PatternFill
-from openpyxl.utils import get_column_letter
+from django.db.models import Count, Max, OuterRef, Q, Subquery, Sum
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, quote_etag
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from datetime import date
-import pandas as pd
-import json
-from .models import TipoDocumento, Cliente, Compra
+import hashlib
+import re
+from io import BytesIO
+from .models import TipoDocumento, Cliente, Compra, TrabajoExportacion
 from .serializers import (
     TipoDocumentoSerializer, 
     ClienteSerializer, 
     ClientePerfilSerializer,  # Serializer para consulta de perfil completo
     CompraSerializer,
-    CompraSimpleSerializer
+    CompraSimpleSerializer,
+    TrabajoExportacionSerializer
 )
-from .services_pandas import obtener_servicio_pandas
+from .services_pandas import cache_dataframes, obtener_servicio_pandas
+from .services_busqueda import filtrar_clientes
+from .cache_clientes import cache_perfiles
+from .cache_reportes import cache_reportes
+from .compresion import (
+    EXTENSIONES,
+    codificacion_aceptada,
+    comprimible,
+    respuesta_exportacion,
+    respuesta_precomprimida,
+)
+from .paginacion import PaginacionKeyset
+from .serializacion_rapida import FORMATO_CLIENTE, FORMATO_COMPRA_SIMPLE, FORMATO_PERFIL, RespuestaJSON
+from .exportacion import (
+    generar_csv_clientes,
+    generar_txt_clientes,
+    libro_excel_completo,
+    libro_reporte_fidelizacion,
+    reporte_fidelizacion,
+)
+from .exportacion_columnar import FORMATOS_COLUMNARES, fuente_columnar, generar_columnar
+from .trabajos_exportacion import (
+    CONTENT_TYPE_EXCEL,
+    FORMATOS_EXPORTACION,
+    parametros_fidelizacion,
+    ruta_archivo,
+    solicitar_exportacion,
+)
+from .importacion import en_bloques
+
+
+# === VALIDADORES HTTP (ETag) ===
+
+def _etag(*partes):
+    """ETag opaco a partir de los valores que determinan la respuesta"""
+    return hashlib.md5('|'.join(str(parte) for parte in partes).encode()).hexdigest()
+
+
+def consulta_version_cliente(con_compras=True, **filtro):
+    """
+    Fecha de actualización del cliente activo y, opcionalmente, la última
+    modificación y la cantidad de sus compras (el conteo detecta borrados).
+    Una sola consulta sobre índices, de a lo sumo una fila.
+    """
+    consulta = Cliente.objects.filter(activo=True, **filtro)
+    campos = ['id', 'fecha_actualizacion']
+    if con_compras:
+        consulta = consulta.annotate(
+            compras_actualizadas=Max('compras__fecha_actualizacion'),
+            cantidad_compras=Count('compras'),
+        )
+        campos += ['compras_actualizadas', 'cantidad_compras']
+    return consulta.values_list(*campos)[:1]
+
+
+def version_cliente(fila):
+    # edad y dias_desde_compra cambian con el día aunque la fila no cambie
+    return fila and (*fila, timezone.localdate())
+
+
+def _version_cliente(con_compras=True, **filtro):
+    """Versión del cliente para los ETag; None si el cliente no existe"""
+    return version_cliente(next(iter(consulta_version_cliente(con_compras, **filtro)), None))
+
+
+def etag_perfil(fila):
+    """
+    ETag del perfil por documento a partir de su fila. Se guarda en la caché
+    junto con el perfil, así un acierto responde (o devuelve 304) sin consultar
+    la base; cualquier cambio del cliente invalida la entrada.
+    """
+    return quote_etag(_etag('perfil', fila['id'], fila['fecha_actualizacion']))
+
+
+def respuesta_perfil(request, etag, construir):
+    """304 si el cliente ya tiene la versión `etag`; si no, `construir()`. Ambas con el ETag"""
+    respuesta = get_conditional_response(request, etag=etag) or construir()
+    respuesta.headers.setdefault('ETag', etag)
+    return respuesta
+
+
+def etag_cliente(request, pk=None, cliente_id=None):
+    version = _version_cliente(pk=pk or cliente_id)
+    return version and _etag(request.path, request.GET.urlencode(), *version)
 
 
 @api_view(['GET'])
@@ -34,25 +122,33 @@ def consultar_cliente_por_documento(request, numero_documento):
     - Correo
     - Teléfono
     
-    La consulta se hace directamente en la base de datos SQLite.
+    Los perfiles se sirven desde una caché en memoria (LRU con TTL) que se
+    invalida cuando cambia el cliente; solo los fallos consultan SQLite.
     
     URL: /api/clientes/consulta/{numero_documento}/
     """
-    try:
-        # Buscar cliente activo por número de documento
-        cliente = Cliente.objects.get(
-            numero_documento=numero_documento.strip(),
-            activo=True
+    numero_documento = numero_documento.strip()
+    
+    def cargar_perfil():
+        # Campos de ClientePerfilSerializer leídos con values()
+        fila, perfil = FORMATO_PERFIL.primero(
+            Cliente.objects.filter(numero_documento=numero_documento, activo=True),
+            adicionales=('id', 'fecha_actualizacion')
         )
+        return fila and (fila['id'], fila['numero_documento'], (etag_perfil(fila), perfil))
+    
+    try:
+        # Perfil y ETag desde la caché del proceso; la base solo se consulta en un fallo
+        entrada = cache_perfiles.obtener(('perfil', numero_documento), cargar_perfil)
+        if entrada is None:
+            raise Cliente.DoesNotExist
         
-        # Usar el serializer específico para consulta de perfil
-        serializer = ClientePerfilSerializer(cliente)
-        
-        return Response({
+        etag, perfil = entrada
+        return respuesta_perfil(request, etag, lambda: Response({
             'success': True,
-            'data': serializer.data,
+            'data': perfil,
             'message': 'Cliente encontrado exitosamente'
-        }, status=status.HTTP_200_OK)
+        }, status=status.HTTP_200_OK))
         
     except Cliente.DoesNotExist:
         return Response({
@@ -69,6 +165,74 @@ def consultar_cliente_por_documento(request, numero_documento):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['POST'])
+def consultar_clientes_por_lote(request):
+    """
+    Consulta varios clientes por número de documento en una sola petición.
+    
+    Cuerpo JSON:
+    - documentos: lista de números de documento, o de objetos
+      {"numero_documento": "...", "tipo_documento": "CC"} si se quiere validar el tipo
+    
+    Devuelve los perfiles encontrados (mismo formato de la consulta individual,
+    en el orden solicitado) y la lista de documentos no encontrados. Los
+    documentos se resuelven con consultas IN por bloques sobre el índice único.
+    
+    URL: /api/clientes/consulta/lote/
+    """
+    documentos = request.data.get('documentos') if isinstance(request.data, dict) else None
+    maximo = settings.CONSULTA_LOTE_MAX_DOCUMENTOS
+    
+    if not isinstance(documentos, list) or not documentos:
+        return Response({
+            'success': False,
+            'message': 'Se requiere "documentos": una lista de números de documento'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    if len(documentos) > maximo:
+        return Response({
+            'success': False,
+            'message': f'Máximo {maximo} documentos por consulta (recibidos: {len(documentos)})'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    # numero_documento -> código de tipo esperado (None si no se especifica)
+    solicitados = {}
+    for documento in documentos:
+        if isinstance(documento, dict):
+            numero = str(documento.get('numero_documento') or '').strip()
+            tipo = str(documento.get('tipo_documento') or '').strip().upper() or None
+        else:
+            numero, tipo = str(documento).strip(), None
+        if numero:
+            solicitados.setdefault(numero, tipo)
+    
+    # Campos del modelo que alimentan cada campo de ClientePerfilSerializer
+    campos_perfil = {
+        nombre: campo.source for nombre, campo in ClientePerfilSerializer().fields.items()
+    }
+    
+    encontrados = {}
+    for bloque in en_bloques(solicitados):
+        filas = Cliente.objects.filter(
+            numero_documento__in=bloque,
+            activo=True
+        ).values('tipo_documento__codigo', *set(campos_perfil.values()))
+        for fila in filas:
+            tipo = solicitados[fila['numero_documento']]
+            if tipo is None or tipo == fila['tipo_documento__codigo']:
+                encontrados[fila['numero_documento']] = {
+                    nombre: fila[fuente] for nombre, fuente in campos_perfil.items()
+                }
+    
+    return Response({
+        'success': True,
+        'data': [encontrados[numero] for numero in solicitados if numero in encontrados],
+        'no_encontrados': [numero for numero in solicitados if numero not in encontrados],
+        'total_solicitados': len(solicitados),
+        'total_encontrados': len(encontrados),
+    }, status=status.HTTP_200_OK)
+
+
 @api_view(['GET'])
 def buscar_cliente(request):
     """
@@ -86,22 +250,27 @@ def buscar_cliente(request):
             'error': 'Se requieren los parámetros tipo_documento y numero_documento'
         }, status=status.HTTP_400_BAD_REQUEST)
     
-    try:
-        # Buscar tipo de documento
-        tipo_documento = TipoDocumento.objects.get(
-            codigo=tipo_documento_codigo.upper(),
-            activo=True
-        )
-        
-        # Buscar cliente
-        cliente = Cliente.objects.get(
-            tipo_documento=tipo_documento,
-            numero_documento=numero_documento.strip(),
+    tipo_documento_codigo = tipo_documento_codigo.upper()
+    numero_documento = numero_documento.strip()
+    
+    def cargar_cliente():
+        # Cliente y tipo de documento en una sola consulta, con la salida de ClienteSerializer
+        fila, datos = FORMATO_CLIENTE.primero(Cliente.objects.filter(
+            tipo_documento__codigo=tipo_documento_codigo,
+            tipo_documento__activo=True,
+            numero_documento=numero_documento,
             activo=True
-        )
+        ))
+        return fila and (fila['id'], fila['numero_documento'], datos)
+    
+    try:
+        datos = cache_perfiles.obtener(('cliente', tipo_documento_codigo, numero_documento), cargar_cliente)
+        if datos is not None:
+            return Response(datos)
         
-        serializer = ClienteSerializer(cliente)
-        return Response(serializer.data)
+        # Solo en un fallo se distingue tipo de documento inválido de cliente inexistente
+        TipoDocumento.objects.get(codigo=tipo_documento_codigo, activo=True)
+        raise Cliente.DoesNotExist
         
     except TipoDocumento.DoesNotExist:
         return Response({
@@ -114,23 +283,61 @@ def buscar_cliente(request):
         }, status=status.HTTP_404_NOT_FOUND)
 
 
+@api_view(['GET'])
+def estadisticas_cache_perfiles(request):
+    """
+    Aciertos, fallos, expulsiones e invalidaciones de la caché de perfiles
+    del proceso que atiende la petición (para dimensionar CACHE_PERFILES_*).
+    """
+    return Response(cache_perfiles.estadisticas())
+
+
+@api_view(['GET'])
+def estadisticas_cache_reportes(request):
+    """
+    Aciertos, fallos, expulsiones, invalidaciones por cambio de datos y bytes
+    ocupados de la caché de reportes del proceso (para dimensionar CACHE_REPORTES_MAX_BYTES).
+    """
+    return Response(cache_reportes.estadisticas())
+
+
+@api_view(['GET'])
+def estadisticas_cache_dataframes(request):
+    """
+    Versión de los datos, columnas y derivados en memoria con sus bytes, aciertos,
+    cargas, expulsiones y refrescos de la instantánea de DataFrames del proceso
+    (para dimensionar CACHE_DATAFRAMES_MAX_BYTES).
+    """
+    return Response(cache_dataframes.estadisticas())
+
+
+@condition(etag_func=etag_cliente)
 @api_view(['GET'])
 def compras_cliente(request, cliente_id):
     """
-    Obtiene todas las compras de un cliente específico.
+    Obtiene todas las compras de un cliente específico, de la más reciente
+    a la más antigua, paginadas por cursor (?cursor=, ?page_size=, ?incluir_total=1).
     """
     cliente = get_object_or_404(Cliente, id=cliente_id, activo=True)
     
     compras = Compra.objects.filter(
         cliente=cliente
-    ).order_by('-fecha_compra')
+    ).order_by('-fecha_compra', '-id')
     
     # Aplicar filtros opcionales
     estado = request.GET.get('estado')
     if estado:
         compras = compras.filter(estado=estado)
     
-    # Paginación
+    # Filas de values() con la salida de CompraSimpleSerializer
+    compras = FORMATO_COMPRA_SIMPLE.consulta(compras)
+    
+    # Paginación por cursor; ?page= conserva la paginación por número anterior
+    if 'page' not in request.GET or 'cursor' in request.GET:
+        paginador = PaginacionKeyset(ordering=('-fecha_compra', '-id'), page_size=10)
+        compras_page = paginador.paginate_queryset(compras, request)
+        return RespuestaJSON(paginador.datos_paginados(FORMATO_COMPRA_SIMPLE.convertir(compras_page)))
+    
     page_size = int(request.GET.get('page_size', 10))
     page = int(request.GET.get('page', 1))
     
@@ -140,10 +347,8 @@ def compras_cliente(request, cliente_id):
     compras_page = compras[start:end]
     total_count = compras.count()
     
-    serializer = CompraSimpleSerializer(compras_page, many=True)
-    
-    return Response({
-        'results': serializer.data,
+    return RespuestaJSON({
+        'results': FORMATO_COMPRA_SIMPLE.convertir(compras_page),
         'count': total_count,
         'page': page,
         'page_size': page_size,
@@ -162,51 +367,78 @@ class TipoDocumentoListView(generics.ListAPIView):
 class ClienteListView(generics.ListAPIView):
     """
     Lista todos los clientes con filtros opcionales.
+    
+    Parámetros: search, ciudad, departamento y orden (relevancia | recientes).
+    Paginación por cursor sobre (fecha_registro, id); los resultados por
+    relevancia no tienen clave de orden indexable y se paginan por número.
     """
     queryset = Cliente.objects.filter(activo=True)
     serializer_class = ClienteSerializer
+    pagination_class = PaginacionKeyset
+    ordering = ('-fecha_registro', '-id')
+    
+    def ordena_por_relevancia(self):
+        return bool(self.request.GET.get('search')) and self.request.GET.get('orden') != 'recientes'
+    
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            self._paginator = PageNumberPagination() if self.ordena_por_relevancia() else PaginacionKeyset()
+        return self._paginator
+    
+    def list(self, request, *args, **kwargs):
+        # Filas de values() con la salida de ClienteSerializer (incluidos ?fields= / ?expand=)
+        seleccion = FORMATO_CLIENTE.seleccion(request)
+        queryset = FORMATO_CLIENTE.consulta(
+            self.filter_queryset(self.get_queryset()), seleccion, adicionales=('fecha_registro', 'id')
+        )
+        page = self.paginate_queryset(queryset)
+        return RespuestaJSON(self.get_paginated_response(FORMATO_CLIENTE.convertir(page, seleccion)).data)
     
     def get_queryset(self):
-        queryset = super().get_queryset()
-        
-        # Filtros opcionales
-        ciudad = self.request.GET.get('ciudad')
-        if ciudad:
-            queryset = queryset.filter(ciudad__icontains=ciudad)
-        
-        departamento = self.request.GET.get('departamento')
-        if departamento:
-            queryset = queryset.filter(departamento__icontains=departamento)
-        
-        search = self.request.GET.get('search')
-        if search:
-            queryset = queryset.filter(
-                Q(primer_nombre__icontains=search) |
-                Q(primer_apellido__icontains=search) |
-                Q(numero_documento__icontains=search) |
-                Q(correo__icontains=search)
-            )
-        
-        return queryset.order_by('-fecha_registro')
+        queryset = super().get_queryset().order_by(*self.ordering)
+        
+        # Filtros opcionales sobre el índice de texto completo (sin tildes ni mayúsculas,
+        # por prefijo). Con búsqueda se ordena por relevancia salvo ?orden=recientes
+        return filtrar_clientes(
+            queryset,
+            texto=self.request.GET.get('search', ''),
+            ciudad=self.request.GET.get('ciudad', ''),
+            departamento=self.request.GET.get('departamento', ''),
+            por_relevancia=self.ordena_por_relevancia(),
+        )
 
 
+@method_decorator(condition(etag_func=etag_cliente), name='dispatch')
 class ClienteDetailView(generics.RetrieveAPIView):
     """
     Detalle de un cliente específico.
+    Responde 304 si el ETag enviado en If-None-Match sigue vigente.
     """
-    queryset = Cliente.objects.filter(activo=True)
+    queryset = Cliente.objects.filter(activo=True).select_related('tipo_documento')
     serializer_class = ClienteSerializer
 
 
+def queryset_compras_con_cliente(queryset, request):
+    """Carga cliente y tipo de documento en el mismo JOIN solo si la respuesta los incluye"""
+    if CompraSerializer.incluye_campo(request, 'cliente'):
+        return queryset.select_related('cliente__tipo_documento')
+    return queryset
+
+
 class CompraListView(generics.ListAPIView):
     """
     Lista todas las compras con filtros opcionales.
+    Paginación por cursor sobre (fecha_compra, id).
+    Campos dispersos con ?fields= y ?expand=cliente (ver CamposDinamicosMixin).
     """
     queryset = Compra.objects.all()
     serializer_class = CompraSerializer
+    pagination_class = PaginacionKeyset
+    ordering = ('-fecha_compra', '-id')
     
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = queryset_compras_con_cliente(super().get_queryset(), self.request)
         
         # Filtros opcionales
         estado = self.request.GET.get('estado')
@@ -217,42 +449,81 @@ class CompraListView(generics.ListAPIView):
         if metodo_pago:
             queryset = queryset.filter(metodo_pago=metodo_pago)
         
-        return queryset.order_by('-fecha_compra')
+        return queryset.order_by(*self.ordering)
 
 
 class CompraDetailView(generics.RetrieveAPIView):
     """
-    Detalle de una compra específica.
+    Detalle de una compra específica (admite ?fields= y ?expand=cliente).
     """
     queryset = Compra.objects.all()
     serializer_class = CompraSerializer
+    
+    def get_queryset(self):
+        return queryset_compras_con_cliente(super().get_queryset(), self.request)
 
 
+@condition(etag_func=etag_cliente)
 @api_view(['GET'])
 def estadisticas_cliente(request, cliente_id):
     """
     Obtiene estadísticas de un cliente específico.
+    
+    El cliente, los conteos y montos por estado, canal y método de pago, y
+    los ids de la primera y la última compra salen de una sola consulta con
+    agregación condicional; una segunda consulta trae esas dos compras.
     """
-    cliente = get_object_or_404(Cliente, id=cliente_id, activo=True)
+    desglose = {
+        'por_estado': ('estado', Compra.ESTADO_CHOICES),
+        'por_canal': ('canal_venta', Compra.CANAL_VENTA_CHOICES),
+        'por_metodo_pago': ('metodo_pago', Compra.METODO_PAGO_CHOICES),
+    }
+    compras_del_cliente = Compra.objects.filter(cliente_id=OuterRef('pk'))
     
-    compras = cliente.compras.all()
+    anotaciones = {
+        'cantidad_compras': Count('compras'),
+        'id_compra_reciente': Subquery(
+            compras_del_cliente.order_by('-fecha_compra', '-id').values('id')[:1]
+        ),
+        'id_compra_antigua': Subquery(
+            compras_del_cliente.order_by('fecha_compra', 'id').values('id')[:1]
+        ),
+    }
+    for nombre, (campo, opciones) in desglose.items():
+        for codigo, _ in opciones:
+            condicion = Q(**{f'compras__{campo}': codigo})
+            anotaciones[f'{nombre}_{codigo}_cantidad'] = Count('compras', filter=condicion)
+            anotaciones[f'{nombre}_{codigo}_monto'] = Sum('compras__total', filter=condicion)
+    
+    cliente = get_object_or_404(
+        Cliente.objects.select_related('tipo_documento').annotate(**anotaciones),
+        id=cliente_id,
+        activo=True
+    )
     
     estadisticas = {
         'cliente': ClienteSerializer(cliente).data,
-        'total_compras': compras.count(),
-        'compras_completadas': compras.filter(estado='COMPLETADA').count(),
-        'compras_pendientes': compras.filter(estado='PENDIENTE').count(),
+        'total_compras': cliente.cantidad_compras,
+        'compras_completadas': getattr(cliente, 'por_estado_COMPLETADA_cantidad'),
+        'compras_pendientes': getattr(cliente, 'por_estado_PENDIENTE_cantidad'),
         'monto_total': float(cliente.total_compras),
         'compra_mas_reciente': None,
         'compra_mas_antigua': None,
     }
     
-    if compras.exists():
-        compra_reciente = compras.order_by('-fecha_compra').first()
-        compra_antigua = compras.order_by('fecha_compra').first()
-        
-        estadisticas['compra_mas_reciente'] = CompraSimpleSerializer(compra_reciente).data
-        estadisticas['compra_mas_antigua'] = CompraSimpleSerializer(compra_antigua).data
+    for nombre, (campo, opciones) in desglose.items():
+        estadisticas[nombre] = {
+            codigo: {
+                'cantidad': getattr(cliente, f'{nombre}_{codigo}_cantidad'),
+                'monto': float(getattr(cliente, f'{nombre}_{codigo}_monto') or 0),
+            }
+            for codigo, _ in opciones
+        }
+    
+    if cliente.cantidad_compras:
+        compras = Compra.objects.order_by().in_bulk([cliente.id_compra_reciente, cliente.id_compra_antigua])
+        estadisticas['compra_mas_reciente'] = CompraSimpleSerializer(compras[cliente.id_compra_reciente]).data
+        estadisticas['compra_mas_antigua'] = CompraSimpleSerializer(compras[cliente.id_compra_antigua]).data
     
     return Response(estadisticas)
 
@@ -264,6 +535,7 @@ def reporte_fidelizacion_excel(request):
     
     Criterios:
     - Clientes con compras del último mes >= $5,000,000 COP
+      (parámetros opcionales: monto_minimo y dias, por defecto 30 días)
     - Datos básicos del cliente + monto total último mes
     - Ordenados por monto de mayor a menor
     - AUTOMATIZADO CON PANDAS para mejor performance y análisis
@@ -271,142 +543,42 @@ def reporte_fidelizacion_excel(request):
     URL: /api/clientes/reporte/fidelizacion/
     """
     try:
-        from datetime import datetime, timedelta
-        
-        # Obtener parámetro opcional de monto mínimo
-        monto_minimo_param = request.GET.get('monto_minimo', '5000000')
-        try:
-            monto_minimo = Decimal(monto_minimo_param)
-        except (ValueError, TypeError):
-            monto_minimo = Decimal('5000000')  # Default: 5 millones
-        
-        # === PROCESAMIENTO CON PANDAS ===
+        # Monto mínimo (por defecto 5 millones) y ventana en días (por defecto 30),
+        # misma definición que Cliente.obtener_candidatos_fidelizacion
+        monto_minimo, dias = parametros_fidelizacion(request.GET)
         
-        # Calcular fecha del último mes (últimos 30 días)
-        fecha_limite = datetime.now() - timedelta(days=30)
+        # === PROCESAMIENTO AGRUPADO EN BASE DE DATOS ===
         
-        # Obtener datos de clientes y compras
-        clientes_data = Cliente.objects.select_related('tipo_documento').values(
-            'id', 'primer_nombre', 'segundo_nombre', 'primer_apellido', 'segundo_apellido', 
-            'correo', 'telefono', 'direccion', 'ciudad', 'departamento', 
-            'tipo_documento__nombre', 'numero_documento', 'fecha_registro', 'activo'
-        )
-        
-        # Filtrar compras del último mes
-        compras_data = Compra.objects.filter(
-            estado__in=['COMPLETADA', 'ENTREGADA'],
-            fecha_compra__gte=fecha_limite
-        ).select_related('cliente').values(
-            'cliente_id', 'total', 'fecha_compra', 'estado'
-        )
-        
-        # Convertir a DataFrames de pandas
-        df_clientes = pd.DataFrame(list(clientes_data))
-        df_compras = pd.DataFrame(list(compras_data))
-        
-        if df_clientes.empty:
+        if not Cliente.objects.exists():
             return Response({
                 'success': False,
                 'message': f'No se encontraron clientes en el sistema'
             }, status=status.HTTP_404_NOT_FOUND)
         
-        if df_compras.empty:
-            return Response({
-                'success': False,
-                'message': f'No se encontraron compras del último mes'
-            }, status=status.HTTP_404_NOT_FOUND)
+        def generar_libro():
+            reporte = reporte_fidelizacion(monto_minimo, dias)
+            if reporte.empty:
+                return None
+            # Libro de solo escritura con la información del reporte al final
+            with libro_reporte_fidelizacion(reporte, monto_minimo).guardar() as archivo:
+                return archivo.read()
         
-        # Procesar con pandas - Agrupar compras por cliente del último mes
-        df_compras['total'] = df_compras['total'].astype(float)
-        compras_mes = df_compras.groupby('cliente_id').agg({
-            'total': ['sum', 'count'],
-            'fecha_compra': 'max'
-        }).round(2)
+        # El archivo se reutiliza mientras no cambien los parámetros ni los datos
+        contenido = cache_reportes.obtener('fidelizacion', (str(monto_minimo), dias), generar_libro)
         
-        # Aplanar columnas multinivel
-        compras_mes.columns = ['total_ultimo_mes', 'cantidad_compras_mes', 'ultima_compra']
-        compras_mes = compras_mes.reset_index()
-        
-        # Filtrar por monto mínimo usando pandas
-        candidatos_df = compras_mes[compras_mes['total_ultimo_mes'] >= float(monto_minimo)]
-        
-        if candidatos_df.empty:
+        if contenido is None:
             return Response({
                 'success': False,
                 'message': f'No se encontraron clientes con compras del último mes >= ${monto_minimo:,.0f} COP'
             }, status=status.HTTP_404_NOT_FOUND)
         
-        # Combinar con datos de clientes usando pandas merge
-        reporte_df = pd.merge(candidatos_df, df_clientes, left_on='cliente_id', right_on='id')
-        
-        # Crear columna de nombre completo
-        reporte_df['nombre_completo'] = (
-            reporte_df['primer_nombre'].fillna('') + ' ' + 
-            reporte_df['segundo_nombre'].fillna('') + ' ' +
-            reporte_df['primer_apellido'].fillna('') + ' ' +
-            reporte_df['segundo_apellido'].fillna('')
-        ).str.replace('  ', ' ').str.strip()
-        
-        # Ordenar por monto del último mes (mayor a menor)
-        reporte_final = reporte_df.sort_values('total_ultimo_mes', ascending=False)
-        
-        # === GENERAR EXCEL SIMPLIFICADO ===
-        
-        # Preparar DataFrame para exportación
-        df_exportar = reporte_final[[
-            'cliente_id', 'tipo_documento__nombre', 'numero_documento',
-            'nombre_completo', 'correo', 'telefono', 'ciudad', 'departamento',
-            'total_ultimo_mes', 'cantidad_compras_mes', 'ultima_compra'
-        ]].copy()
-        
-        # Renombrar columnas
-        df_exportar.columns = [
-            'ID Cliente', 'Tipo Documento', 'Número Documento',
-            'Nombre Completo', 'Email', 'Teléfono', 'Ciudad', 'Departamento',
-            'Total Último Mes (COP)', 'Cantidad Compras', 'Última Compra'
-        ]
-        
-        # Formatear fechas y montos
-        df_exportar['Última Compra'] = pd.to_datetime(df_exportar['Última Compra']).dt.strftime('%d/%m/%Y')
-        df_exportar['Total Último Mes (COP)'] = df_exportar['Total Último Mes (COP)'].apply(lambda x: f"${x:,.0f}")
-        
-        # Crear respuesta HTTP para Excel
-        response = HttpResponse(
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
         timestamp = date.today().strftime('%Y%m%d')
-        filename = f'reporte_fidelizacion_pandas_{timestamp}.xlsx'
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        
-        # Usar pandas ExcelWriter para generar el archivo
-        with pd.ExcelWriter(response, engine='openpyxl') as writer:
-            # Escribir datos principales
-            df_exportar.to_excel(writer, sheet_name='Reporte Fidelización', index=False)
-            
-            # Obtener worksheet para agregar información adicional
-            worksheet = writer.sheets['Reporte Fidelización']
-            
-            # Agregar información del reporte al final
-            info_row = len(df_exportar) + 3
-            worksheet[f'A{info_row}'] = f"Reporte generado: {date.today().strftime('%d/%m/%Y')}"
-            worksheet[f'A{info_row + 1}'] = f"Criterio mínimo: ${monto_minimo:,.0f} COP"
-            worksheet[f'A{info_row + 2}'] = f"Total candidatos: {len(df_exportar)}"
-            worksheet[f'A{info_row + 3}'] = "Procesado automáticamente con Pandas"
-            
-            # Ajustar ancho de columnas
-            for column in worksheet.columns:
-                max_length = 0
-                column_letter = column[0].column_letter
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                adjusted_width = min(max_length + 2, 50)
-                worksheet.column_dimensions[column_letter].width = adjusted_width
-        
-        return response
+        return FileResponse(
+            BytesIO(contenido),
+            as_attachment=True,
+            filename=f'reporte_fidelizacion_pandas_{timestamp}.xlsx',
+            content_type=CONTENT_TYPE_EXCEL
+        )
         
     except Exception as e:
         return Response({
@@ -421,61 +593,23 @@ def reporte_fidelizacion_excel(request):
 def exportar_clientes_csv_pandas(request):
     """
     Exporta todos los clientes a CSV usando Pandas para automatización.
-    Incluye análisis automático y estadísticas.
+    
+    El archivo se transmite por fragmentos: los clientes se leen por lotes
+    (paginación keyset) y cada lote se formatea vectorizado con Pandas, así
+    la memoria del worker no crece con el tamaño de la tabla.
     """
     try:
-        # Obtener datos usando pandas
-        clientes_data = Cliente.objects.select_related('tipo_documento').values(
-            'id', 'primer_nombre', 'segundo_nombre', 'primer_apellido', 'segundo_apellido',
-            'correo', 'telefono', 'direccion', 'ciudad', 'departamento', 
-            'tipo_documento__nombre', 'numero_documento', 'fecha_registro', 'activo'
-        )
-        
-        # Convertir a DataFrame de pandas
-        df_clientes = pd.DataFrame(list(clientes_data))
-        
-        if df_clientes.empty:
+        if not Cliente.objects.exists():
             return Response({
                 'success': False,
                 'message': 'No hay clientes para exportar'
             }, status=status.HTTP_404_NOT_FOUND)
         
-        # Formatear datos con pandas
-        df_clientes['nombre_completo'] = (
-            df_clientes['primer_nombre'].fillna('') + ' ' + 
-            df_clientes['segundo_nombre'].fillna('') + ' ' +
-            df_clientes['primer_apellido'].fillna('') + ' ' +
-            df_clientes['segundo_apellido'].fillna('')
-        ).str.replace('  ', ' ').str.strip()
-        df_clientes['fecha_registro'] = pd.to_datetime(df_clientes['fecha_registro']).dt.strftime('%d/%m/%Y')
-        df_clientes['estado'] = df_clientes['activo'].map({True: 'Activo', False: 'Inactivo'})
-        
-        # Seleccionar columnas para exportación
-        columnas_export = [
-            'id', 'tipo_documento__nombre', 'numero_documento', 
-            'nombre_completo', 'correo', 'telefono', 'direccion',
-            'ciudad', 'departamento', 'fecha_registro', 'estado'
-        ]
-        
-        df_export = df_clientes[columnas_export].copy()
-        
-        # Renombrar columnas
-        df_export.columns = [
-            'ID', 'Tipo Documento', 'Número Documento',
-            'Nombre Completo', 'Email', 'Teléfono', 'Dirección',
-            'Ciudad', 'Departamento', 'Fecha Registro', 'Estado'
-        ]
-        
-        # Crear respuesta CSV con pandas
-        response = HttpResponse(content_type='text/csv; charset=utf-8')
         timestamp = date.today().strftime('%Y%m%d')
-        filename = f'clientes_pandas_export_{timestamp}.csv'
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        
-        # Exportar a CSV usando pandas
-        df_export.to_csv(response, index=False, encoding='utf-8')
-        
-        return response
+        return respuesta_exportacion(
+            request, 'clientes_csv', generar_csv_clientes,
+            'text/csv; charset=utf-8', f'clientes_pandas_export_{timestamp}.csv'
+        )
         
     except Exception as e:
         return Response({
@@ -489,163 +623,24 @@ def exportar_clientes_excel_pandas(request):
     """
     Exporta clientes a Excel con múltiples hojas usando Pandas.
     Incluye análisis automático, estadísticas y gráficos.
+    
+    La hoja de clientes se escribe por lotes en un libro de solo escritura y
+    los análisis salen de consultas agregadas; el archivo se arma en disco.
     """
     try:
-        # Obtener datos
-        clientes_data = Cliente.objects.select_related('tipo_documento').values(
-            'id', 'primer_nombre', 'segundo_nombre', 'primer_apellido', 'segundo_apellido',
-            'correo', 'telefono', 'direccion', 'ciudad', 'departamento', 
-            'tipo_documento__nombre', 'numero_documento', 'fecha_registro', 'activo'
-        )
-        
-        compras_data = Compra.objects.select_related('cliente').values(
-            'cliente_id', 'total', 'fecha_compra', 'estado'
-        )
-        
-        # Convertir a DataFrames
-        df_clientes = pd.DataFrame(list(clientes_data))
-        df_compras = pd.DataFrame(list(compras_data))
-        
-        if df_clientes.empty:
+        if not Cliente.objects.exists():
             return Response({
                 'success': False,
                 'message': 'No hay datos para exportar'
             }, status=status.HTTP_404_NOT_FOUND)
         
-        # Preparar respuesta Excel
-        response = HttpResponse(
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
         timestamp = date.today().strftime('%Y%m%d')
-        filename = f'reporte_completo_pandas_{timestamp}.xlsx'
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        
-        # Crear Excel con múltiples hojas usando pandas
-        with pd.ExcelWriter(response, engine='openpyxl') as writer:
-            
-            # === HOJA 1: CLIENTES ===
-            df_clientes_formatted = df_clientes.copy()
-            df_clientes_formatted['nombre_completo'] = (
-                df_clientes_formatted['primer_nombre'].fillna('') + ' ' + 
-                df_clientes_formatted['segundo_nombre'].fillna('') + ' ' +
-                df_clientes_formatted['primer_apellido'].fillna('') + ' ' +
-                df_clientes_formatted['segundo_apellido'].fillna('')
-            ).str.replace('  ', ' ').str.strip()
-            # Convertir fecha a naive datetime sin timezone
-            df_clientes_formatted['fecha_registro'] = pd.to_datetime(df_clientes_formatted['fecha_registro']).dt.tz_localize(None).dt.strftime('%d/%m/%Y')
-            df_clientes_formatted['estado'] = df_clientes_formatted['activo'].map({True: 'Activo', False: 'Inactivo'})
-            
-            # Seleccionar columnas
-            clientes_export = df_clientes_formatted[[
-                'id', 'tipo_documento__nombre', 'numero_documento',
-                'nombre_completo', 'correo', 'telefono', 'ciudad',
-                'departamento', 'fecha_registro', 'estado'
-            ]].copy()
-            
-            clientes_export.columns = [
-                'ID', 'Tipo Documento', 'Número Documento',
-                'Nombre Completo', 'Email', 'Teléfono', 'Ciudad',
-                'Departamento', 'Fecha Registro', 'Estado'
-            ]
-            
-            clientes_export.to_excel(writer, sheet_name='Clientes', index=False)
-            
-            # === HOJA 2: ANÁLISIS POR TIPO DOCUMENTO ===
-            if not df_clientes.empty:
-                # Usar copia original para análisis de fechas
-                df_clientes_analisis = df_clientes.copy()
-                df_clientes_analisis['fecha_registro'] = pd.to_datetime(df_clientes_analisis['fecha_registro']).dt.tz_localize(None)
-                
-                analisis_tipos = df_clientes_analisis.groupby('tipo_documento__nombre').agg({
-                    'id': 'count',
-                    'fecha_registro': ['min', 'max'],
-                    'activo': lambda x: (x == True).sum()
-                }).round(2)
-                
-                analisis_tipos.columns = ['Cantidad_Total', 'Primer_Registro', 'Último_Registro', 'Clientes_Activos']
-                analisis_tipos = analisis_tipos.reset_index()
-                analisis_tipos.columns = ['Tipo Documento', 'Cantidad Total', 'Primer Registro', 'Último Registro', 'Clientes Activos']
-                
-                analisis_tipos.to_excel(writer, sheet_name='Análisis Tipos Doc', index=False)
-            
-            # === HOJA 3: ANÁLISIS DE COMPRAS ===
-            if not df_compras.empty:
-                df_compras['total'] = df_compras['total'].astype(float)
-                # Convertir fecha a naive datetime sin timezone
-                df_compras['fecha_compra'] = pd.to_datetime(df_compras['fecha_compra']).dt.tz_localize(None)
-                
-                # Análisis por estado
-                analisis_estados = df_compras.groupby('estado').agg({
-                    'total': ['sum', 'mean', 'count'],
-                    'fecha_compra': ['min', 'max']
-                }).round(2)
-                
-                analisis_estados.columns = ['Monto_Total', 'Monto_Promedio', 'Cantidad', 'Fecha_Min', 'Fecha_Max']
-                analisis_estados = analisis_estados.reset_index()
-                analisis_estados.to_excel(writer, sheet_name='Análisis Compras', index=False)
-                
-                # Top clientes
-                top_clientes = df_compras.groupby('cliente_id').agg({
-                    'total': ['sum', 'count'],
-                    'fecha_compra': ['min', 'max']
-                }).round(2)
-                
-                top_clientes.columns = ['Monto_Total', 'Cantidad_Compras', 'Primera_Compra', 'Última_Compra']
-                top_clientes = top_clientes.reset_index().sort_values('Monto_Total', ascending=False).head(20)
-                top_clientes.to_excel(writer, sheet_name='Top 20 Clientes', index=False)
-            
-            # === HOJA 4: ESTADÍSTICAS GENERALES ===
-            estadisticas = {
-                'Métrica': [
-                    'Total Clientes',
-                    'Clientes Activos',
-                    'Clientes Inactivos',
-                    'Tipos de Documento',
-                    'Ciudades Diferentes',
-                    'Departamentos Diferentes'
-                ],
-                'Valor': [
-                    len(df_clientes),
-                    len(df_clientes[df_clientes['activo'] == True]),
-                    len(df_clientes[df_clientes['activo'] == False]),
-                    df_clientes['tipo_documento__nombre'].nunique(),
-                    df_clientes['ciudad'].nunique(),
-                    df_clientes['departamento'].nunique()
-                ]
-            }
-            
-            if not df_compras.empty:
-                estadisticas['Métrica'].extend([
-                    'Total Compras',
-                    'Monto Total Ventas',
-                    'Ticket Promedio',
-                    'Cliente Más Activo (Compras)'
-                ])
-                estadisticas['Valor'].extend([
-                    len(df_compras),
-                    f"${df_compras['total'].sum():,.0f}",
-                    f"${df_compras['total'].mean():,.0f}",
-                    df_compras['cliente_id'].mode().iloc[0] if not df_compras['cliente_id'].mode().empty else 'N/A'
-                ])
-            
-            df_stats = pd.DataFrame(estadisticas)
-            df_stats.to_excel(writer, sheet_name='Estadísticas', index=False)
-            
-            # Ajustar anchos de columnas
-            for sheet_name, sheet in writer.sheets.items():
-                for column in sheet.columns:
-                    max_length = 0
-                    column_letter = column[0].column_letter
-                    for cell in column:
-                        try:
-                            if len(str(cell.value)) > max_length:
-                                max_length = len(str(cell.value))
-                        except:
-                            pass
-                    adjusted_width = min(max_length + 2, 50)
-                    sheet.column_dimensions[column_letter].width = adjusted_width
-        
-        return response
+        return FileResponse(
+            libro_excel_completo().guardar(),
+            as_attachment=True,
+            filename=f'reporte_completo_pandas_{timestamp}.xlsx',
+            content_type=CONTENT_TYPE_EXCEL
+        )
         
     except Exception as e:
         return Response({
@@ -658,94 +653,231 @@ def exportar_clientes_excel_pandas(request):
 def exportar_clientes_txt_pandas(request):
     """
     Exporta clientes a archivo TXT con formato estructurado usando Pandas.
+
+    El reporte se transmite por fragmentos: las estadísticas del encabezado
+    salen de una consulta agregada y las fichas se arman por lotes con
+    operaciones de texto vectorizadas.
     """
     try:
-        # Obtener datos
-        clientes_data = Cliente.objects.select_related('tipo_documento').values(
-            'id', 'primer_nombre', 'segundo_nombre', 'primer_apellido', 'segundo_apellido',
-            'correo', 'telefono', 'direccion', 'ciudad', 'departamento', 
-            'tipo_documento__nombre', 'numero_documento', 'fecha_registro', 'activo'
-        )
-        
-        # Convertir a DataFrame
-        df_clientes = pd.DataFrame(list(clientes_data))
-        
-        if df_clientes.empty:
+        if not Cliente.objects.exists():
             return Response({
                 'success': False,
                 'message': 'No hay clientes para exportar'
             }, status=status.HTTP_404_NOT_FOUND)
         
-        # Crear respuesta TXT
-        response = HttpResponse(content_type='text/plain; charset=utf-8')
         timestamp = date.today().strftime('%Y%m%d')
-        filename = f'clientes_reporte_{timestamp}.txt'
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        
-        # Generar contenido del archivo usando pandas
-        contenido = []
-        contenido.append("=" * 80)
-        contenido.append("REPORTE DE CLIENTES - RÍOS DEL DESIERTO")
-        contenido.append(f"Generado automáticamente con Pandas - {date.today().strftime('%d/%m/%Y')}")
-        contenido.append("=" * 80)
-        contenido.append()
-        
-        # Estadísticas generales
-        contenido.append("ESTADÍSTICAS GENERALES:")
-        contenido.append("-" * 30)
-        contenido.append(f"Total de clientes: {len(df_clientes)}")
-        contenido.append(f"Clientes activos: {len(df_clientes[df_clientes['activo'] == True])}")
-        contenido.append(f"Clientes inactivos: {len(df_clientes[df_clientes['activo'] == False])}")
-        contenido.append(f"Tipos de documento: {df_clientes['tipo_documento__nombre'].nunique()}")
-        contenido.append(f"Ciudades diferentes: {df_clientes['ciudad'].nunique()}")
-        contenido.append()
-        
-        # Análisis por tipo de documento
-        contenido.append("ANÁLISIS POR TIPO DE DOCUMENTO:")
-        contenido.append("-" * 40)
-        tipos_analisis = df_clientes.groupby('tipo_documento__nombre').size()
-        for tipo, cantidad in tipos_analisis.items():
-            contenido.append(f"{tipo}: {cantidad} clientes")
-        contenido.append()
-        
-        # Listado de clientes
-        contenido.append("LISTADO DETALLADO DE CLIENTES:")
-        contenido.append("-" * 50)
-        
-        # Formatear fechas
-        df_clientes['fecha_registro'] = pd.to_datetime(df_clientes['fecha_registro']).dt.strftime('%d/%m/%Y')
-        
-        # Crear nombre completo
-        df_clientes['nombre_completo'] = (
-            df_clientes['primer_nombre'].fillna('') + ' ' + 
-            df_clientes['segundo_nombre'].fillna('') + ' ' +
-            df_clientes['primer_apellido'].fillna('') + ' ' +
-            df_clientes['segundo_apellido'].fillna('')
-        ).str.replace('  ', ' ').str.strip()
-        
-        for _, cliente in df_clientes.iterrows():
-            contenido.append(f"ID: {cliente['id']}")
-            contenido.append(f"Nombre: {cliente['nombre_completo']}")
-            contenido.append(f"Documento: {cliente['tipo_documento__nombre']} {cliente['numero_documento']}")
-            contenido.append(f"Email: {cliente['correo']}")
-            contenido.append(f"Teléfono: {cliente['telefono']}")
-            contenido.append(f"Dirección: {cliente['direccion']}")
-            contenido.append(f"Ciudad: {cliente['ciudad']}, {cliente['departamento']}")
-            contenido.append(f"Registro: {cliente['fecha_registro']}")
-            contenido.append(f"Estado: {'Activo' if cliente['activo'] else 'Inactivo'}")
-            contenido.append("-" * 50)
-        
-        contenido.append()
-        contenido.append("Reporte generado automáticamente con Pandas")
-        contenido.append("Sistema de Gestión de Clientes - Ríos del Desierto")
-        
-        # Escribir contenido
-        response.write('\n'.join(contenido))
-        
-        return response
+        return respuesta_exportacion(
+            request, 'clientes_txt', generar_txt_clientes,
+            'text/plain; charset=utf-8', f'clientes_reporte_{timestamp}.txt'
+        )
         
     except Exception as e:
         return Response({
             'success': False,
             'message': f'Error exportando TXT con Pandas: {str(e)}'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def _exportacion_columnar(request, formato):
+    """
+    Transmite una tabla en formato columnar por lotes (row groups / batches).
+    ?tabla=clientes (por defecto), compras o fidelizacion; esta última admite
+    monto_minimo y dias como el reporte de fidelización.
+    """
+    tabla = request.GET.get('tabla', 'clientes')
+    monto_minimo, dias = parametros_fidelizacion(request.GET)
+    try:
+        columnas, lotes = fuente_columnar(tabla, monto_minimo, dias)
+    except ValueError as e:
+        return Response({
+            'success': False,
+            'message': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    descripcion = FORMATOS_COLUMNARES[formato]
+    response = StreamingHttpResponse(
+        generar_columnar(formato, columnas, lotes),
+        content_type=descripcion['content_type']
+    )
+    timestamp = date.today().strftime('%Y%m%d')
+    filename = f'{tabla}_{timestamp}{descripcion["extension"]}'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@api_view(['GET'])
+def exportar_parquet(request):
+    """
+    Exporta clientes, compras o candidatos de fidelización a Parquet.
+    
+    Tipos explícitos: montos decimal128, fechas con zona horaria y estado,
+    método de pago, canal, género y tipo de documento como diccionarios.
+    Cada lote de 5000 filas es un row group comprimido con zstd.
+    
+    URL: /api/clientes/exportar/parquet/?tabla=clientes|compras|fidelizacion
+    """
+    return _exportacion_columnar(request, 'parquet')
+
+
+@api_view(['GET'])
+def exportar_arrow(request):
+    """
+    Exporta clientes, compras o candidatos de fidelización como Arrow IPC
+    stream (mismos tipos que Parquet, un record batch por lote).
+    
+    URL: /api/clientes/exportar/arrow/?tabla=clientes|compras|fidelizacion
+    """
+    return _exportacion_columnar(request, 'arrow')
+
+
+# === EXPORTACIONES EN SEGUNDO PLANO ===
+
+@api_view(['POST'])
+def crear_trabajo_exportacion(request):
+    """
+    Encola una exportación y retorna el trabajo que la genera.
+    
+    Body: {"tipo": "csv" | "excel" | "txt" | "fidelizacion" | "parquet" | "arrow",
+    "parametros": {...}} (fidelizacion admite monto_minimo y dias; parquet y arrow
+    admiten tabla: clientes, compras o fidelizacion). Si los mismos parámetros ya se
+    exportaron sobre los mismos datos, se retorna ese trabajo (200) en lugar
+    de crear uno nuevo (202).
+    
+    URL: /api/clientes/exportaciones/
+    """
+    try:
+        trabajo, reutilizado = solicitar_exportacion(
+            request.data.get('tipo', ''), request.data.get('parametros') or {}
+        )
+    except ValueError as e:
+        return Response({
+            'success': False,
+            'message': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    datos = TrabajoExportacionSerializer(trabajo).data
+    datos['reutilizado'] = reutilizado
+    return Response(datos, status=status.HTTP_200_OK if reutilizado else status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET'])
+def estado_trabajo_exportacion(request, trabajo_id):
+    """
+    Estado y porcentaje de avance de un trabajo de exportación.
+    
+    URL: /api/clientes/exportaciones/{id}/
+    """
+    trabajo = get_object_or_404(TrabajoExportacion, pk=trabajo_id)
+    return Response(TrabajoExportacionSerializer(trabajo).data)
+
+
+RANGO_BYTES = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+TAMANO_BLOQUE_DESCARGA = 64 * 1024
+
+
+def _rango_solicitado(encabezado, tamano):
+    """
+    (inicio, fin) inclusivos de un encabezado Range de un solo rango.
+    Retorna None si no hay rango utilizable (se envía el archivo completo)
+    y False si el rango no es satisfacible.
+    """
+    coincidencia = RANGO_BYTES.match(encabezado.strip()) if encabezado else None
+    if not coincidencia or coincidencia.groups() == ('', ''):
+        return None
+    inicio, fin = coincidencia.groups()
+    if not inicio:
+        # bytes=-N: los últimos N bytes
+        inicio, fin = max(tamano - int(fin), 0), tamano - 1
+    else:
+        inicio, fin = int(inicio), min(int(fin), tamano - 1) if fin else tamano - 1
+    if inicio >= tamano or inicio > fin:
+        return False
+    return inicio, fin
+
+
+def _leer_rango(ruta, inicio, longitud):
+    with open(ruta, 'rb') as archivo:
+        archivo.seek(inicio)
+        while longitud > 0:
+            bloque = archivo.read(min(TAMANO_BLOQUE_DESCARGA, longitud))
+            if not bloque:
+                return
+            longitud -= len(bloque)
+            yield bloque
+
+
+@api_view(['GET'])
+def descargar_trabajo_exportacion(request, trabajo_id):
+    """
+    Descarga el archivo de un trabajo terminado.
+    
+    Admite Range de un solo rango (206 Partial Content) e If-Range con el
+    ETag del archivo, para reanudar descargas interrumpidas.
+    
+    URL: /api/clientes/exportaciones/{id}/descarga/
+    """
+    trabajo = get_object_or_404(TrabajoExportacion, pk=trabajo_id)
+    if trabajo.estado != 'COMPLETADO':
+        return Response({
+            'success': False,
+            'message': f'La exportación no está disponible (estado: {trabajo.estado})',
+            'estado': trabajo.estado,
+            'progreso': trabajo.progreso
+        }, status=status.HTTP_410_GONE if trabajo.estado == 'VENCIDO' else status.HTTP_409_CONFLICT)
+    
+    ruta = ruta_archivo(trabajo)
+    if not ruta.exists():
+        return Response({
+            'success': False,
+            'message': 'El archivo de la exportación ya no existe'
+        }, status=status.HTTP_410_GONE)
+    
+    content_type = FORMATOS_EXPORTACION[trabajo.tipo]['content_type']
+    etag = f'"{trabajo.huella}"'
+    tamano = ruta.stat().st_size
+    
+    # If-Range con otro ETag: el archivo cambió y se envía completo
+    rango = None
+    if request.headers.get('If-Range', etag) == etag:
+        rango = _rango_solicitado(request.headers.get('Range'), tamano)
+    
+    if rango is False:
+        response = HttpResponse(status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+        response['Content-Range'] = f'bytes */{tamano}'
+        return response
+    
+    codificacion = codificacion_aceptada(request) if comprimible(content_type) else None
+    if rango is None and codificacion:
+        # El archivo no cambia: la copia comprimida se genera en la primera descarga
+        response = respuesta_precomprimida(
+            codificacion,
+            ruta.with_name(ruta.name + EXTENSIONES[codificacion]),
+            lambda: _leer_rango(ruta, 0, tamano),
+            content_type,
+            trabajo.nombre_descarga
+        )
+        response['ETag'] = f'W/{etag}'
+        return response
+    
+    if rango is None:
+        response = FileResponse(
+            open(ruta, 'rb'),
+            as_attachment=True,
+            filename=trabajo.nombre_descarga,
+            content_type=content_type
+        )
+    else:
+        inicio, fin = rango
+        response = StreamingHttpResponse(
+            _leer_rango(ruta, inicio, fin - inicio + 1),
+            status=status.HTTP_206_PARTIAL_CONTENT,
+            content_type=content_type
+        )
+        response['Content-Range'] = f'bytes {inicio}-{fin}/{tamano}'
+        response['Content-Length'] = str(fin - inicio + 1)
+        response['Content-Disposition'] = content_disposition_header(True, trabajo.nombre_descarga)
+    
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    return response
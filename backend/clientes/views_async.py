@@ -0,0 +1,190 @@
+"""
+Vistas asíncronas de las consultas de clientes
+Versiones nativas para ASGI de la consulta por documento, la búsqueda y las
+compras de un cliente: usan el ORM asíncrono, así un servidor ASGI atiende
+muchas consultas concurrentes en su bucle de eventos sin pasar cada petición
+por un hilo. Las respuestas (cuerpo, códigos y ETag) son las mismas de las
+vistas síncronas de views.py
+"""
+from functools import wraps
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from django.views.decorators.http import require_safe
+from rest_framework import status
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from .cache_clientes import cache_perfiles
+from .models import Cliente, Compra, TipoDocumento
+from .paginacion import PaginacionKeyset
+from .serializacion_rapida import FORMATO_CLIENTE, FORMATO_COMPRA_SIMPLE, FORMATO_PERFIL, RespuestaJSON
+from .views import _etag, consulta_version_cliente, etag_perfil, respuesta_perfil, version_cliente
+
+
+def respuesta_json(datos, status=status.HTTP_200_OK):
+    """Mismo cuerpo y content type que Response con el JSONRenderer de DRF"""
+    return RespuestaJSON(datos, status=status)
+
+
+def condicion_async(etag_func):
+    """
+    Equivalente de @condition(etag_func=...) para vistas asíncronas con una
+    función de ETag también asíncrona (condition la llama de forma síncrona,
+    y una consulta síncrona no se permite dentro del bucle de eventos).
+    """
+    def decorador(vista):
+        @wraps(vista)
+        async def envoltura(request, *args, **kwargs):
+            etag = await etag_func(request, *args, **kwargs)
+            etag = quote_etag(etag) if etag else None
+            respuesta = get_conditional_response(request, etag=etag)
+            if respuesta is None:
+                respuesta = await vista(request, *args, **kwargs)
+            if etag and request.method in ('GET', 'HEAD'):
+                respuesta.headers.setdefault('ETag', etag)
+            return respuesta
+        return envoltura
+    return decorador
+
+
+async def _version_cliente(con_compras=True, **filtro):
+    filas = [fila async for fila in consulta_version_cliente(con_compras, **filtro)]
+    return version_cliente(filas[0] if filas else None)
+
+
+async def etag_cliente(request, cliente_id):
+    version = await _version_cliente(pk=cliente_id)
+    return version and _etag(request.path, request.GET.urlencode(), *version)
+
+
+@require_safe
+async def consultar_cliente_por_documento(request, numero_documento):
+    """
+    Consulta por número de documento (ver views.consultar_cliente_por_documento).
+    URL: /api/clientes/consulta/{numero_documento}/
+    """
+    numero_documento = numero_documento.strip()
+
+    async def cargar_perfil():
+        fila, perfil = await FORMATO_PERFIL.aprimero(
+            Cliente.objects.filter(numero_documento=numero_documento, activo=True),
+            adicionales=('id', 'fecha_actualizacion')
+        )
+        return fila and (fila['id'], fila['numero_documento'], (etag_perfil(fila), perfil))
+
+    try:
+        entrada = await cache_perfiles.aobtener(('perfil', numero_documento), cargar_perfil)
+        if entrada is None:
+            raise Cliente.DoesNotExist
+
+        etag, perfil = entrada
+        return respuesta_perfil(request, etag, lambda: respuesta_json({
+            'success': True,
+            'data': perfil,
+            'message': 'Cliente encontrado exitosamente'
+        }))
+
+    except Cliente.DoesNotExist:
+        return respuesta_json({
+            'success': False,
+            'data': None,
+            'message': f'No se encontró ningún cliente con número de documento: {numero_documento}'
+        }, status=status.HTTP_404_NOT_FOUND)
+
+    except Exception as e:
+        return respuesta_json({
+            'success': False,
+            'data': None,
+            'message': f'Error interno del servidor: {str(e)}'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@require_safe
+async def buscar_cliente(request):
+    """
+    Busca un cliente por tipo y número de documento (ver views.buscar_cliente).
+    URL: /api/clientes/buscar/?tipo_documento=CC&numero_documento=...
+    """
+    tipo_documento_codigo = request.GET.get('tipo_documento')
+    numero_documento = request.GET.get('numero_documento')
+
+    if not tipo_documento_codigo or not numero_documento:
+        return respuesta_json({
+            'error': 'Se requieren los parámetros tipo_documento y numero_documento'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    tipo_documento_codigo = tipo_documento_codigo.upper()
+    numero_documento = numero_documento.strip()
+
+    async def cargar_cliente():
+        fila, datos = await FORMATO_CLIENTE.aprimero(Cliente.objects.filter(
+            tipo_documento__codigo=tipo_documento_codigo,
+            tipo_documento__activo=True,
+            numero_documento=numero_documento,
+            activo=True
+        ))
+        return fila and (fila['id'], fila['numero_documento'], datos)
+
+    try:
+        datos = await cache_perfiles.aobtener(('cliente', tipo_documento_codigo, numero_documento), cargar_cliente)
+        if datos is not None:
+            return respuesta_json(datos)
+
+        await TipoDocumento.objects.aget(codigo=tipo_documento_codigo, activo=True)
+        raise Cliente.DoesNotExist
+
+    except TipoDocumento.DoesNotExist:
+        return respuesta_json({
+            'error': f'Tipo de documento "{tipo_documento_codigo}" no válido'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    except Cliente.DoesNotExist:
+        return respuesta_json({
+            'error': 'Cliente no encontrado'
+        }, status=status.HTTP_404_NOT_FOUND)
+
+
+@require_safe
+@condicion_async(etag_cliente)
+async def compras_cliente(request, cliente_id):
+    """
+    Compras de un cliente paginadas por cursor (ver views.compras_cliente).
+    URL: /api/clientes/{cliente_id}/compras/
+    """
+    if not await Cliente.objects.filter(id=cliente_id, activo=True).aexists():
+        # Mismo detalle que get_object_or_404 en la vista síncrona
+        return respuesta_json(
+            {'detail': f'No {Cliente._meta.object_name} matches the given query.'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    compras = Compra.objects.filter(cliente_id=cliente_id).order_by('-fecha_compra', '-id')
+
+    estado = request.GET.get('estado')
+    if estado:
+        compras = compras.filter(estado=estado)
+    compras = FORMATO_COMPRA_SIMPLE.consulta(compras)
+
+    if 'page' not in request.GET or 'cursor' in request.GET:
+        paginador = PaginacionKeyset(ordering=('-fecha_compra', '-id'), page_size=10)
+        try:
+            compras_page = await paginador.apaginate_queryset(compras, Request(request))
+        except NotFound as e:
+            return respuesta_json({'detail': str(e.detail)}, status=status.HTTP_404_NOT_FOUND)
+        return respuesta_json(paginador.datos_paginados(FORMATO_COMPRA_SIMPLE.convertir(compras_page)))
+
+    page_size = int(request.GET.get('page_size', 10))
+    page = int(request.GET.get('page', 1))
+
+    start = (page - 1) * page_size
+    end = start + page_size
+
+    compras_page = [compra async for compra in compras[start:end]]
+    total_count = await compras.acount()
+
+    return respuesta_json({
+        'results': FORMATO_COMPRA_SIMPLE.convertir(compras_page),
+        'count': total_count,
+        'page': page,
+        'page_size': page_size,
+        'total_pages': (total_count + page_size - 1) // page_size
+    })
@@ -36,6 +36,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'clientes.compresion.CompresionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -100,6 +101,60 @@ USE_TZ = config('USE_TZ', default=True, cast=bool)
 # Static files (CSS, JavaScript, Images)
 STATIC_URL = config('STATIC_URL', default='/static/')
 
+# Tamaño del bloque de números de orden que reserva cada proceso
+NUMERO_ORDEN_TAMANO_BLOQUE = config('NUMERO_ORDEN_TAMANO_BLOQUE', default=1000, cast=int)
+
+# Caché de Django compartida por los procesos del host (workers y comandos de gestión).
+# Guarda las versiones con que la caché de perfiles se invalida en todos los procesos;
+# con varios hosts debe apuntar a un servidor común (p. ej. Redis o Memcached).
+# En archivos, el límite de entradas se revisa cada CULL_CADA escrituras
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'compartida': {
+        'BACKEND': config('CACHE_COMPARTIDA_BACKEND', default='clientes.cache_compartida.FileBasedCacheDepuracionPeriodica'),
+        'LOCATION': config('CACHE_COMPARTIDA_LOCATION', default=str(BASE_DIR / 'cache_compartida')),
+        'OPTIONS': {
+            'MAX_ENTRIES': config('CACHE_COMPARTIDA_MAX_ENTRADAS', default=20000, cast=int),
+            'CULL_CADA': config('CACHE_COMPARTIDA_CULL_CADA', default=1000, cast=int),
+        },
+    },
+}
+
+# Caché de perfiles de cliente por número de documento (en cada proceso, con versiones
+# en la caché compartida CACHE_PERFILES_ALIAS)
+CACHE_PERFILES_ALIAS = 'compartida'
+CACHE_PERFILES_MAX_ENTRADAS = config('CACHE_PERFILES_MAX_ENTRADAS', default=10000, cast=int)
+CACHE_PERFILES_TTL = config('CACHE_PERFILES_TTL', default=300, cast=int)
+
+# Caché de reportes y análisis por versión de los datos (por proceso), tamaño máximo en bytes
+CACHE_REPORTES_MAX_BYTES = config('CACHE_REPORTES_MAX_BYTES', default=64 * 1024 * 1024, cast=int)
+
+# Instantánea de DataFrames de los análisis con Pandas (por proceso): tamaño máximo en bytes,
+# segundos entre revisiones de la versión de los datos para recargarla (0 = sin hilo de refresco)
+# y segundos sin peticiones tras los que el hilo la descarta (0 = se conserva).
+# Cada worker retiene hasta CACHE_DATAFRAMES_MAX_BYTES mientras haya análisis en uso:
+# 256 MiB por proceso por defecto, p. ej. 1 GiB con 4 workers
+CACHE_DATAFRAMES_MAX_BYTES = config('CACHE_DATAFRAMES_MAX_BYTES', default=256 * 1024 * 1024, cast=int)
+CACHE_DATAFRAMES_REFRESCO = config('CACHE_DATAFRAMES_REFRESCO', default=30, cast=int)
+CACHE_DATAFRAMES_INACTIVIDAD = config('CACHE_DATAFRAMES_INACTIVIDAD', default=600, cast=int)
+
+# Máximo de documentos por petición en la consulta por lote
+CONSULTA_LOTE_MAX_DOCUMENTOS = config('CONSULTA_LOTE_MAX_DOCUMENTOS', default=5000, cast=int)
+
+# Exportaciones en segundo plano: hilos del pool por proceso (0 = en la misma petición),
+# directorio de los archivos, segundos sin avance tras los que un trabajo se da por abandonado
+# y segundos que se conservan los archivos vencidos (descargas que ya estaban en curso)
+EXPORTACIONES_WORKERS = config('EXPORTACIONES_WORKERS', default=2, cast=int)
+EXPORTACIONES_DIR = config('EXPORTACIONES_DIR', default=str(BASE_DIR / 'exportaciones'))
+EXPORTACIONES_TRABAJO_VENCIDO = config('EXPORTACIONES_TRABAJO_VENCIDO', default=600, cast=int)
+EXPORTACIONES_RETENCION_VENCIDOS = config('EXPORTACIONES_RETENCION_VENCIDOS', default=3600, cast=int)
+
+# Vistas asíncronas (ORM asíncrono) para consulta, búsqueda y compras de un cliente.
+# asgi.py las activa; bajo WSGI las vistas síncronas evitan crear un bucle por petición
+VISTAS_ASINCRONAS = config('VISTAS_ASINCRONAS', default=False, cast=bool)
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 